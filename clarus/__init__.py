@@ -70,9 +70,12 @@ try:
         ce_backend,
         pack_sparse as ce_pack_sparse,
         build_metric_basis as ce_build_metric_basis,
+        build_relax_operator as ce_build_relax_operator,
+        extreme_eigs as ce_extreme_eigs,
         codebook_pull as ce_codebook_pull,
         relax as ce_relax,
         relax_packed as ce_relax_packed,
+        relax_packed_batch as ce_relax_packed_batch,
     )
 except ImportError:
     pass
@@ -81,7 +84,9 @@ try:
     from .runtime import (  # type: ignore[no-redef]
         BrainRuntime,
         BrainRuntimeConfig,
+        BrainRuntimePool,
         BrainRuntimeSnapshot,
+        BrainwaveEstimator,
         HippocampusMemory,
         ModuleLifecycle,
         RuntimeMode,
@@ -100,7 +105,9 @@ __all__ = [
     "nn_gauge_lattice_fwd",
     "BrainRuntime",
     "BrainRuntimeConfig",
+    "BrainRuntimePool",
     "BrainRuntimeSnapshot",
+    "BrainwaveEstimator",
     "HippocampusMemory",
     "ModuleLifecycle",
     "RuntimeMode",
@@ -0,0 +1,311 @@
+"""Directory artifact layout: JSON manifest + page-aligned raw tensor buffer.
+
+    <artifact>/manifest.json   format/version, value tree, tensor table
+    <artifact>/tensors.bin     raw little-endian tensor bytes, 4 KiB aligned
+
+`load_artifact_dir` maps `tensors.bin` once with `torch.from_file(shared=False)`
+(private, copy-on-write mapping) and hands out zero-copy views. Views are
+built on first key access, and pages are only read when a tensor is touched,
+so cold start cost is the manifest parse. Several worker processes loading
+the same directory share one page-cached copy of the buffer.
+
+Usage:
+    save_artifact_dir(data, "clarus/runtime.ce")
+    data = load_artifact("clarus/runtime.ce")   # dir or legacy torch.save file
+    python -m clarus.artifact convert clarus/runtime.pt clarus/runtime.ce
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import MutableMapping
+
+import torch
+
+ARTIFACT_FORMAT = "clarus-artifact"
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+TENSORS_NAME = "tensors.bin"
+PAGE_ALIGN = 4096
+
+_TENSOR_TAG = "__tensor__"
+_TUPLE_TAG = "__tuple__"
+
+
+def _align(offset: int, align: int = PAGE_ALIGN) -> int:
+    return (offset + align - 1) // align * align
+
+
+def _dtype_name(dtype: torch.dtype) -> str:
+    return str(dtype).replace("torch.", "")
+
+
+def _dtype_from_name(name: str) -> torch.dtype:
+    dtype = getattr(torch, name, None)
+    if not isinstance(dtype, torch.dtype):
+        raise ValueError(f"unsupported tensor dtype in artifact manifest: {name!r}")
+    return dtype
+
+
+def _encode_value(value, name: str, tensors: list[tuple[str, torch.Tensor]]):
+    if torch.is_tensor(value):
+        tensors.append((name, value.detach().cpu().contiguous()))
+        return {_TENSOR_TAG: name}
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise ValueError(f"artifact dict keys must be str, got {key!r} under {name!r}")
+            out[key] = _encode_value(item, f"{name}/{key}", tensors)
+        return out
+    if isinstance(value, tuple):
+        return {_TUPLE_TAG: [_encode_value(item, f"{name}/{idx}", tensors) for idx, item in enumerate(value)]}
+    if isinstance(value, list):
+        return [_encode_value(item, f"{name}/{idx}", tensors) for idx, item in enumerate(value)]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise ValueError(f"cannot store {type(value).__name__} at {name!r} in a directory artifact")
+
+
+def _hash_value(h, value) -> None:
+    if torch.is_tensor(value):
+        tensor = value.detach().cpu().contiguous().reshape(-1)
+        h.update(f"tensor:{_dtype_name(value.dtype)}:{list(value.shape)}:".encode("utf-8"))
+        if tensor.numel():
+            h.update(tensor.view(torch.uint8).numpy())
+    elif isinstance(value, dict):
+        h.update(b"dict:")
+        for key in sorted(value):
+            h.update(f"{key}=".encode("utf-8"))
+            _hash_value(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(f"seq:{len(value)}:".encode("utf-8"))
+        for item in value:
+            _hash_value(h, item)
+    else:
+        h.update(f"{type(value).__name__}:{value!r};".encode("utf-8"))
+
+
+def content_hash(data, keys) -> str:
+    """sha256 over `keys` of `data` (tensor bytes, dtypes, shapes and scalars)."""
+    h = hashlib.sha256()
+    for key in keys:
+        h.update(f"[{key}]".encode("utf-8"))
+        _hash_value(h, data.get(key))
+    return h.hexdigest()
+
+
+def compact_tensors(value):
+    """Copy of `value` where tensors that view a larger storage are cloned.
+
+    Tensors from a directory artifact are views into one mapping of
+    `tensors.bin`; `torch.save` serializes whole storages, so saving such a
+    view would write the entire buffer once per tensor.
+    """
+    if torch.is_tensor(value):
+        tensor = value.detach()
+        if tensor.untyped_storage().nbytes() > tensor.numel() * tensor.element_size():
+            return tensor.clone()
+        return value
+    if isinstance(value, dict):
+        return {key: compact_tensors(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return tuple(compact_tensors(item) for item in value)
+    if isinstance(value, list):
+        return [compact_tensors(item) for item in value]
+    return value
+
+
+def save_artifact_dir(data: dict, path: str) -> dict:
+    """Write `data` as a manifest + aligned tensor buffer under directory `path`.
+
+    Both files are written into a sibling temp directory that then replaces
+    `path` as a whole, so a reader never sees a manifest paired with another
+    save's tensor buffer. An engine that still maps the old `tensors.bin`
+    keeps its inode, so saving over the directory it was loaded from is safe.
+    """
+    path = os.path.abspath(path)
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        manifest = _write_artifact_files(data, tmp_dir)
+        if os.path.isdir(path):
+            old_dir = tmp_dir + ".old"
+            os.replace(path, old_dir)
+            os.replace(tmp_dir, path)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(tmp_dir, path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return manifest
+
+
+def _write_artifact_files(data: dict, path: str) -> dict:
+    tensors: list[tuple[str, torch.Tensor]] = []
+    values = {key: _encode_value(value, key, tensors) for key, value in data.items()}
+
+    table: dict[str, dict] = {}
+    offset = 0
+    for name, tensor in tensors:
+        nbytes = tensor.numel() * tensor.element_size()
+        offset = _align(offset)
+        table[name] = {
+            "dtype": _dtype_name(tensor.dtype),
+            "shape": list(tensor.shape),
+            "offset": offset,
+            "nbytes": nbytes,
+        }
+        offset += nbytes
+    total = _align(offset)
+
+    bin_path = os.path.join(path, TENSORS_NAME)
+    with open(bin_path, "wb") as fh:
+        fh.truncate(total)
+    if total > 0:
+        out = torch.from_file(bin_path, shared=True, size=total, dtype=torch.uint8)
+        for name, tensor in tensors:
+            entry = table[name]
+            if entry["nbytes"] == 0:
+                continue
+            raw = tensor.reshape(-1).view(torch.uint8)
+            out[entry["offset"] : entry["offset"] + entry["nbytes"]].copy_(raw)
+        del out
+
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "byte_order": "little",
+        "align": PAGE_ALIGN,
+        "total_bytes": total,
+        "values": values,
+        "tensors": table,
+    }
+    with open(os.path.join(path, MANIFEST_NAME), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False)
+    return manifest
+
+
+class MappedArtifact(MutableMapping):
+    """Dict-like view over a directory artifact.
+
+    Tensors are zero-copy views into one private mapping of `tensors.bin`,
+    created on first access of their key. Assignments and deletions only
+    touch this object, never the files on disk.
+    """
+
+    def __init__(self, path: str, manifest: dict, buffer: torch.Tensor | None):
+        self.path = path
+        self.manifest = manifest
+        self._buffer = buffer
+        self._values: dict = manifest["values"]
+        self._cache: dict = {}
+        self._deleted: set[str] = set()
+
+    def tensor(self, name: str) -> torch.Tensor:
+        entry = self.manifest["tensors"][name]
+        dtype = _dtype_from_name(entry["dtype"])
+        shape = tuple(entry["shape"])
+        if entry["nbytes"] == 0 or self._buffer is None:
+            return torch.empty(shape, dtype=dtype)
+        raw = self._buffer[entry["offset"] : entry["offset"] + entry["nbytes"]]
+        return raw.view(dtype).view(shape)
+
+    def _decode(self, value):
+        if isinstance(value, dict):
+            if _TENSOR_TAG in value and len(value) == 1:
+                return self.tensor(value[_TENSOR_TAG])
+            if _TUPLE_TAG in value and len(value) == 1:
+                return tuple(self._decode(item) for item in value[_TUPLE_TAG])
+            return {key: self._decode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._decode(item) for item in value]
+        return value
+
+    def __getitem__(self, key):
+        if key in self._cache:
+            return self._cache[key]
+        if key in self._deleted or key not in self._values:
+            raise KeyError(key)
+        value = self._decode(self._values[key])
+        self._cache[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._deleted.discard(key)
+        self._cache[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._cache.pop(key, None)
+        self._deleted.add(key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._cache or (key in self._values and key not in self._deleted)
+
+    def __iter__(self):
+        seen = set()
+        for key in list(self._values) + list(self._cache):
+            if key not in seen and key in self:
+                seen.add(key)
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def loaded_keys(self) -> list[str]:
+        return list(self._cache)
+
+
+def is_artifact_dir(path: str) -> bool:
+    return os.path.isdir(path) and os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def load_artifact_dir(path: str) -> MappedArtifact:
+    with open(os.path.join(path, MANIFEST_NAME), encoding="utf-8") as fh:
+        manifest = json.load(fh)
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} is not a {ARTIFACT_FORMAT} directory")
+    version = int(manifest.get("format_version", 0))
+    if version > ARTIFACT_FORMAT_VERSION:
+        raise ValueError(
+            f"artifact format_version={version} is newer than supported {ARTIFACT_FORMAT_VERSION}"
+        )
+    total = int(manifest.get("total_bytes", 0))
+    buffer = None
+    if total > 0:
+        bin_path = os.path.join(path, TENSORS_NAME)
+        if os.path.getsize(bin_path) < total:
+            raise ValueError(f"{bin_path} is truncated (expected {total} bytes)")
+        buffer = torch.from_file(bin_path, shared=False, size=total, dtype=torch.uint8)
+    return MappedArtifact(path, manifest, buffer)
+
+
+def load_artifact(path: str):
+    """Load a directory artifact (memory-mapped) or a legacy `torch.save` file."""
+    if is_artifact_dir(path):
+        return load_artifact_dir(path)
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Clarus artifact layout tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    conv = sub.add_parser("convert", help="convert a torch.save artifact into a directory artifact")
+    conv.add_argument("src")
+    conv.add_argument("dst")
+    args = ap.parse_args()
+    if args.cmd == "convert":
+        data = load_artifact(args.src)
+        manifest = save_artifact_dir(dict(data), args.dst)
+        print(f"wrote {len(manifest['tensors'])} tensors ({manifest['total_bytes'] / 1024 / 1024:.1f} MB) to {args.dst}")
+
+
+if __name__ == "__main__":
+    main()
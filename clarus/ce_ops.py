@@ -11,6 +11,7 @@ runtime policy should stay in Python modules such as `clarus.engine` and
 from __future__ import annotations
 
 from collections import deque
+from dataclasses import dataclass
 import math
 from typing import Dict, Optional, Tuple
 
@@ -21,8 +22,10 @@ from .quantum import ALPHA_B_DEFAULT, estimate_mu, iss_ball_radius
 
 try:
     from .constants import PORTAL as DEFAULT_CB_W, NORM_EPS, SOFTMAX_EPS, CLAMP_EPS
+    from .profiling import profiled
 except ImportError:
     from clarus.constants import PORTAL as DEFAULT_CB_W, NORM_EPS, SOFTMAX_EPS, CLAMP_EPS
+    from clarus.profiling import profiled
 
 _RUST = False
 _CUDA = False
@@ -264,6 +267,278 @@ def _spmv_torch(
     return torch.sparse.mm(sparse, x.unsqueeze(1)).squeeze(1)
 
 
+def _csr_tensor(
+    values: torch.Tensor,
+    col_idx: torch.Tensor,
+    row_ptr: torch.Tensor,
+    dim: int,
+    *,
+    device: torch.device,
+    dtype: torch.dtype,
+) -> torch.Tensor:
+    return torch.sparse_csr_tensor(
+        row_ptr.to(device=device, dtype=torch.int64),
+        col_idx.to(device=device, dtype=torch.int64),
+        values.to(device=device, dtype=dtype),
+        size=(dim, dim),
+        device=device,
+        dtype=dtype,
+        check_invariants=False,
+    )
+
+
+@dataclass
+class SparseRelaxOperator:
+    """Prebuilt W operator reused across relax calls.
+
+    Holds the CSR pack, the int64 `sparse_csr_tensor` (or the dense W when the
+    pack is fully dense) and a power-iteration estimate of the spectral radius
+    used for the CFL `lambda0` bump. `version` lets owners detect staleness.
+    """
+
+    values: torch.Tensor
+    col_idx: torch.Tensor
+    row_ptr: torch.Tensor
+    dim: int
+    version: int = 0
+    sparse_mat: Optional[torch.Tensor] = None
+    dense_w: Optional[torch.Tensor] = None
+    spectral_radius: Optional[float] = None
+
+    @property
+    def pack(self) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        return self.values, self.col_idx, self.row_ptr
+
+    def matvec(self, x: torch.Tensor) -> torch.Tensor:
+        if x.ndim == 2:
+            return _spmm_torch(x, sparse_mat=self.sparse_mat, dense_w=self.dense_w)
+        return _spmv_torch(
+            self.values, self.col_idx, self.row_ptr, x,
+            sparse_mat=self.sparse_mat, dense_w=self.dense_w,
+        )
+
+
+@torch.no_grad()
+def _power_spectral_radius(op: SparseRelaxOperator, iters: int = 32) -> float:
+    if op.dim == 0:
+        return 0.0
+    device = op.values.device
+    # Deterministic, non-symmetric start so it is not orthogonal to the top mode.
+    v = torch.linspace(1.0, 2.0, op.dim, device=device, dtype=op.values.dtype)
+    v = v / v.norm()
+    for _ in range(max(1, int(iters))):
+        w = op.matvec(v)
+        v = w / w.norm().clamp_min(1e-30)
+    return float(op.matvec(v).norm().item())
+
+
+def build_relax_operator(
+    values: torch.Tensor,
+    col_idx: torch.Tensor,
+    row_ptr: torch.Tensor,
+    *,
+    dense_w: Optional[torch.Tensor] = None,
+    version: int = 0,
+    spectral_radius: Optional[float] = None,
+    power_iters: int = 32,
+) -> SparseRelaxOperator:
+    """Build a `SparseRelaxOperator` once per W; relax calls then skip CSR setup."""
+    dim = int(row_ptr.numel()) - 1
+    sparse_mat = None
+    if dense_w is None:
+        sparse_mat = _csr_tensor(
+            values, col_idx, row_ptr, dim,
+            device=values.device, dtype=values.dtype,
+        )
+    op = SparseRelaxOperator(
+        values=values,
+        col_idx=col_idx,
+        row_ptr=row_ptr,
+        dim=dim,
+        version=int(version),
+        sparse_mat=sparse_mat,
+        dense_w=dense_w,
+    )
+    op.spectral_radius = (
+        float(spectral_radius) if spectral_radius is not None
+        else _power_spectral_radius(op, iters=power_iters)
+    )
+    return op
+
+
+def _lanczos_ritz(
+    operator: SparseRelaxOperator,
+    n_iter: int,
+    seed: int,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, float]:
+    """`n_iter` Lanczos steps; returns (theta, ritz, basis, beta_last), theta ascending."""
+    dim = int(operator.dim)
+    device = operator.values.device
+    dtype = operator.values.dtype
+    gen = torch.Generator(device="cpu")
+    gen.manual_seed(int(seed))
+    basis = torch.zeros((n_iter + 1, dim), dtype=dtype, device=device)
+    q = torch.randn(dim, generator=gen).to(device=device, dtype=dtype)
+    basis[0] = q / q.norm()
+    alphas: list[float] = []
+    betas: list[float] = []
+    beta_last = 0.0
+    for j in range(n_iter):
+        w = operator.matvec(basis[j])
+        alphas.append(float(torch.dot(w, basis[j]).item()))
+        span = basis[: j + 1]
+        # Two passes of classical Gram-Schmidt keep the Krylov basis orthogonal.
+        w = w - span.transpose(0, 1) @ (span @ w)
+        w = w - span.transpose(0, 1) @ (span @ w)
+        beta_last = float(w.norm().item())
+        if beta_last <= 1e-10:
+            beta_last = 0.0
+            break
+        if j + 1 < n_iter:
+            betas.append(beta_last)
+            basis[j + 1] = w / beta_last
+
+    m = len(alphas)
+    tri = torch.diag(torch.tensor(alphas, dtype=torch.float64))
+    if m > 1:
+        off = torch.tensor(betas[: m - 1], dtype=torch.float64)
+        tri = tri + torch.diag(off, 1) + torch.diag(off, -1)
+    theta, ritz = torch.linalg.eigh(tri)
+    return theta, ritz, basis[:m], beta_last
+
+
+@torch.no_grad()
+@profiled("ce_ops.extreme_eigs")
+def extreme_eigs(
+    operator: SparseRelaxOperator,
+    k_smallest: int = 0,
+    *,
+    iters: Optional[int] = None,
+    seed: int = 0,
+    rtol: float = 1e-3,
+    margin: float = 1e-4,
+) -> Tuple[float, torch.Tensor, torch.Tensor]:
+    """Top eigenvalue bound and bottom-k eigenpairs of a symmetric W via Lanczos.
+
+    Runs `iters` Lanczos steps (full re-orthogonalisation) using only W
+    matvecs, so the cost is O(iters * nnz + iters^2 * d) instead of O(d^3).
+    The Ritz residual |beta_m s_i| only bounds the distance from each Ritz
+    value to *some* eigenvalue, so the top pair and the bottom-k pairs must
+    all have residuals below `rtol` times the spectral scale; otherwise the
+    step count doubles, and once the Krylov space would span the whole
+    matrix a dense `eigh` gives the exact answer. The returned top value is
+    the converged largest Ritz value plus its residual and a relative
+    `margin`. Lanczos converges to the extreme eigenvalues first, so the
+    estimate can only miss lam_max if the random start vector is numerically
+    orthogonal to its eigenvector.
+
+    Returns (lam_max_upper, eigvals (k,), eigvecs (k, d)), ascending.
+    """
+    dim = int(operator.dim)
+    device = operator.values.device
+    dtype = operator.values.dtype
+    k_smallest = max(0, min(int(k_smallest), dim))
+    n_iter = int(iters) if iters is not None else max(4 * k_smallest, 64)
+    n_iter = max(1, n_iter)
+    if dim == 0:
+        return 0.0, torch.empty(0, dtype=dtype, device=device), torch.empty((0, 0), dtype=dtype, device=device)
+
+    while n_iter < dim:
+        theta, ritz, basis, beta_last = _lanczos_ritz(operator, n_iter, seed)
+        m = int(theta.numel())
+        k = min(k_smallest, m)
+        residual = (beta_last * ritz[-1]).abs()
+        scale = max(float(theta.abs().max().item()), 1e-12)
+        checked = torch.cat([residual[:k], residual[-1:]])
+        # A breakdown (beta_last == 0) spans an invariant subspace: exact, but
+        # repeated eigenvalues may leave fewer than k distinct vectors.
+        if k == k_smallest and bool((checked <= rtol * scale).all()):
+            lam_max_upper = float(theta[-1].item() + residual[-1].item()) + margin * scale
+            eigvecs = ritz[:, :k].transpose(0, 1).to(dtype=dtype, device=device) @ basis
+            eigvecs = eigvecs / eigvecs.norm(dim=1, keepdim=True).clamp_min(1e-12)
+            return lam_max_upper, theta[:k].to(dtype=dtype, device=device), eigvecs
+        n_iter *= 2
+
+    w_dense = operator.matvec(torch.eye(dim, dtype=dtype, device=device)).transpose(0, 1)
+    eigvals, eigvecs = torch.linalg.eigh(0.5 * (w_dense + w_dense.transpose(0, 1)))
+    return (
+        float(eigvals[-1].item()),
+        eigvals[:k_smallest],
+        eigvecs[:, :k_smallest].transpose(0, 1).contiguous(),
+    )
+
+
+@dataclass
+class GridStencilLaplacian:
+    """Graph Laplacian of the 6-neighbour state lattice as a shift stencil.
+
+    State index i sits at (i // side^2, (i // side) % side, i % side). Each
+    axis contributes an edge i <-> i + stride (strides side^2, side, 1) when
+    both ends exist and the step does not wrap a row, so `apply` costs
+    O(6 d) per vector instead of the O(d^2) dense product.
+    """
+
+    dim: int
+    side: int
+    edge_masks: torch.Tensor
+    degree: torch.Tensor
+
+    @property
+    def strides(self) -> Tuple[int, int, int]:
+        return self.side * self.side, self.side, 1
+
+    def to(self, device=None, dtype=None) -> "GridStencilLaplacian":
+        return GridStencilLaplacian(
+            dim=self.dim,
+            side=self.side,
+            edge_masks=self.edge_masks.to(device=device, dtype=dtype),
+            degree=self.degree.to(device=device, dtype=dtype),
+        )
+
+    def apply(self, x: torch.Tensor) -> torch.Tensor:
+        """L x along the last dimension (L is symmetric, so also x @ L)."""
+        masks = self.edge_masks.to(device=x.device, dtype=x.dtype)
+        out = x * self.degree.to(device=x.device, dtype=x.dtype)
+        for axis, stride in enumerate(self.strides):
+            if stride >= self.dim:
+                continue
+            edge = masks[axis, : self.dim - stride]
+            out[..., : self.dim - stride] -= x[..., stride:] * edge
+            out[..., stride:] -= x[..., : self.dim - stride] * edge
+        return out
+
+    def to_dense(self) -> torch.Tensor:
+        return self.apply(torch.eye(self.dim, dtype=self.degree.dtype, device=self.degree.device))
+
+
+def grid_stencil_laplacian(
+    dim: int,
+    *,
+    device=None,
+    dtype: torch.dtype = torch.float32,
+) -> GridStencilLaplacian:
+    """Build the lattice Laplacian stencil for a `dim`-sized state."""
+    dim = int(dim)
+    # Same side rule as CEEngine.state_coords so the two views agree.
+    side = max(1, int(math.ceil(dim ** (1.0 / 3.0))))
+    idx = torch.arange(dim, device=device, dtype=torch.long)
+    y = (idx // side) % side
+    z = idx % side
+    edge_masks = torch.stack([
+        torch.ones(dim, dtype=torch.bool, device=device),
+        y < side - 1,
+        z < side - 1,
+    ]).to(dtype)
+    degree = torch.zeros(dim, dtype=dtype, device=device)
+    for axis, stride in enumerate((side * side, side, 1)):
+        if stride >= dim:
+            continue
+        edge = edge_masks[axis, : dim - stride]
+        degree[: dim - stride] += edge
+        degree[stride:] += edge
+    return GridStencilLaplacian(dim=dim, side=side, edge_masks=edge_masks, degree=degree)
+
+
 def _natural_direction_torch(
     grad: torch.Tensor,
     phi: torch.Tensor,
@@ -352,6 +627,47 @@ def _energy_parts_torch(
     return total, (e_hop, e_bias, e_portal, e_cb)
 
 
+RELAX_SOLVERS = ("euler", "anderson", "nesterov")
+
+
+def _anderson_mix(
+    m: torch.Tensor,
+    step: torch.Tensor,
+    g_hist: torch.Tensor,
+    f_hist: torch.Tensor,
+    k: int,
+) -> torch.Tensor:
+    """Type-II Anderson mixing on the fixed-point map G(m) = m + step(m).
+
+    `g_hist` / `f_hist` are (depth + 1, dim) ring buffers of G values and
+    residuals. Falls back to the plain step when the mixed step is non-finite
+    or more than 10x longer than the plain one.
+    """
+    window = g_hist.shape[0]
+    slot = k % window
+    g_hist[slot] = m + step
+    f_hist[slot] = step
+    n_hist = min(k + 1, window)
+    if n_hist < 2:
+        return step
+    if n_hist < window:
+        g = g_hist[:n_hist]
+        f = f_hist[:n_hist]
+    else:
+        # Oldest entry sits right after the slot just written.
+        g = torch.roll(g_hist, shifts=-(slot + 1), dims=0)
+        f = torch.roll(f_hist, shifts=-(slot + 1), dims=0)
+    d_f = f[1:] - f[:-1]
+    d_g = g[1:] - g[:-1]
+    gram = d_f @ d_f.transpose(0, 1)
+    reg = 1e-8 * gram.diagonal().sum() + 1e-12
+    eye = torch.eye(gram.shape[0], device=m.device, dtype=m.dtype)
+    gamma, _info = torch.linalg.solve_ex(gram + reg * eye, d_f @ step)
+    mixed_step = step - gamma @ d_g
+    ok = torch.isfinite(mixed_step).all() & (mixed_step.norm() <= 10.0 * step.norm() + 1e-12)
+    return torch.where(ok, mixed_step, step)
+
+
 @torch.no_grad()
 def _relax_packed_torch(
     values: torch.Tensor,
@@ -378,9 +694,16 @@ def _relax_packed_torch(
     noise_scale: float,
     seed: int,
     dense_w: Optional[torch.Tensor] = None,
+    sync_every: int = 8,
+    warmup_steps: int = 30,
+    init: Optional[torch.Tensor] = None,
+    solver: str = "euler",
+    momentum: float = 0.9,
+    anderson_depth: int = 5,
+    operator: Optional[SparseRelaxOperator] = None,
 ) -> Tuple[torch.Tensor, Dict[str, list[float]], int]:
     scale = float(m0.norm().item() or 1.0)
-    m = m0 / scale
+    m = (m0 if init is None else init) / scale
     b_n = b / scale
     phi_n = F.normalize(phi, dim=0)
     codebook_n = codebook / scale if codebook.numel() else codebook
@@ -394,20 +717,21 @@ def _relax_packed_torch(
     anneal_end = max(1, int(round(anneal_ratio * max_steps)))
     t_eff = float(t_wake) / max(1, m.numel())
 
-    sparse_mat = None
-    if dense_w is None:
-        sparse_mat = torch.sparse_csr_tensor(
-            row_ptr.to(torch.int64),
-            col_idx.to(torch.int64),
-            values,
-            size=(m.numel(), m.numel()),
-            device=m.device,
-            dtype=m.dtype,
-            check_invariants=False,
-        )
+    if operator is not None:
+        sparse_mat, dense_w = operator.sparse_mat, operator.dense_w
+    else:
+        sparse_mat = None
+        if dense_w is None:
+            sparse_mat = _csr_tensor(
+                values, col_idx, row_ptr, m.numel(),
+                device=m.device, dtype=m.dtype,
+            )
 
-    w_m_probe = _spmv_torch(values, col_idx, row_ptr, m, sparse_mat=sparse_mat, dense_w=dense_w)
-    spectral_est = w_m_probe.norm().item() / max(m.norm().item(), 1e-8)
+    if operator is not None and operator.spectral_radius is not None:
+        spectral_est = float(operator.spectral_radius)
+    else:
+        w_m_probe = _spmv_torch(values, col_idx, row_ptr, m, sparse_mat=sparse_mat, dense_w=dense_w)
+        spectral_est = w_m_probe.norm().item() / max(m.norm().item(), 1e-8)
     cfl_lambda0 = 2.0 * spectral_est * dt_eff / tau
     lambda0 = max(lambda0, cfl_lambda0)
 
@@ -416,25 +740,31 @@ def _relax_packed_torch(
         gen = torch.Generator(device=m.device)
         gen.manual_seed(int(seed))
 
-    hist_e: list[float] = []
-    hist_delta: list[float] = []
-    hist_e_hop: list[float] = []
-    hist_e_bias: list[float] = []
-    hist_e_portal: list[float] = []
-    hist_e_cb: list[float] = []
-    hist_bypass: list[float] = []
+    # History rows: E, delta, E_hop, E_bias, E_portal, E_cb, bypass_C. Everything
+    # stays on the device; the host only looks at the `done` flag every
+    # `sync_every` steps, and steps taken after convergence are masked out.
+    hist_buf = m.new_zeros((7, max_steps))
+    n_steps = torch.zeros((), dtype=torch.long, device=m.device)
+    done = torch.zeros((), dtype=torch.bool, device=m.device)
+    sync_every = max(1, int(sync_every))
 
     best_m = m.clone()
-    best_e = float("inf")
-    tail_states: deque[torch.Tensor] = deque(maxlen=min(16, max_steps))
+    best_e = m.new_tensor(float("inf"))
+    tail_len = min(16, max_steps)
+    tail = m.new_zeros((tail_len, m.numel()))
+    if solver == "anderson":
+        aa_g = m.new_zeros((max(1, int(anderson_depth)) + 1, m.numel()))
+        aa_f = torch.zeros_like(aa_g)
 
     for k in range(max_steps):
-        c_k = torch.norm(m - 2 * m1 + m2).item()
-        w_m = _spmv_torch(values, col_idx, row_ptr, m, sparse_mat=sparse_mat, dense_w=dense_w)
+        c_k = torch.norm(m - 2 * m1 + m2)
+        # Nesterov evaluates the gradient at the look-ahead point.
+        x = m + float(momentum) * (m - m1) if solver == "nesterov" else m
+        w_m = _spmv_torch(values, col_idx, row_ptr, x, sparse_mat=sparse_mat, dense_w=dense_w)
         grad = w_m + b_n + float(portal) * phi_n + (c_k * float(bypass)) * phi_n
 
         if codebook_n.numel():
-            cb_grad, _ = codebook_pull(m, codebook_n, beta=beta, cb_w=cb_w, backend="torch")
+            cb_grad, _ = codebook_pull(x, codebook_n, beta=beta, cb_w=cb_w, backend="torch")
             grad = grad + cb_grad
 
         recent_var = 0.5 * ((m - m1).square() + (m1 - m2).square())
@@ -459,13 +789,21 @@ def _relax_packed_torch(
         else:
             noise = torch.zeros_like(m)
 
-        m2 = m1.clone()
-        m1 = m.clone()
-        dm = (dt_eff / tau) * nat_grad + noise
-        if not torch.isfinite(dm).all():
-            dm = torch.where(torch.isfinite(dm), dm, torch.zeros_like(dm))
+        step = (dt_eff / tau) * nat_grad
+        if solver == "anderson":
+            step = _anderson_mix(m, step, aa_g, aa_f, k)
+        elif solver == "nesterov":
+            step = (x - m) + step
+
+        m2 = m1
+        m1 = m
+        dm = step + noise
+        dm = torch.where(torch.isfinite(dm), dm, torch.zeros_like(dm))
         m = m + dm
-        tail_states.append(m.detach().clone())
+
+        live = ~done
+        slot = k % tail_len
+        tail[slot] = torch.where(live, m, tail[slot])
 
         w_m_new = _spmv_torch(values, col_idx, row_ptr, m, sparse_mat=sparse_mat, dense_w=dense_w)
         e_total, (e_hop, e_bias, e_portal, e_cb) = _energy_parts_torch(
@@ -473,24 +811,25 @@ def _relax_packed_torch(
             portal, beta, cb_w,
             bypass_c=c_k, bypass_coeff=bypass,
         )
-        e_item = float(e_total.item())
-        delta = float(dm.norm().item())
-
-        hist_e.append(e_item)
-        hist_delta.append(delta)
-        hist_e_hop.append(float(e_hop.item()))
-        hist_e_bias.append(float(e_bias.item()))
-        hist_e_portal.append(float(e_portal.item()))
-        hist_e_cb.append(float(e_cb.item()))
-        hist_bypass.append(float(c_k))
-
-        if e_item < best_e:
-            best_e = e_item
-            best_m = m.clone()
-
-        if k > 30 and delta < tol:
+        delta = dm.norm()
+        hist_buf[:, k] = torch.stack([e_total, delta, e_hop, e_bias, e_portal, e_cb, c_k])
+        n_steps = n_steps + live.to(torch.long)
+
+        better = live & (e_total < best_e)
+        best_e = torch.where(better, e_total, best_e)
+        best_m = torch.where(better, m, best_m)
+
+        if k > warmup_steps:
+            done = done | (delta < tol)
+        if (k + 1) % sync_every == 0 and bool(done):
             break
 
+    n_done = int(n_steps.item())
+    hist_e, hist_delta, hist_e_hop, hist_e_bias, hist_e_portal, hist_e_cb, hist_bypass = (
+        series.tolist() for series in hist_buf[:, :n_done].cpu()
+    )
+    tail_states: deque[torch.Tensor] = deque(tail[:min(n_done, tail_len)].unbind(0))
+
     best_m = best_m * scale
     if tail_states:
         tail = torch.stack(list(tail_states), dim=0) * scale
@@ -521,7 +860,7 @@ def _relax_packed_torch(
         "phi_var": hist_phi_var,
         "iss": iss_report,
     }
-    return best_m, hist, len(hist_e)
+    return best_m, hist, n_done
 
 
 def _iss_from_tail(
@@ -572,6 +911,7 @@ def _iss_from_tail(
 
 
 @torch.no_grad()
+@profiled("ce_ops.relax_packed")
 def relax_packed(
     values: torch.Tensor,
     col_idx: torch.Tensor,
@@ -600,12 +940,39 @@ def relax_packed(
     backend: str = "auto",
     seed: int = 0,
     dense_w: Optional[torch.Tensor] = None,
+    sync_every: int = 8,
+    warmup_steps: int = 30,
+    init: Optional[torch.Tensor] = None,
+    solver: str = "euler",
+    momentum: float = 0.9,
+    anderson_depth: int = 5,
+    operator: Optional[SparseRelaxOperator] = None,
 ) -> Tuple[torch.Tensor, Dict[str, list[float]], int]:
+    """Relax one state on the packed CSR W.
+
+    `sync_every` only affects the torch path: convergence is checked on the
+    host every `sync_every` steps, results are identical for any value.
+    `warmup_steps` is the number of steps before the convergence test applies
+    (the native kernels keep 30). `init` warm-starts the iterate while `m0`
+    still fixes the normalisation scale; it always runs on the torch path.
+
+    `solver` picks the update rule on the natural gradient: "euler" (explicit
+    Euler, the native kernels), "nesterov" (look-ahead momentum `momentum`)
+    or "anderson" (Type-II Anderson mixing over `anderson_depth` residuals).
+    Accelerated solvers run on the torch path with the same hist contract.
+
+    `operator` (from `build_relax_operator`) supplies the prebuilt CSR tensor
+    and the cached spectral radius, so the torch path does no per-call setup.
+    """
+    if solver not in RELAX_SOLVERS:
+        raise ValueError(f"unknown relax solver: {solver}")
     codebook = codebook if codebook is not None else m0.new_empty((0, m0.numel()))
     metric_basis = metric_basis if metric_basis is not None else build_metric_basis(
         codebook, m0, metric_rank, backend=backend
     )
     chosen = ce_backend(m0.device, backend)
+    if init is not None or solver != "euler":
+        chosen = "torch"
     dim = m0.numel()
     n_code = int(codebook.shape[0]) if codebook.ndim == 2 else 0
     rank = int(metric_basis.shape[0]) if metric_basis.ndim == 2 else 0
@@ -706,6 +1073,476 @@ def relax_packed(
         noise_scale,
         seed,
         dense_w=dense_w,
+        sync_every=sync_every,
+        warmup_steps=warmup_steps,
+        init=init,
+        solver=solver,
+        momentum=momentum,
+        anderson_depth=anderson_depth,
+        operator=operator,
+    )
+
+
+def _spmm_torch(
+    x: torch.Tensor,
+    *,
+    sparse_mat: torch.Tensor | None = None,
+    dense_w: torch.Tensor | None = None,
+) -> torch.Tensor:
+    """Row-batched W x for x of shape (B, dim): one SpMM instead of B SpMVs."""
+    if dense_w is not None:
+        return x @ dense_w.transpose(0, 1)
+    return torch.sparse.mm(sparse_mat, x.transpose(0, 1)).transpose(0, 1)
+
+
+def _batch_blocks(
+    blocks,
+    n_batch: int,
+    like: torch.Tensor,
+) -> list[torch.Tensor]:
+    dim = like.shape[-1]
+    if blocks is None:
+        return [like.new_empty((0, dim)) for _ in range(n_batch)]
+    if torch.is_tensor(blocks):
+        if blocks.ndim == 2:
+            return [blocks] * n_batch
+        if blocks.ndim == 3 and blocks.shape[0] == n_batch:
+            return list(blocks.unbind(0))
+        raise ValueError(f"expected (n, dim) or ({n_batch}, n, dim) blocks, got {tuple(blocks.shape)}")
+    blocks = list(blocks)
+    if len(blocks) != n_batch:
+        raise ValueError(f"expected {n_batch} per-row blocks, got {len(blocks)}")
+    return [blk if blk is not None else like.new_empty((0, dim)) for blk in blocks]
+
+
+def _pad_rows(
+    blocks: list[torch.Tensor],
+    like: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Zero-pad ragged (n_i, dim) blocks into (B, n_max, dim) plus a validity mask."""
+    dim = like.shape[-1]
+    counts = [int(blk.shape[0]) if blk.ndim == 2 else 0 for blk in blocks]
+    n_max = max(counts, default=0)
+    out = like.new_zeros((len(blocks), n_max, dim))
+    mask = torch.zeros((len(blocks), n_max), dtype=torch.bool, device=like.device)
+    for i, (blk, n) in enumerate(zip(blocks, counts)):
+        if n:
+            out[i, :n] = blk.to(device=like.device, dtype=like.dtype)
+            mask[i, :n] = True
+    return out, mask
+
+
+def _codebook_logits_batch(
+    m: torch.Tensor,
+    codebook: torch.Tensor,
+    code_mask: torch.Tensor,
+    beta: float,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    logits = beta * (codebook @ m.unsqueeze(-1)).squeeze(-1)
+    logits = logits.masked_fill(~code_mask, float("-inf"))
+    has_code = code_mask.any(dim=1, keepdim=True)
+    # Rows without a codebook get finite dummy logits; their pull is masked out below.
+    return torch.where(has_code, logits, torch.zeros_like(logits)), has_code.squeeze(1)
+
+
+def _codebook_pull_torch_batch(
+    m: torch.Tensor,
+    codebook: torch.Tensor,
+    code_mask: torch.Tensor,
+    beta: float,
+    cb_w: float,
+) -> torch.Tensor:
+    logits, has_code = _codebook_logits_batch(m, codebook, code_mask, beta)
+    w = F.softmax(logits, dim=1)
+    grad = -cb_w * (w.unsqueeze(1) @ codebook).squeeze(1)
+    return grad * has_code.unsqueeze(1).to(grad.dtype)
+
+
+def _natural_direction_torch_batch(
+    grad: torch.Tensor,
+    phi: torch.Tensor,
+    recent_var: torch.Tensor,
+    metric_basis: torch.Tensor,
+    lambda0: torch.Tensor,
+    lambda_phi: float,
+    lambda_var: float,
+) -> torch.Tensor:
+    """Row-batched `_natural_direction_torch`; zero-padded basis rows are inert."""
+    diag = lambda0.unsqueeze(1) + lambda_phi * phi.square() + lambda_var * recent_var
+    inv_diag = diag.clamp_min(1e-4).reciprocal()
+    inv_diag_grad = grad * inv_diag
+    if metric_basis.shape[1] == 0:
+        return inv_diag_grad
+
+    weighted_basis = metric_basis * inv_diag.unsqueeze(1)
+    small = torch.eye(
+        metric_basis.shape[1],
+        device=grad.device,
+        dtype=grad.dtype,
+    ) + metric_basis @ weighted_basis.transpose(1, 2)
+    rhs = metric_basis @ inv_diag_grad.unsqueeze(-1)
+    tmp = torch.linalg.solve(small, rhs)
+    correction = (metric_basis.transpose(1, 2) @ tmp).squeeze(-1)
+    return inv_diag_grad - correction * inv_diag
+
+
+def _fdt_noise_torch_batch(
+    z: torch.Tensor,
+    phi: torch.Tensor,
+    recent_var: torch.Tensor,
+    metric_basis: torch.Tensor,
+    lambda0: torch.Tensor,
+    lambda_phi: float,
+    lambda_var: float,
+) -> torch.Tensor:
+    diag = lambda0.unsqueeze(1) + lambda_phi * phi.square() + lambda_var * recent_var
+    inv_sqrt_diag = diag.clamp_min(1e-4).rsqrt()
+    if metric_basis.shape[1] == 0:
+        return z * inv_sqrt_diag
+
+    q = metric_basis * inv_sqrt_diag.unsqueeze(1)
+    q = torch.where(torch.isfinite(q), q, torch.zeros_like(q))
+    _, s_q, vh_q = torch.linalg.svd(q, full_matrices=False)
+    factors = 1.0 - 1.0 / torch.sqrt(1.0 + s_q.square())
+    proj = (vh_q @ z.unsqueeze(-1)).squeeze(-1)
+    corrected = z - (vh_q.transpose(1, 2) @ (factors * proj).unsqueeze(-1)).squeeze(-1)
+    return inv_sqrt_diag * corrected
+
+
+def _energy_parts_torch_batch(
+    m: torch.Tensor,
+    w_m: torch.Tensor,
+    b: torch.Tensor,
+    phi: torch.Tensor,
+    codebook: torch.Tensor,
+    code_mask: torch.Tensor,
+    portal: float,
+    beta: float,
+    cb_w: float,
+    bypass_c: torch.Tensor,
+    bypass_coeff: float,
+) -> Tuple[torch.Tensor, Tuple[torch.Tensor, ...]]:
+    e_hop = -0.5 * (m * w_m).sum(dim=1)
+    e_bias = -(m * b).sum(dim=1)
+    m_phi = (m * phi).sum(dim=1)
+    e_portal = -portal * m_phi
+    e_bypass = -bypass_coeff * bypass_c * m_phi
+    if codebook.shape[1] == 0:
+        e_cb = torch.zeros_like(e_hop)
+    else:
+        logits, has_code = _codebook_logits_batch(m, codebook, code_mask, beta)
+        e_cb = -(cb_w / max(beta, 1e-6)) * torch.logsumexp(logits, dim=1)
+        e_cb = torch.where(has_code, e_cb, torch.zeros_like(e_cb))
+    total = e_hop + e_bias + e_portal + e_cb + e_bypass
+    return total, (e_hop, e_bias, e_portal, e_cb)
+
+
+@torch.no_grad()
+def _relax_packed_torch_batch(
+    values: torch.Tensor,
+    col_idx: torch.Tensor,
+    row_ptr: torch.Tensor,
+    b: torch.Tensor,
+    phi: torch.Tensor,
+    m0: torch.Tensor,
+    codebook: torch.Tensor,
+    code_mask: torch.Tensor,
+    metric_basis: torch.Tensor,
+    portal: float,
+    bypass: float,
+    t_wake: float,
+    beta: float,
+    cb_w: float,
+    lambda0: float,
+    lambda_phi: float,
+    lambda_var: float,
+    tau: float,
+    dt: float,
+    max_steps: int,
+    tol: float,
+    anneal_ratio: float,
+    noise_scale: float,
+    seed: int,
+    dense_w: Optional[torch.Tensor] = None,
+    sync_every: int = 8,
+    warmup_steps: int = 30,
+    operator: Optional[SparseRelaxOperator] = None,
+) -> Tuple[torch.Tensor, list[Dict[str, list[float]]], list[int]]:
+    """Row-batched `_relax_packed_torch`.
+
+    Every row follows the single-state update rule. Converged rows are masked
+    immediately and leave the working set at the next host sync, so they stop
+    costing compute.
+    """
+    n_batch, dim = m0.shape
+    scale = m0.norm(dim=1)
+    scale = torch.where(scale > 0, scale, torch.ones_like(scale))
+    m = m0 / scale.unsqueeze(1)
+    b_n = b / scale.unsqueeze(1)
+    phi_n = F.normalize(phi, dim=1)
+    codebook_n = codebook / scale.view(-1, 1, 1)
+    basis = metric_basis
+
+    tau = max(float(tau), 1e-6)
+    dt_eff = min(float(dt), 0.9 * tau)
+    anneal_end = max(1, int(round(anneal_ratio * max_steps)))
+    t_eff = float(t_wake) / max(1, dim)
+
+    if operator is not None:
+        sparse_mat, dense_w = operator.sparse_mat, operator.dense_w
+    else:
+        sparse_mat = None
+        if dense_w is None:
+            sparse_mat = _csr_tensor(
+                values, col_idx, row_ptr, dim,
+                device=m.device, dtype=m.dtype,
+            )
+
+    if operator is not None and operator.spectral_radius is not None:
+        spectral_est = m.new_full((n_batch,), float(operator.spectral_radius))
+    else:
+        w_m_probe = _spmm_torch(m, sparse_mat=sparse_mat, dense_w=dense_w)
+        spectral_est = w_m_probe.norm(dim=1) / m.norm(dim=1).clamp_min(1e-8)
+    lambda0_rows = (2.0 * spectral_est * dt_eff / tau).clamp_min(float(lambda0))
+
+    # Every row is seeded like `relax_packed` and draws once per step, so all
+    # rows share one stream: a single draw expanded over the working set keeps
+    # a row's noise (and result) independent of its batch and of compaction.
+    gen = None
+    if noise_scale > 0.0:
+        gen = torch.Generator(device=m.device)
+        gen.manual_seed(int(seed))
+
+    # History rows: E, delta, E_hop, E_bias, E_portal, E_cb, bypass_C.
+    hist_buf = m.new_zeros((7, max_steps, n_batch))
+    steps = torch.zeros(n_batch, dtype=torch.long, device=m.device)
+    tail_len = min(16, max_steps)
+    tail = m.new_zeros((tail_len, n_batch, dim))
+    best_m = m.clone()
+    best_e = m.new_full((n_batch,), float("inf"))
+
+    idx = torch.arange(n_batch, device=m.device)
+    done = torch.zeros(n_batch, dtype=torch.bool, device=m.device)
+    sync_every = max(1, int(sync_every))
+    m1 = m.clone()
+    m2 = m.clone()
+
+    for k in range(max_steps):
+        c_k = (m - 2 * m1 + m2).norm(dim=1)
+        w_m = _spmm_torch(m, sparse_mat=sparse_mat, dense_w=dense_w)
+        grad = w_m + b_n + float(portal) * phi_n + (c_k * float(bypass)).unsqueeze(1) * phi_n
+        if codebook_n.shape[1]:
+            grad = grad + _codebook_pull_torch_batch(m, codebook_n, code_mask, beta, cb_w)
+
+        recent_var = 0.5 * ((m - m1).square() + (m1 - m2).square())
+        nat_grad = _natural_direction_torch_batch(
+            grad, phi_n, recent_var, basis, lambda0_rows, lambda_phi, lambda_var,
+        )
+
+        t_k = t_eff * max(0.0, 1.0 - k / anneal_end)
+        noise_std = math.sqrt(max(0.0, 2.0 * t_k * dt_eff / tau)) * max(0.0, noise_scale)
+        if noise_std > 0.0:
+            z_raw = torch.randn(
+                m.shape[1:], dtype=m.dtype, device=m.device, generator=gen
+            ).expand_as(m)
+            noise = noise_std * _fdt_noise_torch_batch(
+                z_raw, phi_n, recent_var, basis, lambda0_rows, lambda_phi, lambda_var,
+            )
+        else:
+            noise = torch.zeros_like(m)
+
+        dm = (dt_eff / tau) * nat_grad + noise
+        dm = torch.where(torch.isfinite(dm), dm, torch.zeros_like(dm))
+        m2, m1 = m1, m
+        m = m + dm
+        live = ~done
+        slot = k % tail_len
+        tail[slot, idx] = torch.where(live.unsqueeze(1), m, tail[slot, idx])
+
+        w_m_new = _spmm_torch(m, sparse_mat=sparse_mat, dense_w=dense_w)
+        e_total, (e_hop, e_bias, e_portal, e_cb) = _energy_parts_torch_batch(
+            m, w_m_new, b_n, phi_n, codebook_n, code_mask,
+            portal, beta, cb_w,
+            bypass_c=c_k, bypass_coeff=bypass,
+        )
+        delta = dm.norm(dim=1)
+        hist_buf[:, k, idx] = torch.stack([e_total, delta, e_hop, e_bias, e_portal, e_cb, c_k])
+        steps[idx] = steps[idx] + live.to(torch.long)
+
+        prev_best = best_e[idx]
+        better = live & (e_total < prev_best)
+        best_e[idx] = torch.where(better, e_total, prev_best)
+        best_m[idx] = torch.where(better.unsqueeze(1), m, best_m[idx])
+
+        if k > warmup_steps:
+            done = done | (delta < tol)
+        if (k + 1) % sync_every == 0 and bool(done.any()):
+            if bool(done.all()):
+                break
+            keep = ~done
+            idx, done = idx[keep], done[keep]
+            m, m1, m2 = m[keep], m1[keep], m2[keep]
+            b_n, phi_n = b_n[keep], phi_n[keep]
+            codebook_n, code_mask = codebook_n[keep], code_mask[keep]
+            basis, lambda0_rows = basis[keep], lambda0_rows[keep]
+
+    best_m = best_m * scale.unsqueeze(1)
+    tail = tail * scale.view(1, -1, 1)
+    hist_cpu = hist_buf.cpu()
+    steps_out = [int(s) for s in steps.tolist()]
+    hists: list[Dict[str, list[float]]] = []
+    for row, n_steps in enumerate(steps_out):
+        e_row, delta_row, hop_row, bias_row, portal_row, cb_row, bypass_row = (
+            series[:n_steps, row].tolist() for series in hist_cpu
+        )
+        n_tail = min(n_steps, tail_len)
+        tail_rows = tail[:n_tail, row]
+        if n_tail:
+            phi_var = (tail_rows - best_m[row].unsqueeze(0)).square().mean(dim=0)
+            hist_phi_var = phi_var.detach().cpu().tolist()
+        else:
+            hist_phi_var = []
+        iss_report = _iss_from_tail(
+            tail_states=deque(tail_rows.unbind(0)),
+            scale=float(scale[row]),
+            best_m=best_m[row],
+            c_k_history=bypass_row,
+            delta_history=delta_row,
+            phi=phi[row],
+            dt=dt_eff,
+            tau=tau,
+        )
+        hists.append({
+            "E": e_row,
+            "delta": delta_row,
+            "E_hop": hop_row,
+            "E_bias": bias_row,
+            "E_portal": portal_row,
+            "E_cb": cb_row,
+            "bypass_C": bypass_row,
+            "phi_var": hist_phi_var,
+            "iss": iss_report,
+        })
+    return best_m, hists, steps_out
+
+
+@torch.no_grad()
+@profiled("ce_ops.relax_packed_batch")
+def relax_packed_batch(
+    values: torch.Tensor,
+    col_idx: torch.Tensor,
+    row_ptr: torch.Tensor,
+    b: torch.Tensor,
+    phi: torch.Tensor,
+    m0: torch.Tensor,
+    codebooks=None,
+    metric_bases=None,
+    *,
+    portal: float,
+    bypass: float,
+    t_wake: float,
+    beta: float = 1.0,
+    cb_w: float = DEFAULT_CB_W,
+    lambda0: float = 1.0,
+    lambda_phi: float = 0.5,
+    lambda_var: float = 0.25,
+    tau: float = 1.0,
+    dt: float = 0.01,
+    max_steps: int = 500,
+    tol: float = 1e-4,
+    anneal_ratio: float = 0.6,
+    noise_scale: float = 1.0,
+    metric_rank: int = 8,
+    backend: str = "auto",
+    seed: int = 0,
+    dense_w: Optional[torch.Tensor] = None,
+    sync_every: int = 8,
+    warmup_steps: int = 30,
+    operator: Optional[SparseRelaxOperator] = None,
+    solver: str = "euler",
+) -> Tuple[torch.Tensor, list[Dict[str, list[float]]], list[int]]:
+    """Relax B independent prompt states (rows of `m0`, `b`, `phi`) against one W.
+
+    `codebooks` and `metric_bases` are per-row: a sequence of (n_i, dim)
+    tensors, a stacked (B, n, dim) tensor, or a single (n, dim) tensor shared
+    by every row. Ragged rows are zero-padded and masked. The torch path runs
+    one SpMM per step for the "euler" solver; native backends and the
+    accelerated solvers relax row by row through `relax_packed`. Every row
+    draws its noise from its own generator seeded with `seed`, matching a
+    per-row `relax_packed` call. Returns (best_m (B, dim), per-row hist
+    dicts, per-row steps).
+    """
+    if solver not in RELAX_SOLVERS:
+        raise ValueError(f"unknown relax solver: {solver}")
+    if m0.ndim != 2:
+        raise ValueError(f"m0 must be (B, dim), got {tuple(m0.shape)}")
+    if b.shape != m0.shape or phi.shape != m0.shape:
+        raise ValueError("b, phi and m0 must share the same (B, dim) shape")
+    n_batch = int(m0.shape[0])
+    code_blocks = _batch_blocks(codebooks, n_batch, m0)
+    if metric_bases is None:
+        basis_blocks = [
+            build_metric_basis(code_blocks[row], m0[row], metric_rank, backend=backend)
+            for row in range(n_batch)
+        ]
+    else:
+        basis_blocks = _batch_blocks(metric_bases, n_batch, m0)
+
+    if n_batch == 0:
+        return m0.clone(), [], []
+
+    chosen = ce_backend(m0.device, backend)
+    if chosen != "torch" or solver != "euler":
+        outs = [
+            relax_packed(
+                values, col_idx, row_ptr,
+                b[row], phi[row], m0[row],
+                code_blocks[row], basis_blocks[row],
+                portal=portal, bypass=bypass, t_wake=t_wake,
+                beta=beta, cb_w=cb_w,
+                lambda0=lambda0, lambda_phi=lambda_phi, lambda_var=lambda_var,
+                tau=tau, dt=dt, max_steps=max_steps, tol=tol,
+                anneal_ratio=anneal_ratio, noise_scale=noise_scale,
+                metric_rank=metric_rank, backend=backend, seed=seed, dense_w=dense_w,
+                sync_every=sync_every, warmup_steps=warmup_steps, operator=operator,
+                solver=solver,
+            )
+            for row in range(n_batch)
+        ]
+        best_m = torch.stack([out[0].to(m0.device) for out in outs], dim=0)
+        return best_m, [out[1] for out in outs], [int(out[2]) for out in outs]
+
+    codebook, code_mask = _pad_rows(code_blocks, m0)
+    basis, _ = _pad_rows(basis_blocks, m0)
+    return _relax_packed_torch_batch(
+        values,
+        col_idx,
+        row_ptr,
+        b,
+        phi,
+        m0,
+        codebook,
+        code_mask,
+        basis,
+        portal,
+        bypass,
+        t_wake,
+        beta,
+        cb_w,
+        lambda0,
+        lambda_phi,
+        lambda_var,
+        tau,
+        dt,
+        max_steps,
+        tol,
+        anneal_ratio,
+        noise_scale,
+        seed,
+        dense_w=dense_w,
+        sync_every=sync_every,
+        warmup_steps=warmup_steps,
+        operator=operator,
     )
 
 
@@ -722,12 +1559,18 @@ def relax(
     t_wake: float,
     zero_tol: float = 0.0,
     backend: str = "auto",
+    operator: Optional[SparseRelaxOperator] = None,
     **kwargs,
 ) -> Tuple[torch.Tensor, Dict[str, list[float]], int]:
-    values, col_idx, row_ptr = pack_sparse(w, zero_tol=zero_tol, backend=backend)
-    dense_w = None
-    if backend != "rust" and values.numel() == w.numel():
-        dense_w = w
+    """Relax on a dense W; pass a prebuilt `operator` to skip re-packing W."""
+    if operator is not None:
+        values, col_idx, row_ptr = operator.pack
+        dense_w = operator.dense_w
+    else:
+        values, col_idx, row_ptr = pack_sparse(w, zero_tol=zero_tol, backend=backend)
+        dense_w = None
+        if backend != "rust" and values.numel() == w.numel():
+            dense_w = w
     return relax_packed(
         values,
         col_idx,
@@ -742,10 +1585,52 @@ def relax(
         t_wake=t_wake,
         backend=backend,
         dense_w=dense_w,
+        operator=operator,
         **kwargs,
     )
 
 
+def _pq_assign(rows: torch.Tensor, centers: torch.Tensor) -> torch.Tensor:
+    """Nearest centroid per subspace: rows (S, N, sub), centers (S, K, sub) -> (S, N)."""
+    half_sq = 0.5 * centers.pow(2).sum(dim=2)
+    return (half_sq.unsqueeze(1) - torch.bmm(rows, centers.transpose(1, 2))).argmin(dim=2)
+
+
+def _pq_kmeanspp_init(pool: torch.Tensor, n_centroid: int, gen: torch.Generator) -> torch.Tensor:
+    """k-means++ seeding run for every subspace at once; pool is (S, P, sub)."""
+    n_sub, pool_n, _ = pool.shape
+    sub_ids = torch.arange(n_sub)
+    first = torch.randint(pool_n, (n_sub,), generator=gen)
+    centers = [pool[sub_ids, first]]
+    best = (pool - centers[0].unsqueeze(1)).pow(2).sum(dim=2)
+    for _ in range(1, n_centroid):
+        weights = best.clamp_min(0.0)
+        weights = torch.where(weights.sum(dim=1, keepdim=True) > 0, weights, torch.ones_like(weights))
+        pick = torch.multinomial(weights, 1, generator=gen).squeeze(1)
+        center = pool[sub_ids, pick]
+        centers.append(center)
+        best = torch.minimum(best, (pool - center.unsqueeze(1)).pow(2).sum(dim=2))
+    return torch.stack(centers, dim=1)
+
+
+def pq_encode(
+    emb: torch.Tensor,
+    centroids: torch.Tensor,
+    *,
+    batch_size: int = 4096,
+) -> torch.Tensor:
+    """uint8 PQ codes (N, n_sub) of `emb` against `centroids` (n_sub, K, subdim)."""
+    emb_cpu = emb.detach().float().cpu()
+    n_sub, _, subdim = centroids.shape
+    centers = centroids.detach().float().cpu()
+    n_token = emb_cpu.shape[0]
+    codes = torch.empty((n_token, n_sub), dtype=torch.uint8)
+    for start in range(0, n_token, batch_size):
+        block = emb_cpu[start : start + batch_size].view(-1, n_sub, subdim).transpose(0, 1)
+        codes[start : start + block.shape[1]] = _pq_assign(block, centers).T.to(torch.uint8)
+    return codes
+
+
 def pq_build_codebook(
     emb: torch.Tensor,
     *,
@@ -755,13 +1640,28 @@ def pq_build_codebook(
     batch_size: int = 4096,
     sample_size: int = 16384,
     seed: int = 0,
+    init: str = "random",
+    tol: float = 0.0,
+    encode: bool = True,
 ) -> Dict[str, torch.Tensor | int]:
+    """Train PQ codebooks for all subspaces together with mini-batch k-means.
+
+    Each iteration assigns one sampled batch in every subspace with a single
+    batched matmul and updates centroids with `index_add_`/`bincount`
+    scatter-means. `init="kmeans++"` seeds from the sample pool with D^2
+    sampling. Training stops early once the fraction of batch rows whose
+    assignment changed since they were last seen is <= `tol`. `encode=False`
+    skips coding `emb` (callers that encode a different matrix use
+    `pq_encode`).
+    """
     emb_cpu = emb.detach().float().cpu().contiguous()
     n_token, dim = emb_cpu.shape
     if subdim <= 0 or dim % subdim != 0:
         raise ValueError(f"subdim must divide dim exactly: dim={dim}, subdim={subdim}")
     if bits <= 0 or bits > 8:
         raise ValueError(f"bits must be in [1, 8], got {bits}")
+    if init not in ("random", "kmeans++"):
+        raise ValueError(f"unknown PQ init: {init}")
     n_sub = dim // subdim
     n_centroid = 1 << bits
     if n_centroid > n_token:
@@ -769,52 +1669,51 @@ def pq_build_codebook(
 
     gen = torch.Generator(device="cpu")
     gen.manual_seed(int(seed))
+    subs = emb_cpu.view(n_token, n_sub, subdim).transpose(0, 1).contiguous()
 
-    centroids_out: list[torch.Tensor] = []
-    codes = torch.empty((n_token, n_sub), dtype=torch.uint8)
-
-    for sub_idx in range(n_sub):
-        start = sub_idx * subdim
-        stop = start + subdim
-        sub = emb_cpu[:, start:stop]
-
-        pool_n = min(sample_size, n_token)
-        pool_idx = torch.randperm(n_token, generator=gen)[:pool_n]
-        pool = sub.index_select(0, pool_idx)
-        init_idx = torch.randperm(pool.shape[0], generator=gen)[:n_centroid]
-        centers = pool.index_select(0, init_idx).clone()
-
-        for _ in range(max(1, iters)):
-            cur_batch = min(batch_size, n_token)
-            batch_idx = torch.randperm(n_token, generator=gen)[:cur_batch]
-            batch = sub.index_select(0, batch_idx)
-            dist = torch.cdist(batch, centers)
-            assign = dist.argmin(dim=1)
-
-            new_centers = centers.clone()
-            for cid in range(n_centroid):
-                mask = assign == cid
-                if mask.any():
-                    new_centers[cid] = batch[mask].mean(dim=0)
-                else:
-                    refill = torch.randint(pool.shape[0], (1,), generator=gen).item()
-                    new_centers[cid] = pool[refill]
-            centers = new_centers
-
-        all_assign: list[torch.Tensor] = []
-        for start_idx in range(0, n_token, batch_size):
-            stop_idx = min(start_idx + batch_size, n_token)
-            batch = sub[start_idx:stop_idx]
-            dist = torch.cdist(batch, centers)
-            all_assign.append(dist.argmin(dim=1).to(torch.uint8))
-        codes[:, sub_idx] = torch.cat(all_assign, dim=0)
-        centroids_out.append(centers.to(dtype=torch.float16))
+    pool_n = min(sample_size, n_token)
+    pool_idx = torch.randperm(n_token, generator=gen)[:pool_n]
+    pool = subs.index_select(1, pool_idx)
+    if init == "kmeans++":
+        centers = _pq_kmeanspp_init(pool, n_centroid, gen)
+    else:
+        init_idx = torch.randperm(pool_n, generator=gen)[:n_centroid]
+        centers = pool.index_select(1, init_idx).clone()
+
+    offsets = (torch.arange(n_sub) * n_centroid).unsqueeze(1)
+    last_assign = torch.full((n_sub, n_token), -1, dtype=torch.long)
+    iters_run = 0
+    for _ in range(max(1, iters)):
+        iters_run += 1
+        cur_batch = min(batch_size, n_token)
+        batch_idx = torch.randperm(n_token, generator=gen)[:cur_batch]
+        batch = subs.index_select(1, batch_idx)
+        assign = _pq_assign(batch, centers)
+
+        flat = (assign + offsets).reshape(-1)
+        counts = torch.bincount(flat, minlength=n_sub * n_centroid)
+        sums = torch.zeros((n_sub * n_centroid, subdim), dtype=batch.dtype)
+        sums.index_add_(0, flat, batch.reshape(-1, subdim))
+        centers = (sums / counts.clamp_min(1).unsqueeze(1).to(sums.dtype)).view(n_sub, n_centroid, subdim)
+        empty = (counts == 0).view(n_sub, n_centroid)
+        if bool(empty.any()):
+            refill = torch.randint(pool_n, (int(empty.sum()),), generator=gen)
+            centers[empty] = pool[empty.nonzero(as_tuple=True)[0], refill]
+
+        prev = last_assign.index_select(1, batch_idx)
+        seen = prev >= 0
+        last_assign[:, batch_idx] = assign
+        if bool(seen.any()):
+            changed = ((prev != assign) & seen).sum().item() / seen.sum().item()
+            if changed <= tol:
+                break
 
     return {
-        "centroids": torch.stack(centroids_out, dim=0),
-        "codes": codes,
+        "centroids": centers.to(dtype=torch.float16),
+        "codes": pq_encode(emb_cpu, centers, batch_size=batch_size) if encode else None,
         "subdim": subdim,
         "bits": bits,
+        "iters_run": iters_run,
     }
 
 
@@ -839,16 +1738,136 @@ def pq_reconstruct_tokens(
     return torch.cat(parts, dim=1).to(dtype=torch.float32)
 
 
+def pq_offset_codes(codes: torch.Tensor, n_centroid: int) -> torch.Tensor:
+    """Codes shifted by `sub * n_centroid`, indexing a flattened (n_sub * K) LUT.
+
+    Stored as int32 (half the size of int64; `index_select` takes either),
+    since the flattened LUT is far below 2**31 entries.
+    """
+    offsets = torch.arange(codes.shape[1], device=codes.device, dtype=torch.int32) * int(n_centroid)
+    return codes.to(torch.int32) + offsets.unsqueeze(0)
+
+
 def pq_scores(
     query: torch.Tensor,
     centroids: torch.Tensor,
     codes: torch.Tensor,
+    *,
+    offset_codes: torch.Tensor | None = None,
+    lut_bits: int | None = None,
+    chunk_size: int = 65536,
 ) -> torch.Tensor:
-    query = query.to(dtype=torch.float32)
-    n_sub, _, subdim = centroids.shape
-    query_parts = query.view(n_sub, subdim)
-    lut = torch.einsum("md,mkd->mk", query_parts, centroids.to(dtype=torch.float32))
-    scores = torch.zeros(codes.shape[0], device=lut.device, dtype=lut.dtype)
-    for sub_idx in range(n_sub):
-        scores = scores + lut[sub_idx].index_select(0, codes[:, sub_idx].long())
-    return scores
+    """Asymmetric-distance inner products of `query` (d,) or (B, d) with PQ rows.
+
+    The per-query LUT is flattened to (B, n_sub * K) and every chunk of rows
+    is scored with one gather through `offset_codes` (see `pq_offset_codes`;
+    pass it in to reuse it across calls) and one sum. `lut_bits=8` quantizes
+    the LUT with a shared per-query scale and per-subspace offsets and
+    accumulates uint8 entries in int32.
+    """
+    n_sub, n_centroid, subdim = centroids.shape
+    single = query.ndim == 1
+    q = query.to(dtype=torch.float32).view(-1, n_sub, subdim)
+    lut = torch.einsum("bmd,mkd->bmk", q, centroids.to(dtype=torch.float32))
+    if offset_codes is None:
+        offset_codes = pq_offset_codes(codes, n_centroid)
+    offset_codes = offset_codes.to(device=lut.device)
+
+    if lut_bits is None:
+        table = lut.reshape(q.shape[0], -1)
+        bias = None
+        scale = None
+    elif lut_bits == 8:
+        lo = lut.amin(dim=2, keepdim=True)
+        scale = (lut - lo).amax(dim=(1, 2)).clamp_min(1e-12) / 255.0
+        table = torch.round((lut - lo) / scale.view(-1, 1, 1)).to(torch.uint8).reshape(q.shape[0], -1)
+        bias = lo.sum(dim=(1, 2))
+    else:
+        raise ValueError(f"lut_bits must be None or 8, got {lut_bits}")
+
+    n_row = offset_codes.shape[0]
+    scores = torch.empty((q.shape[0], n_row), device=lut.device, dtype=torch.float32)
+    for start in range(0, n_row, max(1, int(chunk_size))):
+        block = offset_codes[start : start + chunk_size]
+        gathered = table.index_select(1, block.reshape(-1)).view(q.shape[0], block.shape[0], n_sub)
+        if bias is None:
+            scores[:, start : start + block.shape[0]] = gathered.sum(dim=2)
+        else:
+            scores[:, start : start + block.shape[0]] = gathered.sum(dim=2, dtype=torch.int32).float()
+    if bias is not None:
+        scores = scores * scale.unsqueeze(1) + bias.unsqueeze(1)
+    return scores[0] if single else scores
+
+
+def ivf_build_index(
+    rows: torch.Tensor,
+    *,
+    n_lists: int,
+    iters: int = 10,
+    batch_size: int = 8192,
+    seed: int = 0,
+) -> Dict[str, torch.Tensor]:
+    """Inverted-file partition of `rows` (V, D) for maximum inner product search.
+
+    Lloyd k-means assigns every row to one of `n_lists` centroids. Each list
+    also keeps its radius `max ||row - centroid||`, so `q . c + ||q|| * r` is an
+    upper bound on any inner product inside the list (Cauchy-Schwarz) and
+    lists can be probed in bound order. `lists` is (n_lists, max_len) row ids
+    padded with -1.
+    """
+    rows_cpu = rows.detach().float().cpu().contiguous()
+    n_row = int(rows_cpu.shape[0])
+    n_lists = max(1, min(int(n_lists), n_row))
+    gen = torch.Generator(device="cpu")
+    gen.manual_seed(int(seed))
+    centers = rows_cpu.index_select(0, torch.randperm(n_row, generator=gen)[:n_lists]).clone()
+
+    def assign_rows(centers: torch.Tensor) -> torch.Tensor:
+        half_sq = 0.5 * centers.pow(2).sum(dim=1)
+        out = []
+        for start in range(0, n_row, batch_size):
+            block = rows_cpu[start : start + batch_size]
+            out.append((block @ centers.T - half_sq).argmax(dim=1))
+        return torch.cat(out, dim=0)
+
+    for _ in range(max(1, int(iters))):
+        assign = assign_rows(centers)
+        counts = torch.bincount(assign, minlength=n_lists)
+        sums = torch.zeros_like(centers).index_add_(0, assign, rows_cpu)
+        empty = counts == 0
+        centers = sums / counts.clamp_min(1).unsqueeze(1).to(sums.dtype)
+        if bool(empty.any()):
+            refill = torch.randint(n_row, (int(empty.sum()),), generator=gen)
+            centers[empty] = rows_cpu.index_select(0, refill)
+
+    assign = assign_rows(centers)
+    counts = torch.bincount(assign, minlength=n_lists)
+    dist = (rows_cpu - centers.index_select(0, assign)).norm(dim=1)
+    radii = torch.zeros(n_lists, dtype=torch.float32).scatter_reduce(0, assign, dist, reduce="amax")
+    order = torch.argsort(assign, stable=True)
+    offsets = torch.cumsum(counts, dim=0) - counts
+    sorted_assign = assign.index_select(0, order)
+    slot = torch.arange(n_row) - offsets.index_select(0, sorted_assign)
+    lists = torch.full((n_lists, max(int(counts.max()), 1)), -1, dtype=torch.long)
+    lists[sorted_assign, slot] = order
+    return {"centroids": centers, "radii": radii, "lists": lists}
+
+
+def ivf_probe(
+    query: torch.Tensor,
+    centroids: torch.Tensor,
+    radii: torch.Tensor,
+    lists: torch.Tensor,
+    nprobe: int,
+) -> torch.Tensor:
+    """Row ids of the `nprobe` lists with the highest inner-product bound.
+
+    `query` is (D,) or (B, D); the result is (S,) or (B, S) ids padded with -1
+    (callers rerank the shortlist exactly).
+    """
+    single = query.ndim == 1
+    q = query.float().view(-1, centroids.shape[1])
+    bound = q @ centroids.float().T + q.norm(dim=1, keepdim=True) * radii.float().unsqueeze(0)
+    probe = torch.topk(bound, min(max(int(nprobe), 1), int(centroids.shape[0])), dim=1).indices
+    ids = lists.index_select(0, probe.reshape(-1)).view(q.shape[0], -1)
+    return ids[0] if single else ids
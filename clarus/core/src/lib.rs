@@ -13,7 +13,7 @@ pub use engine::runtime_types::{CellState, Mode, RelaxInput, RelaxOutput, Snapsh
 #[cfg(feature = "python")]
 mod python_binding {
     use pyo3::prelude::*;
-    use numpy::{PyReadonlyArray1, PyArray1, IntoPyArray};
+    use numpy::{PyReadonlyArray1, PyReadwriteArray1, PyArray1, IntoPyArray};
     use crate::engine::nn_ops;
     use crate::engine::ce_riemann;
     use crate::engine::kernel;
@@ -348,6 +348,57 @@ mod python_binding {
         )
     }
 
+    /// In-place variant of `nn_brain_step`: the seven state arrays are updated
+    /// where they live, so the caller can keep persistent host buffers.
+    #[pyfunction]
+    #[allow(clippy::too_many_arguments)]
+    fn nn_brain_step_inplace<'py>(
+        w_values: PyReadonlyArray1<'py, f32>,
+        w_col_idx: PyReadonlyArray1<'py, i32>,
+        w_row_ptr: PyReadonlyArray1<'py, i32>,
+        mut activation: PyReadwriteArray1<'py, f32>,
+        mut refractory: PyReadwriteArray1<'py, f32>,
+        mut memory_trace: PyReadwriteArray1<'py, f32>,
+        mut adaptation: PyReadwriteArray1<'py, f32>,
+        mut stp_u: PyReadwriteArray1<'py, f32>,
+        mut stp_x: PyReadwriteArray1<'py, f32>,
+        mut bitfield: PyReadwriteArray1<'py, u8>,
+        external: PyReadonlyArray1<'py, f32>,
+        goal: PyReadonlyArray1<'py, f32>,
+        replay: PyReadonlyArray1<'py, f32>,
+        mode: u8,
+        energy_budget: usize,
+    ) -> (usize, f32) {
+        let mode_enum = match mode {
+            1 => runtime_types::Mode::Nrem,
+            2 => runtime_types::Mode::Rem,
+            _ => runtime_types::Mode::Wake,
+        };
+        let mp = kernel::ModeParams::from_mode(mode_enum);
+        let cfg = kernel::StepConfig {
+            energy_budget,
+            ..Default::default()
+        };
+        let out = kernel::brain_step(
+            w_values.as_slice().expect("contiguous"),
+            w_col_idx.as_slice().expect("contiguous"),
+            w_row_ptr.as_slice().expect("contiguous"),
+            activation.as_slice_mut().expect("contiguous"),
+            refractory.as_slice_mut().expect("contiguous"),
+            memory_trace.as_slice_mut().expect("contiguous"),
+            adaptation.as_slice_mut().expect("contiguous"),
+            stp_u.as_slice_mut().expect("contiguous"),
+            stp_x.as_slice_mut().expect("contiguous"),
+            bitfield.as_slice_mut().expect("contiguous"),
+            external.as_slice().expect("contiguous"),
+            goal.as_slice().expect("contiguous"),
+            replay.as_slice().expect("contiguous"),
+            &mp,
+            &cfg,
+        );
+        (out.active_count, out.energy)
+    }
+
     #[pyfunction]
     #[allow(clippy::too_many_arguments)]
     fn nn_ce_mfa_fwd<'py>(
@@ -527,6 +578,7 @@ mod python_binding {
         m.add_function(wrap_pyfunction!(nn_ce_codebook_pull, m)?)?;
         m.add_function(wrap_pyfunction!(nn_ce_relax_fwd, m)?)?;
         m.add_function(wrap_pyfunction!(nn_brain_step, m)?)?;
+        m.add_function(wrap_pyfunction!(nn_brain_step_inplace, m)?)?;
         m.add_function(wrap_pyfunction!(nn_ce_mfa_fwd, m)?)?;
         m.add_function(wrap_pyfunction!(nn_ce_dual_attn_fwd, m)?)?;
         m.add_function(wrap_pyfunction!(nn_ce_euler_fwd, m)?)?;
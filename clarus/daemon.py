@@ -15,6 +15,7 @@ from __future__ import annotations
 
 import math
 import os
+import queue
 import threading
 import time
 from collections import deque
@@ -62,6 +63,7 @@ class DaemonConfig:
     stdp_interval: int = 10
     consciousness_enabled: bool = True
     log_interval: int = 100
+    warm_cache_size: int = 0
 
 
 @dataclass
@@ -92,7 +94,12 @@ class BrainDaemon:
         backend: str = "torch",
     ) -> None:
         self.config = config or DaemonConfig()
-        self.eng = CEEngine(engine_path, device=device, backend=backend)
+        self.eng = CEEngine(
+            engine_path,
+            device=device,
+            backend=backend,
+            warm_cache_size=self.config.warm_cache_size,
+        )
         self.eng._skip_ln_for_standalone = True
         self.eng.decoder_query_blend = 0.0
 
@@ -149,6 +156,34 @@ class BrainDaemon:
         event.wait(timeout=timeout)
         return result[0] if result else ""
 
+    def query_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 30,
+        timeout: float = 10.0,
+        cancel: threading.Event | None = None,
+    ):
+        """Streaming query: yields per-token events as the daemon samples them.
+
+        Events are the dicts produced by `CEEngine.stream_generate`; the last
+        one has `done=True`. Setting `cancel`, closing the generator, or going
+        `timeout` seconds without an event stops generation on the daemon side.
+        """
+        cancel = cancel if cancel is not None else threading.Event()
+        events: queue.Queue = queue.Queue()
+        self._query_queue.append(("query_stream", prompt, events, cancel, max_tokens))
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=timeout)
+                except queue.Empty:
+                    return
+                yield event
+                if event.get("done"):
+                    return
+        finally:
+            cancel.set()
+
     def teach(self, fact: str, repetitions: int = 3, timeout: float = 15.0) -> dict:
         """Teach the brain a fact. Encodes it into hippocampus with high priority.
         Repeats encoding to strengthen the memory trace."""
@@ -184,6 +219,8 @@ class BrainDaemon:
                 cmd_type = cmd[0]
                 if cmd_type == "query":
                     self._handle_query(cmd[1], cmd[2], cmd[3], cmd[4])
+                elif cmd_type == "query_stream":
+                    self._handle_query_stream(cmd[1], cmd[2], cmd[3], cmd[4])
                 elif cmd_type == "teach":
                     self._handle_teach(cmd[1], cmd[2], cmd[3], cmd[4])
                 elif cmd_type == "think":
@@ -211,8 +248,7 @@ class BrainDaemon:
             lambda_var=0.25, noise_scale=noise, seed=0,
         )
 
-    def _relax_and_generate(self, prompt: str, max_tokens: int = 30,
-                            temperature: float = 0.6, steps: int = 20) -> tuple[str, torch.Tensor]:
+    def _relax_prompt(self, prompt: str, steps: int = 20) -> tuple[torch.Tensor, torch.Tensor]:
         ids = self.eng.tok.encode(prompt, return_tensors="pt")
         m0, phi = self.eng.runtime_prompt_state(ids)
 
@@ -228,22 +264,26 @@ class BrainDaemon:
             m0=m0, phi=phi, best_layer=0, layer_scores={0: 0.0},
         )
         rr = self.eng.relax_context(pc, ce_args)
+        return ids, rr["m_star"].detach()
+
+    def _relax_and_generate(self, prompt: str, max_tokens: int = 30,
+                            temperature: float = 0.6, steps: int = 20) -> tuple[str, torch.Tensor]:
+        ids, m_star = self._relax_prompt(prompt, steps=steps)
         text, tids, _ = self.eng.standalone_generate(
-            ids, rr["m_star"],
+            ids, m_star,
             max_tok=max_tokens, temperature=temperature,
             top_k=40, repeat_penalty=2.0,
         )
-        return text, rr["m_star"].detach()
+        return text, m_star
 
-    def _handle_query(self, prompt, event, result, max_tokens) -> None:
+    def _wake_for_query(self, prompt: str) -> None:
         self._idle_counter = 0
         ext = self._encode_prompt(prompt)
         for _ in range(3):
             step = self.runtime.step(external_input=ext, force_mode=RuntimeMode.WAKE)
             self._post_step(step, ext)
 
-        text, m_star = self._relax_and_generate(prompt, max_tokens)
-
+    def _finish_query(self, prompt: str, text: str, m_star: torch.Tensor) -> None:
         self.runtime.hippocampus.encode(
             self.runtime.activation,
             value=m_star[:self.runtime.config.dim],
@@ -253,9 +293,31 @@ class BrainDaemon:
         self.stats.queries_processed += 1
         self.wm.append(prompt, text)
 
+    def _handle_query(self, prompt, event, result, max_tokens) -> None:
+        self._wake_for_query(prompt)
+        text, m_star = self._relax_and_generate(prompt, max_tokens)
+        self._finish_query(prompt, text, m_star)
+
         result.append(text)
         event.set()
 
+    def _handle_query_stream(self, prompt, events, cancel, max_tokens) -> None:
+        if cancel.is_set():
+            return
+        self._wake_for_query(prompt)
+        ids, m_star = self._relax_prompt(prompt)
+        final = None
+        for event in self.eng.stream_generate(
+            ids, m_star,
+            max_tok=max_tokens, temperature=0.6,
+            top_k=40, repeat_penalty=2.0, cancel=cancel,
+        ):
+            events.put(event)
+            if event["done"]:
+                final = event
+        if final is not None and final["finish_reason"] != "cancelled":
+            self._finish_query(prompt, final["text"], m_star)
+
     def _handle_teach(self, fact, event, result, repetitions) -> None:
         """Teach: encode the fact multiple times with increasing priority.
         Each repetition strengthens the trace through spaced encoding."""
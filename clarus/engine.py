@@ -10,9 +10,13 @@ import json
 import math
 import os
 import sys
+import threading
 import time
-from dataclasses import dataclass
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from types import SimpleNamespace
+from typing import Hashable
 
 import torch
 import torch.nn.functional as F
@@ -20,22 +24,42 @@ import torch.nn.functional as F
 try:
     from .ce_ops import (
         build_metric_basis as ce_build_metric_basis,
+        build_relax_operator as ce_build_relax_operator,
+        extreme_eigs as ce_extreme_eigs,
+        grid_stencil_laplacian as ce_grid_stencil_laplacian,
+        ivf_build_index as ce_ivf_build_index,
+        ivf_probe as ce_ivf_probe,
         pack_sparse as ce_pack_sparse,
         pq_reconstruct_tokens,
+        pq_offset_codes,
         pq_scores,
+        RELAX_SOLVERS,
         relax_packed as ce_relax_packed,
+        relax_packed_batch as ce_relax_packed_batch,
     )
+    from .artifact import compact_tensors, content_hash, is_artifact_dir, load_artifact, save_artifact_dir
     from .constants import AD, PORTAL, BYPASS, T_WAKE, NORM_EPS
+    from .profiling import PROFILER, count as prof_count, observe as prof_observe, profiled, span as prof_span
     from .utils import safe_print, normalize_vector, resolve_device
 except ImportError:
     from clarus.ce_ops import (
         build_metric_basis as ce_build_metric_basis,
+        build_relax_operator as ce_build_relax_operator,
+        extreme_eigs as ce_extreme_eigs,
+        grid_stencil_laplacian as ce_grid_stencil_laplacian,
+        ivf_build_index as ce_ivf_build_index,
+        ivf_probe as ce_ivf_probe,
         pack_sparse as ce_pack_sparse,
         pq_reconstruct_tokens,
+        pq_offset_codes,
         pq_scores,
+        RELAX_SOLVERS,
         relax_packed as ce_relax_packed,
+        relax_packed_batch as ce_relax_packed_batch,
     )
+    from clarus.artifact import compact_tensors, content_hash, is_artifact_dir, load_artifact, save_artifact_dir
     from clarus.constants import AD, PORTAL, BYPASS, T_WAKE, NORM_EPS
+    from clarus.profiling import PROFILER, count as prof_count, observe as prof_observe, profiled, span as prof_span
     from clarus.utils import safe_print, normalize_vector, resolve_device
 
 try:
@@ -67,6 +91,29 @@ def postprocess_output(text: str) -> str:
     return text
 
 
+# Keys whose values `CEEngine.finalize_artifact` vouches for. The hash covers
+# the derived tensors plus the parameters they were derived from.
+FINALIZED_VERSION = 1
+FINALIZED_KEYS = (
+    "d",
+    "target_w_density",
+    "r_c",
+    "active_ratio",
+    "struct_ratio",
+    "W",
+    "W_values",
+    "W_col_idx",
+    "W_row_ptr",
+    "W_eigvecs",
+    "active_dim_mask",
+    "struct_dim_mask",
+    "background_dim_mask",
+    "decoder_state_proj",
+    "decoder_prev_proj",
+    "decoder_token_state_proj",
+)
+
+
 DEFAULT_PROMPTS = (
     "인공지능의 미래는",
     "오늘 날씨가",
@@ -139,9 +186,357 @@ class PromptContext:
     layer_scores: dict[int, float]
 
 
+@dataclass
+class RelaxWarmStartCache:
+    """Bounded LRU of relaxed states keyed by (relax scope, token-id prefix).
+
+    The scope is any hashable that pins everything the relaxed state depends
+    on besides the prompt: `CEEngine` uses the relax version plus the relax
+    arguments, so a state relaxed under one config is never reused under
+    another.
+
+    A lookup tries the exact prefix first and then backs off up to
+    `max_backoff` trailing tokens, so a refresh after one new token still
+    finds the state relaxed for the previous prefix.
+    """
+
+    capacity: int = 64
+    max_backoff: int = 8
+    entries: OrderedDict = field(default_factory=OrderedDict)
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    def lookup(self, scope: Hashable, token_ids: list[int]) -> torch.Tensor | None:
+        ids = tuple(int(t) for t in token_ids)
+        shortest = max(1, len(ids) - max(0, int(self.max_backoff)))
+        for cut in range(len(ids), shortest - 1, -1):
+            key = (scope, ids[:cut])
+            m_star = self.entries.get(key)
+            if m_star is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return m_star
+        self.misses += 1
+        return None
+
+    def store(self, scope: Hashable, token_ids: list[int], m_star: torch.Tensor):
+        if self.capacity <= 0:
+            return
+        key = (scope, tuple(int(t) for t in token_ids))
+        self.entries[key] = m_star.detach().clone()
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        if self.entries:
+            self.invalidations += 1
+        self.entries.clear()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "capacity": int(self.capacity),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": sum(t.numel() * t.element_size() for t in self.entries.values()),
+        }
+
+
+_WARM_CACHE_ARGS = (
+    "steps", "seed", "cb_topk", "cb_weight", "metric_rank", "noise_scale", "dt", "beta",
+    "lambda0", "lambda_phi", "lambda_var", "backend",
+)
+
+_PQ_PINNED = 1 << 62
+
+
+@dataclass
+class PQTokenCache:
+    """Bounded slot table of fp32 token rows reconstructed from PQ codes.
+
+    `slot_of` maps token id -> slot (-1 when absent), so a batched lookup is
+    two gathers; misses are reconstructed once and written into the least
+    recently used slots. Rows from `pin` (terminal tokens) are never evicted
+    and are re-materialized after `clear`. Public methods hold `_lock`: the
+    async refresh worker reaches `lookup` through `token_embedding` while the
+    decode thread does the same.
+
+    Recency, eviction and the hit/miss/eviction counters stay on the codes'
+    device; a lookup syncs with the host once to learn whether anything
+    missed, and only the miss path syncs further. `slot_of` and `last_use`
+    carry one trailing sentinel entry that absorbs the writes for misses and
+    empty slots, so those updates need no boolean indexing.
+    """
+
+    capacity: int = 2048
+    slot_of: torch.Tensor | None = None
+    token_of: torch.Tensor | None = None
+    rows: torch.Tensor | None = None
+    last_use: torch.Tensor | None = None
+    pinned_ids: torch.Tensor | None = None
+    n_pinned: int = 0
+    clock: int = 0
+    # hits, misses, evictions
+    counts: torch.Tensor | None = None
+    invalidations: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+
+    def _counts(self, device: torch.device) -> torch.Tensor:
+        if self.counts is None:
+            self.counts = torch.zeros(3, dtype=torch.long, device=device)
+        elif self.counts.device != device:
+            self.counts = self.counts.to(device)
+        return self.counts
+
+    def _allocate(self, centroids: torch.Tensor, codes: torch.Tensor):
+        device = codes.device
+        dim = int(centroids.shape[0] * centroids.shape[2])
+        self.slot_of = torch.full((int(codes.shape[0]) + 1,), -1, dtype=torch.long, device=device)
+        self.token_of = torch.full((self.capacity,), -1, dtype=torch.long, device=device)
+        self.rows = torch.zeros((self.capacity, dim), dtype=torch.float32, device=device)
+        self.last_use = torch.full((self.capacity + 1,), -1, dtype=torch.long, device=device)
+        self.n_pinned = 0
+        if self.pinned_ids is not None and self.pinned_ids.numel():
+            self._insert(centroids, codes, self.pinned_ids.to(device), pinned=True)
+
+    def _insert(
+        self,
+        centroids: torch.Tensor,
+        codes: torch.Tensor,
+        token_ids: torch.Tensor,
+        *,
+        pinned: bool = False,
+    ) -> torch.Tensor:
+        """Reconstruct sorted unique uncached `token_ids` and cache as many as fit."""
+        recon = pq_reconstruct_tokens(centroids, codes, token_ids).float()
+        n_store = min(int(token_ids.numel()), self.capacity - self.n_pinned)
+        if n_store > 0:
+            # Pinned slots carry _PQ_PINNED, so they are never among the oldest n_store.
+            victims = torch.topk(self.last_use[: self.capacity], n_store, largest=False).indices
+            old = self.token_of.index_select(0, victims)
+            stale = old >= 0
+            self.slot_of[torch.where(stale, old, self.slot_of.shape[0] - 1)] = -1
+            self._counts(old.device)[2] += stale.sum()
+            stored = token_ids[:n_store]
+            self.slot_of[stored] = victims
+            self.token_of[victims] = stored
+            self.rows[victims] = recon[:n_store]
+            self.last_use[victims] = _PQ_PINNED if pinned else self.clock
+            if pinned:
+                self.n_pinned += n_store
+        return recon
+
+    def pin(self, centroids: torch.Tensor, codes: torch.Tensor, token_ids: torch.Tensor):
+        with self._lock:
+            ids = torch.unique(token_ids.to(device=codes.device, dtype=torch.long).view(-1))
+            self.pinned_ids = ids
+            if self.capacity <= 0:
+                return
+            # Rebuilding the table keeps every pinned id in exactly one slot.
+            self._allocate(centroids, codes)
+
+    def lookup(self, centroids: torch.Tensor, codes: torch.Tensor, token_ids: torch.Tensor) -> torch.Tensor:
+        with self._lock:
+            counts = self._counts(token_ids.device)
+            if self.capacity <= 0:
+                counts[1] += int(token_ids.numel())
+                return pq_reconstruct_tokens(centroids, codes, token_ids).float()
+            if (
+                self.rows is None
+                or self.slot_of.shape[0] != codes.shape[0] + 1
+                or self.slot_of.device != codes.device
+            ):
+                self._allocate(centroids, codes)
+                counts = self._counts(codes.device)
+            self.clock += 1
+            slots = self.slot_of.index_select(0, token_ids)
+            hit = slots >= 0
+            n_hit = hit.sum()
+            counts[0] += n_hit
+            counts[1] += int(token_ids.numel()) - n_hit
+            out = self.rows.index_select(0, slots.clamp_min(0))
+            touched = torch.where(hit, slots, self.capacity)
+            self.last_use[touched] = torch.clamp_min(self.last_use[touched], self.clock)
+            if bool(hit.all()):
+                return out
+            miss_ids = token_ids[~hit]
+            missing = torch.unique(miss_ids)
+            recon = self._insert(centroids, codes, missing)
+            out[~hit] = recon.index_select(0, torch.searchsorted(missing, miss_ids))
+            return out
+
+    def clear(self):
+        with self._lock:
+            if self.rows is not None:
+                self.invalidations += 1
+            self.slot_of = None
+            self.token_of = None
+            self.rows = None
+            self.last_use = None
+            self.n_pinned = 0
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            hits, misses, evictions = [0, 0, 0] if self.counts is None else self.counts.tolist()
+            lookups = hits + misses
+            entries = 0 if self.token_of is None else int((self.token_of >= 0).sum().item())
+            return {
+                "entries": entries,
+                "capacity": int(self.capacity),
+                "pinned": 0 if self.pinned_ids is None else int(self.pinned_ids.numel()),
+                "hits": hits,
+                "misses": misses,
+                "evictions": evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "bytes": 0 if self.rows is None else self.rows.numel() * self.rows.element_size(),
+            }
+
+
+@dataclass
+class PromptStateAccumulator:
+    """Running token-embedding summaries for `runtime_prompt_state`.
+
+    Keeps the window of token embeddings (without position rows) plus float64
+    running sums, so appending a token, and evicting the oldest one when a
+    `window` is set, costs O(d). Position contributions depend only on the
+    window length and come from the engine's prefix tables.
+    """
+
+    tok_emb: deque
+    tok_sum: torch.Tensor
+    tok_wsum: torch.Tensor
+    window: int | None = None
+
+    @property
+    def length(self) -> int:
+        return len(self.tok_emb)
+
+    def push(self, emb: torch.Tensor):
+        emb = emb.detach()
+        emb64 = emb.double()
+        self.tok_emb.append(emb)
+        self.tok_sum = self.tok_sum + emb64
+        self.tok_wsum = self.tok_wsum + float(len(self.tok_emb)) * emb64
+        if self.window is not None and len(self.tok_emb) > max(int(self.window), 1):
+            self.pop_front()
+
+    def pop_front(self):
+        if not self.tok_emb:
+            return
+        # Every remaining weight drops by one and the evicted token had weight 1.
+        self.tok_wsum = self.tok_wsum - self.tok_sum
+        self.tok_sum = self.tok_sum - self.tok_emb.popleft().double()
+
+    def copy(self) -> "PromptStateAccumulator":
+        # Sums are replaced, never updated in place, so sharing them is safe.
+        return PromptStateAccumulator(deque(self.tok_emb), self.tok_sum, self.tok_wsum, self.window)
+
+
+class TokenHistory(list):
+    """Token-id list that keeps an n-gram continuation index up to date.
+
+    `followers[prefix]` holds every token seen right after the (ngram - 1)
+    token `prefix`, so n-gram repeat checks are a dict lookup per step
+    instead of rebuilding the set of all history n-grams. `append`/`extend`
+    (and `+=`) update the index incrementally; every other in-place mutator
+    rebuilds it, so the index never goes stale.
+    """
+
+    def __init__(self, token_ids=(), *, ngram: int = 3):
+        super().__init__()
+        self.ngram = max(int(ngram), 2)
+        self.followers: dict[tuple[int, ...], set[int]] = {}
+        self.extend(token_ids)
+
+    def append(self, token_id):
+        token_int = int(token_id)
+        super().append(token_int)
+        width = self.ngram - 1
+        if len(self) > width:
+            prefix = tuple(self[-width - 1 : -1])
+            self.followers.setdefault(prefix, set()).add(token_int)
+
+    def extend(self, token_ids):
+        for token_id in token_ids:
+            self.append(token_id)
+
+    def __iadd__(self, token_ids):
+        self.extend(token_ids)
+        return self
+
+    def _reindex(self):
+        ids = [int(t) for t in self]
+        super().clear()
+        self.followers = {}
+        self.extend(ids)
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._reindex()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._reindex()
+
+    def __imul__(self, n):
+        super().__imul__(n)
+        self._reindex()
+        return self
+
+    def insert(self, index, token_id):
+        super().insert(index, int(token_id))
+        self._reindex()
+
+    def pop(self, index=-1):
+        token_id = super().pop(index)
+        self._reindex()
+        return token_id
+
+    def remove(self, token_id):
+        super().remove(token_id)
+        self._reindex()
+
+    def clear(self):
+        super().clear()
+        self.followers = {}
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._reindex()
+
+    def reverse(self):
+        super().reverse()
+        self._reindex()
+
+    def continuations(self) -> set[int]:
+        """Tokens that would repeat an n-gram after the current prefix."""
+        width = self.ngram - 1
+        if len(self) < width:
+            return set()
+        return self.followers.get(tuple(self[len(self) - width :]), set())
+
+
 class CEEngine:
-    def __init__(self, path: str, device: str = "cpu", backend: str = "torch"):
-        data = torch.load(path, map_location="cpu", weights_only=False)
+    def __init__(
+        self,
+        path: str,
+        device: str = "cpu",
+        backend: str = "torch",
+        *,
+        warm_cache_size: int = 0,
+        pq_cache_size: int = 2048,
+    ):
+        with prof_span("engine.load_artifact"):
+            data = load_artifact(path)
         self.data = data
         self.device = resolve_device(device)
         self.backend = backend
@@ -211,6 +606,7 @@ class CEEngine:
         if data.get("background_dim_mask") is not None:
             self.background_dim_mask = data["background_dim_mask"].bool().to(self.device)
         self._state_graph_laplacian = None
+        self._state_graph_stencil = None
         self._state_coords = None
 
         self.W = data["W"].float().to(self.device)
@@ -268,30 +664,53 @@ class CEEngine:
         if data.get("pq_centroids") is not None and data.get("pq_codes") is not None:
             self.pq_centroids = data["pq_centroids"].to(self.device)
             self.pq_codes = data["pq_codes"].to(self.device)
+        self._load_mips_index(data)
 
         self._stored_eigvecs = data.get("W_eigvecs")
         if self._stored_eigvecs is not None:
             self._stored_eigvecs = self._stored_eigvecs.float()
         self._eigvec_cache: dict[int, torch.Tensor] = {}
-        if self.target_w_density > 0.0:
-            self.apply_relax_matrix(self.W.detach().cpu())
+        self.relax_version = 0
+        self.w_version = 0
+        self._w_spectral_radius = None
+        self.warm_cache = RelaxWarmStartCache(capacity=warm_cache_size) if warm_cache_size > 0 else None
+        self.pq_cache = PQTokenCache(capacity=pq_cache_size) if pq_cache_size > 0 else None
+        self._pq_offset_codes = None
+        self.pq_lut_bits = data.get("pq_lut_bits")
+        self.relax_operator = None
+        # A finalized artifact already carries the resparsified/shifted W, its
+        # spectral bounds, the state partition and compressed projections.
+        with prof_span("engine.verify_finalized"):
+            self.finalized = self._verify_finalized(data)
+        if self.finalized:
+            self._w_spectral_radius = float(data["finalized"]["w_spectral_radius"])
+        if self.target_w_density > 0.0 and not self.finalized:
+            # Resparsifying W builds the operator for the final matrix.
+            with prof_span("engine.apply_relax_matrix"):
+                self.apply_relax_matrix(self.W.detach().cpu())
+        else:
+            self._refresh_relax_operator()
 
         self.model = None
         self.tok = None
         self.pad_token_id = data.get("pad_token_id")
         self.eos_token_id = data.get("eos_token_id")
         self.model_memory_bytes = 0
-        self._load_model()
-        if self.active_dim_mask is None or self.struct_dim_mask is None:
-            seed = None
-            if self.decoder_state_proj is not None:
-                seed = self.decoder_state_proj.abs().mean(dim=1)
-            elif self.W is not None:
-                seed = self.W.abs().mean(dim=1)
-            if seed is not None:
-                active_mask, struct_mask, _ = self.state_partition(seed, use_stored=False)
-                self.apply_state_partition(active_mask, struct_mask)
-        self._compress_runtime_projections()
+        with prof_span("engine.load_tokenizer"):
+            self._load_model()
+        if not self.finalized:
+            if self.active_dim_mask is None or self.struct_dim_mask is None:
+                seed = None
+                if self.decoder_state_proj is not None:
+                    seed = self.decoder_state_proj.abs().mean(dim=1)
+                elif self.W is not None:
+                    seed = self.W.abs().mean(dim=1)
+                if seed is not None:
+                    with prof_span("engine.state_partition"):
+                        active_mask, struct_mask, _ = self.state_partition(seed, use_stored=False)
+                        self.apply_state_partition(active_mask, struct_mask)
+            with prof_span("engine.compress_projections"):
+                self._compress_runtime_projections()
         self._clm_generator: "ClarusLMGenerator | None" = None
 
     def attach_clarus_lm(self, checkpoint_path: str, *, device: str | None = None):
@@ -303,6 +722,58 @@ class CEEngine:
         )
         self._clm_generator = gen
 
+    def _verify_finalized(self, data) -> bool:
+        meta = data.get("finalized")
+        if not isinstance(meta, dict):
+            return False
+        if int(meta.get("version", 0)) != FINALIZED_VERSION:
+            return False
+        if meta.get("content_hash") != content_hash(data, FINALIZED_KEYS):
+            safe_print("  finalized artifact hash mismatch; recomputing derived data")
+            return False
+        return True
+
+    def finalized_data(self, *, eig_rank: int = 8) -> dict:
+        """Copy of `self.data` with init-time derived data baked in and its hash stamped.
+
+        Adds the lowest `eig_rank` eigenvectors and the spectral radius to the
+        resparsified W pack, state partition and compressed projections that
+        `__init__` / the `apply_*` methods already mirror into `self.data`. A
+        later load whose hash matches skips `apply_relax_matrix`, the
+        partition and the projection compression. The engine is not modified.
+        """
+        if self.active_dim_mask is None or self.struct_dim_mask is None:
+            raise RuntimeError("cannot finalize an artifact without a state partition")
+        data = dict(self.data)
+        rank = max(0, min(int(eig_rank), self.d))
+        eigvecs = None
+        if rank > 0:
+            if self._stored_eigvecs is not None and self._stored_eigvecs.shape[0] >= rank:
+                eigvecs = self._stored_eigvecs[:rank]
+            else:
+                _, _, eigvecs = ce_extreme_eigs(self._current_relax_operator(), k_smallest=rank)
+            eigvecs = eigvecs.detach().cpu().float().contiguous()
+        data["W_eigvecs"] = eigvecs
+        radius = self._w_spectral_radius
+        if radius is None:
+            radius = float(self._current_relax_operator().spectral_radius)
+        data["finalized"] = {
+            "version": FINALIZED_VERSION,
+            "w_spectral_radius": float(radius),
+            "content_hash": content_hash(data, FINALIZED_KEYS),
+        }
+        return data
+
+    def finalize_artifact(self, *, eig_rank: int = 8) -> str:
+        """Stamp `finalized_data` into this engine's `self.data` and return the hash."""
+        data = self.finalized_data(eig_rank=eig_rank)
+        self.data["W_eigvecs"] = data["W_eigvecs"]
+        self.data["finalized"] = data["finalized"]
+        self._stored_eigvecs = data["W_eigvecs"]
+        self._eigvec_cache.clear()
+        self.finalized = True
+        return data["finalized"]["content_hash"]
+
     def _load_w_pack(self, data):
         values = data.get("W_values")
         col_idx = data.get("W_col_idx")
@@ -349,13 +820,7 @@ class CEEngine:
         self.inject_layer = self.n_layer // 2
 
     def _build_state_graph_laplacian(self) -> torch.Tensor:
-        coords = self.state_coords()
-        dist = torch.cdist(coords, coords)
-        adj = (dist > 0) & (dist <= 1.01)
-        deg = adj.sum(dim=1).float()
-        lap = -adj.float()
-        lap[torch.arange(self.d, device=self.device), torch.arange(self.d, device=self.device)] = deg
-        return lap
+        return self.state_graph_stencil().to_dense()
 
     def _build_state_coords(self) -> torch.Tensor:
         side = int(math.ceil(self.d ** (1.0 / 3.0)))
@@ -370,6 +835,11 @@ class CEEngine:
             self._state_coords = self._build_state_coords()
         return self._state_coords
 
+    def state_graph_stencil(self):
+        if getattr(self, "_state_graph_stencil", None) is None:
+            self._state_graph_stencil = ce_grid_stencil_laplacian(self.d, device=self.device)
+        return self._state_graph_stencil
+
     def state_graph_laplacian(self) -> torch.Tensor:
         if self._state_graph_laplacian is None:
             self._state_graph_laplacian = self._build_state_graph_laplacian()
@@ -424,17 +894,24 @@ class CEEngine:
     def apply_relax_matrix(self, w: torch.Tensor):
         w_cpu = w.detach().cpu().float()
         w_sym = self.resparsify_relax_matrix(0.5 * (w_cpu + w_cpu.T))
-        eigvals = torch.linalg.eigvalsh(w_sym)
-        lam_max = float(eigvals[-1].item())
+        values, col_idx, row_ptr = ce_pack_sparse(w_sym, backend="torch")
+        dense_w = w_sym if values.numel() == w_sym.numel() else None
+        probe = ce_build_relax_operator(values, col_idx, row_ptr, dense_w=dense_w, spectral_radius=0.0)
+        lam_max, lam_min, _ = ce_extreme_eigs(probe, k_smallest=1)
+        shift = 0.0
         if lam_max >= -1e-4:
             shift = lam_max + 1e-3
             w_sym = w_sym - shift * torch.eye(w_sym.shape[0], dtype=w_sym.dtype)
+            values, col_idx, row_ptr = ce_pack_sparse(w_sym, backend="torch")
+        lam_low = float(lam_min[0].item()) - shift if lam_min.numel() else lam_max - shift
+        self._w_spectral_radius = max(abs(lam_max - shift), abs(lam_low))
         self.data["W"] = w_sym
-        values, col_idx, row_ptr = ce_pack_sparse(w_sym, backend="torch")
         self.data["W_values"] = values.cpu()
         self.data["W_col_idx"] = col_idx.cpu()
         self.data["W_row_ptr"] = row_ptr.cpu()
         self.data["W_eigvecs"] = None
+        self.data.pop("finalized", None)
+        self.finalized = False
         self.W = w_sym.to(self.device)
         self.W_pack = (
             values.to(self.device),
@@ -444,6 +921,33 @@ class CEEngine:
         self._dense_relax_w = self.W if values.numel() == self.W.numel() else None
         self._stored_eigvecs = None
         self._eigvec_cache.clear()
+        self.w_version += 1
+        self.bump_relax_version()
+        self._refresh_relax_operator()
+
+    def _refresh_relax_operator(self):
+        """Rebuild the cached relax operator for the current `w_version`.
+
+        Only W changes invalidate the operator; decoder-only updates bump
+        `relax_version` but keep the operator (and its version) as is.
+        """
+        self.relax_operator = ce_build_relax_operator(
+            *self.W_pack,
+            dense_w=self._dense_relax_w,
+            version=self.w_version,
+            spectral_radius=self._w_spectral_radius,
+        )
+
+    def _current_relax_operator(self):
+        if self.relax_operator is None or self.relax_operator.version != self.w_version:
+            self._refresh_relax_operator()
+        return self.relax_operator
+
+    def bump_relax_version(self):
+        """Invalidate relax-derived caches after W or decoder changes."""
+        self.relax_version += 1
+        if self.warm_cache is not None:
+            self.warm_cache.clear()
 
     def build_brain_runtime(
         self,
@@ -476,6 +980,8 @@ class CEEngine:
             raise ValueError("state partition masks must share shape")
         struct_mask = struct_mask | active_mask
         background_mask = ~(struct_mask)
+        self.data.pop("finalized", None)
+        self.finalized = False
         self.data["active_dim_mask"] = active_mask
         self.data["struct_dim_mask"] = struct_mask
         self.data["background_dim_mask"] = background_mask
@@ -634,8 +1140,8 @@ class CEEngine:
         if self._stored_eigvecs is not None and self._stored_eigvecs.shape[0] >= hess_rank:
             return self._stored_eigvecs[:hess_rank].to(self.device)
         if hess_rank not in self._eigvec_cache:
-            _, eigvecs = torch.linalg.eigh(self.W.cpu())
-            self._eigvec_cache[hess_rank] = eigvecs[:, :hess_rank].T.contiguous().to(self.device)
+            _, _, eigvecs = ce_extreme_eigs(self._current_relax_operator(), k_smallest=hess_rank)
+            self._eigvec_cache[hess_rank] = eigvecs.contiguous().to(self.device)
         return self._eigvec_cache[hess_rank]
 
     def memory_usage(self) -> dict[str, float]:
@@ -657,6 +1163,11 @@ class CEEngine:
                 self.pq_centroids.numel() * self.pq_centroids.element_size()
                 + self.pq_codes.numel() * self.pq_codes.element_size()
             )
+        pq_cache_bytes = 0 if self.pq_cache is None else self.pq_cache.stats()["bytes"]
+        pq_offset_bytes = (
+            0 if self._pq_offset_codes is None
+            else self._pq_offset_codes.numel() * self._pq_offset_codes.element_size()
+        )
         clone_artifact_bytes = 0
         clone_state = self.data.get("clone_state")
         if clone_state is not None:
@@ -744,6 +1255,8 @@ class CEEngine:
             "Embedding_MB": emb_bytes / 1024 / 1024,
             "Positional_MB": pos_bytes / 1024 / 1024,
             "PQ_MB": pq_bytes / 1024 / 1024,
+            "PQCache_MB": pq_cache_bytes / 1024 / 1024,
+            "PQOffsets_MB": pq_offset_bytes / 1024 / 1024,
             "CloneArtifact_MB": clone_artifact_bytes / 1024 / 1024,
             "ContextProj_MB": context_bytes / 1024 / 1024,
             "PrevProj_MB": prev_proj_bytes / 1024 / 1024,
@@ -762,12 +1275,34 @@ class CEEngine:
     def save_artifact(self, path: str):
         torch.save(self.data, path)
 
-    def save_runtime_artifact(self, path: str):
-        runtime = dict(self.data)
+    def save_runtime_artifact(
+        self,
+        path: str,
+        *,
+        layout: str | None = None,
+        finalize: bool = True,
+    ):
+        """Save the runtime-only artifact.
+
+        `layout="pickle"` writes a single `torch.save` file, `layout="dir"` the
+        memory-mappable manifest + tensor directory (see `clarus.artifact`).
+        By default an existing artifact directory is rewritten as a directory
+        and anything else as a pickle. `finalize` bakes the derived init data
+        into the saved copy (see `finalized_data`) so the next load can skip
+        recomputing it; the live engine is left untouched.
+        """
+        if layout is None:
+            layout = "dir" if is_artifact_dir(path) else "pickle"
+        if layout not in ("pickle", "dir"):
+            raise ValueError(f"unknown artifact layout: {layout}")
+        runtime = self.finalized_data() if finalize else dict(self.data)
         for key in ("clone_state", "clone_config", "clone_kind"):
             runtime.pop(key, None)
         runtime["allow_pretrained_fallback"] = False
-        torch.save(runtime, path)
+        if layout == "dir":
+            save_artifact_dir(runtime, path)
+        else:
+            torch.save(compact_tensors(runtime), path)
 
     def has_standalone_lexicon(self) -> bool:
         return self.emb is not None or (
@@ -783,25 +1318,90 @@ class CEEngine:
             emb = emb + self.pos.index_select(0, pos_idx)
         return emb
 
-    def runtime_prompt_state(
+    def _pos_prefix_sums(self, n: int) -> tuple[torch.Tensor, torch.Tensor] | None:
+        """(sum_i pos_i, sum_i (i+1) pos_i) over clamped positions 0..n-1."""
+        if self.pos is None or self.pos.shape[0] == 0:
+            return None
+        prefix = getattr(self, "_pos_prefix", None)
+        if prefix is None:
+            pos64 = self.pos.double()
+            ranks = torch.arange(1, pos64.shape[0] + 1, device=pos64.device, dtype=pos64.dtype).unsqueeze(1)
+            zero = torch.zeros_like(pos64[:1])
+            prefix = (
+                torch.cat([zero, pos64.cumsum(dim=0)], dim=0),
+                torch.cat([zero, (pos64 * ranks).cumsum(dim=0)], dim=0),
+            )
+            self._pos_prefix = prefix
+        n_pos = int(self.pos.shape[0])
+        if n <= n_pos:
+            return prefix[0][n], prefix[1][n]
+        tail = self.pos[-1].double()
+        extra_rank = 0.5 * (n * (n + 1) - n_pos * (n_pos + 1))
+        return prefix[0][n_pos] + (n - n_pos) * tail, prefix[1][n_pos] + extra_rank * tail
+
+    def _pos_row(self, idx: int) -> torch.Tensor | None:
+        if self.pos is None:
+            return None
+        return self.pos[min(int(idx), self.pos.shape[0] - 1)]
+
+    def prompt_state_accumulator(
         self,
         prompt_ids: torch.Tensor,
         *,
+        window: int | None = None,
+    ) -> PromptStateAccumulator:
+        token_ids = prompt_ids.to(device=self.device, dtype=torch.long).view(-1)
+        if window is not None:
+            token_ids = token_ids[-max(int(window), 1) :]
+        tok_emb = self.token_embedding(token_ids).view(token_ids.shape[0], self.d).float()
+        tok64 = tok_emb.double()
+        ranks = torch.arange(1, tok64.shape[0] + 1, device=self.device, dtype=tok64.dtype).unsqueeze(1)
+        return PromptStateAccumulator(
+            tok_emb=deque(tok_emb.unbind(0)),
+            tok_sum=tok64.sum(dim=0),
+            tok_wsum=(tok64 * ranks).sum(dim=0),
+            window=window,
+        )
+
+    def advance_prompt_state(self, acc: PromptStateAccumulator, token_id: int) -> PromptStateAccumulator:
+        acc.push(self.token_embedding([int(token_id)]).view(self.d).float())
+        return acc
+
+    def runtime_prompt_state(
+        self,
+        prompt_ids: torch.Tensor | PromptStateAccumulator,
+        *,
         phi: torch.Tensor | None = None,
     ) -> tuple[torch.Tensor, torch.Tensor]:
-        emb_seq = self.prompt_embeddings(prompt_ids)
-        first_emb = emb_seq[0]
-        prev_emb = emb_seq[-2] if emb_seq.shape[0] > 1 else emb_seq[-1]
-        last_emb = emb_seq[-1]
-        mean_emb = emb_seq.mean(dim=0)
-        weights = torch.arange(1, emb_seq.shape[0] + 1, device=self.device, dtype=emb_seq.dtype).unsqueeze(1)
-        decay_emb = (emb_seq * weights).sum(dim=0) / weights.sum().clamp_min(1.0)
+        acc = (
+            prompt_ids
+            if isinstance(prompt_ids, PromptStateAccumulator)
+            else self.prompt_state_accumulator(prompt_ids)
+        )
+        n = acc.length
+        if n == 0:
+            raise ValueError("runtime_prompt_state requires at least one token")
+        dtype = acc.tok_emb[-1].dtype
+        first_emb = acc.tok_emb[0]
+        prev_emb = acc.tok_emb[-2] if n > 1 else acc.tok_emb[-1]
+        last_emb = acc.tok_emb[-1]
+        seq_sum = acc.tok_sum
+        seq_wsum = acc.tok_wsum
+        pos_sums = self._pos_prefix_sums(n)
+        if pos_sums is not None:
+            first_emb = first_emb + self._pos_row(0)
+            prev_emb = prev_emb + self._pos_row(max(n - 2, 0))
+            last_emb = last_emb + self._pos_row(n - 1)
+            seq_sum = seq_sum + pos_sums[0]
+            seq_wsum = seq_wsum + pos_sums[1]
+        mean_emb = (seq_sum / float(n)).to(dtype)
+        decay_emb = (seq_wsum / max(0.5 * n * (n + 1), 1.0)).to(dtype)
         phi_base = (
             torch.zeros_like(last_emb)
-            if emb_seq.shape[0] <= 1
-            else normalize_vector(emb_seq[:-1].mean(dim=0) - emb_seq[-1])
+            if n <= 1
+            else normalize_vector(((seq_sum - last_emb.double()) / float(n - 1)).to(dtype) - last_emb)
         )
-        len_ratio = float(min(emb_seq.shape[0], 0 if self.pos is None else self.pos.shape[0]) or emb_seq.shape[0])
+        len_ratio = float(min(n, 0 if self.pos is None else self.pos.shape[0]) or n)
         if self.pos is not None and self.pos.shape[0] > 0:
             len_ratio /= float(self.pos.shape[0])
         else:
@@ -844,23 +1444,223 @@ class CEEngine:
             if not torch.is_tensor(token_ids):
                 token_ids = torch.tensor(token_ids, device=self.device, dtype=torch.long)
             token_ids = token_ids.to(device=self.device, dtype=torch.long).view(-1)
-            return pq_reconstruct_tokens(
-                self.pq_centroids,
-                self.pq_codes,
-                token_ids,
-            ).to(self.device)
+            if self.pq_cache is None:
+                return pq_reconstruct_tokens(
+                    self.pq_centroids,
+                    self.pq_codes,
+                    token_ids,
+                ).to(self.device)
+            if self.pq_cache.pinned_ids is None:
+                self.pq_cache.pin(self.pq_centroids, self.pq_codes, self._sentence_terminal_ids())
+            return self.pq_cache.lookup(self.pq_centroids, self.pq_codes, token_ids)
         raise RuntimeError("No lexical memory is available for token embedding lookup")
 
-    def lexical_scores(self, query: torch.Tensor) -> torch.Tensor:
+    def apply_pq(self, centroids: torch.Tensor, codes: torch.Tensor):
+        """Install a new PQ codebook and drop rows reconstructed from the old one."""
+        self.pq_centroids = centroids.to(self.device)
+        self.pq_codes = codes.to(self.device)
+        self.data["pq_centroids"] = centroids.detach().cpu()
+        self.data["pq_codes"] = codes.detach().cpu()
+        self._pq_offset_codes = None
+        if self.pq_cache is not None:
+            self.pq_cache.clear()
+        self._invalidate_mips_index("pq")
+
+    def _load_mips_index(self, data):
+        self.mips_index = None
+        self.mips_nprobe = int(data.get("mips_nprobe") or 0)
+        source = data.get("mips_source")
+        if source is None or data.get("mips_lists") is None:
+            return
+        if (
+            (source == "vocab_head" and self.decoder_vocab_weight is None)
+            or (source == "emb" and self.emb is None)
+            or (source == "pq" and (self.pq_centroids is None or self.pq_codes is None))
+        ):
+            return
+        self.mips_index = {
+            "source": source,
+            "centroids": data["mips_centroids"].float().to(self.device),
+            "radii": data["mips_radii"].float().to(self.device),
+            "lists": data["mips_lists"].long().to(self.device),
+        }
+
+    def build_mips_index(
+        self,
+        *,
+        source: str = "auto",
+        n_lists: int | None = None,
+        nprobe: int | None = None,
+        iters: int = 10,
+        seed: int = 0,
+    ) -> dict[str, object]:
+        """Build the IVF index used for approximate vocab/lexical top-k.
+
+        `source="vocab_head"` indexes the decoder vocab head (bias folded in as
+        an extra column), `"emb"` the embedding rows and `"pq"` the rows
+        reconstructed from PQ lexical memory; `"auto"` prefers the head, then
+        embeddings, then PQ. `nprobe` is the recall knob (lists scanned per
+        query), stored with the index and adjustable later through
+        `mips_nprobe`; 0 disables the index.
+        """
+        if source == "auto":
+            if self.decoder_vocab_weight is not None:
+                source = "vocab_head"
+            elif self.emb is not None or self.pq_codes is None:
+                source = "emb"
+            else:
+                source = "pq"
+        if source == "vocab_head":
+            if self.decoder_vocab_weight is None:
+                raise RuntimeError("vocab_head MIPS index requires a decoder vocab head")
+            weight = self.decoder_vocab_weight.float()
+            bias = (
+                torch.zeros_like(weight[:, 0]) if self.decoder_vocab_bias is None
+                else self.decoder_vocab_bias.float()
+            )
+            rows = torch.cat([weight, bias.unsqueeze(1)], dim=1)
+        elif source == "emb":
+            if self.emb is None:
+                raise RuntimeError("emb MIPS index requires embedding rows")
+            rows = self.emb.float()
+        elif source == "pq":
+            if self.pq_centroids is None or self.pq_codes is None:
+                raise RuntimeError("pq MIPS index requires PQ lexical memory")
+            rows = pq_reconstruct_tokens(self.pq_centroids, self.pq_codes)
+        else:
+            raise ValueError(f"unknown MIPS index source: {source}")
+        if n_lists is None:
+            n_lists = max(1, int(round(math.sqrt(rows.shape[0]))))
+        index = ce_ivf_build_index(rows, n_lists=n_lists, iters=iters, seed=seed)
+        n_built = int(index["centroids"].shape[0])
+        if nprobe is None:
+            probe_frac = min(1.0, 4.0 * float(self.decoder_candidate_ratio))
+            nprobe = max(1, int(math.ceil(probe_frac * n_built)))
+        self.data["mips_source"] = source
+        self.data["mips_centroids"] = index["centroids"]
+        self.data["mips_radii"] = index["radii"]
+        self.data["mips_lists"] = index["lists"]
+        self.data["mips_nprobe"] = int(nprobe)
+        self._load_mips_index(self.data)
+        return {
+            "source": source,
+            "n_lists": n_built,
+            "nprobe": int(nprobe),
+            "max_list_len": int(index["lists"].shape[1]),
+        }
+
+    def _invalidate_mips_index(self, source: str):
+        if self.mips_index is not None and self.mips_index["source"] == source:
+            self.drop_mips_index()
+
+    def drop_mips_index(self):
+        for key in ("mips_source", "mips_centroids", "mips_radii", "mips_lists", "mips_nprobe"):
+            self.data.pop(key, None)
+        self.mips_index = None
+        self.mips_nprobe = 0
+
+    def _approx_scores(self, query: torch.Tensor, source: str, min_candidates: int) -> torch.Tensor | None:
+        """Scores from the IVF shortlist, exactly reranked; -inf off the shortlist.
+
+        Returns None when the probed lists hold fewer than `min_candidates`
+        rows, so the caller falls back to the exact path. PQ shortlists are
+        reranked against the reconstructed rows, i.e. the float ADC score even
+        when the exact path uses an 8-bit LUT.
+        """
+        index = self.mips_index
+        if index is None or index["source"] != source or self.mips_nprobe <= 0:
+            return None
+        q = query.float().view(-1, self.d)
+        batch = q.shape[0]
+        if source == "vocab_head":
+            rows_all = self.decoder_vocab_weight
+            probe_q = torch.cat([q, q.new_ones(batch, 1)], dim=1)
+        elif source == "pq":
+            rows_all = self.pq_codes
+            probe_q = q
+        else:
+            rows_all = self.emb
+            probe_q = q
+        ids = ce_ivf_probe(probe_q, index["centroids"], index["radii"], index["lists"], self.mips_nprobe)
+        if int((ids >= 0).sum(dim=1).min().item()) < int(min_candidates):
+            return None
+        # Terminal and token-head ids are always scored so later merges see real logits.
+        extra = self._sentence_terminal_ids()
+        if self.decoder_token_ids is not None and self.decoder_token_ids.numel():
+            extra = torch.cat([extra, self.decoder_token_ids])
+        if extra.numel():
+            if source == "emb" and self.vocab_id_map is not None:
+                extra = self.vocab_id_map.index_select(0, extra)
+            ids = torch.cat([ids, extra.view(1, -1).expand(batch, -1)], dim=1)
+        valid = ids >= 0
+        safe = ids.clamp_min(0)
+        if source == "pq":
+            rows = pq_reconstruct_tokens(self.pq_centroids, self.pq_codes, safe.reshape(-1))
+            rows = rows.to(q.device).view(batch, -1, self.d)
+        else:
+            rows = rows_all.index_select(0, safe.reshape(-1)).view(batch, -1, self.d).float()
+        scores = torch.bmm(rows, q.unsqueeze(2)).squeeze(2)
+        if source == "vocab_head":
+            if self.decoder_vocab_bias is not None:
+                scores = scores + self.decoder_vocab_bias.float().index_select(0, safe.reshape(-1)).view_as(scores)
+            scores = float(self.decoder_vocab_scale) * scores
+            out_ids = safe
+            vocab_size = int(rows_all.shape[0])
+        elif source == "pq":
+            out_ids = safe
+            vocab_size = int(rows_all.shape[0])
+        else:
+            out_ids = safe if self.kept_token_ids is None else self.kept_token_ids.index_select(0, safe.reshape(-1)).view_as(safe)
+            vocab_size = int(rows_all.shape[0]) if self.kept_token_ids is None else self.vocab
+        scores = scores.masked_fill(~valid, float("-inf"))
+        out = q.new_full((batch, vocab_size), float("-inf"))
+        out = out.scatter_reduce(1, out_ids, scores, reduce="amax")
+        return out[0] if query.ndim == 1 else out
+
+    def mips_recall(self, queries: torch.Tensor, k: int) -> float:
+        """Fraction of the exact top-`k` vocab logits found by the MIPS path."""
+        exact = self.vocab_logits(queries)
+        approx = self.vocab_logits(queries, min_candidates=k)
+        exact = exact.view(-1, exact.shape[-1])
+        approx = approx.view(-1, approx.shape[-1])
+        exact_ids = torch.topk(exact, k, dim=-1).indices
+        approx_ids = torch.topk(approx, k, dim=-1).indices
+        hits = (exact_ids.unsqueeze(2) == approx_ids.unsqueeze(1)).any(dim=2).float()
+        return float(hits.mean().item())
+
+    def _vocab_out_size(self) -> int:
+        if self.decoder_vocab_weight is not None:
+            return int(self.decoder_vocab_weight.shape[0])
         if self.emb is not None:
-            scores = self.emb @ query
+            return self.vocab if self.kept_token_ids is not None else int(self.emb.shape[0])
+        if self.pq_codes is not None:
+            return int(self.pq_codes.shape[0])
+        raise RuntimeError("No lexical memory is available for scoring")
+
+    def lexical_scores(self, query: torch.Tensor, *, min_candidates: int | None = None) -> torch.Tensor:
+        if min_candidates is not None:
+            approx = self._approx_scores(query, "emb" if self.emb is not None else "pq", min_candidates)
+            if approx is not None:
+                return approx
+        if self.emb is not None:
+            scores = query @ self.emb.T
             if self.kept_token_ids is None:
                 return scores
-            full = torch.full((self.vocab,), float("-inf"), dtype=scores.dtype, device=scores.device)
-            full.index_copy_(0, self.kept_token_ids, scores)
+            full = torch.full(
+                (*scores.shape[:-1], self.vocab), float("-inf"), dtype=scores.dtype, device=scores.device
+            )
+            full.index_copy_(full.ndim - 1, self.kept_token_ids, scores)
             return full
         if self.pq_centroids is not None and self.pq_codes is not None:
-            return pq_scores(query, self.pq_centroids, self.pq_codes)
+            if self._pq_offset_codes is None:
+                self._pq_offset_codes = pq_offset_codes(self.pq_codes, self.pq_centroids.shape[1])
+            return pq_scores(
+                query,
+                self.pq_centroids,
+                self.pq_codes,
+                offset_codes=self._pq_offset_codes,
+                lut_bits=self.pq_lut_bits,
+            )
         raise RuntimeError("No lexical memory is available for scoring")
 
     @staticmethod
@@ -911,20 +1711,24 @@ class CEEngine:
         return (scores - mean) / std
 
     def _merge_candidate_ids(self, *groups: torch.Tensor | None) -> torch.Tensor:
-        merged: list[int] = []
-        seen: set[int] = set()
-        for group in groups:
-            if group is None or group.numel() == 0:
-                continue
-            for token_id in group.reshape(-1).tolist():
-                token_int = int(token_id)
-                if token_int < 0 or token_int >= self.vocab or token_int in seen:
-                    continue
-                seen.add(token_int)
-                merged.append(token_int)
-        if not merged:
+        parts = [
+            group.reshape(-1).to(device=self.device, dtype=torch.long)
+            for group in groups
+            if group is not None and group.numel()
+        ]
+        if not parts:
             return torch.empty(0, dtype=torch.long, device=self.device)
-        return torch.tensor(merged, dtype=torch.long, device=self.device)
+        flat = torch.cat(parts)
+        flat = flat[(flat >= 0) & (flat < self.vocab)]
+        if flat.numel() == 0:
+            return flat
+        # Order-preserving unique: keep each id at its first position.
+        uniq, inverse = torch.unique(flat, return_inverse=True)
+        first_pos = torch.full((uniq.shape[0],), flat.shape[0], dtype=torch.long, device=self.device)
+        first_pos = first_pos.scatter_reduce(
+            0, inverse, torch.arange(flat.shape[0], device=self.device), reduce="amin"
+        )
+        return uniq.index_select(0, torch.argsort(first_pos))
 
     def _sentence_terminal_ids(self) -> torch.Tensor:
         if self._terminal_ids_cache is not None:
@@ -954,7 +1758,7 @@ class CEEngine:
         terminal_ids = self._sentence_terminal_ids()
         if terminal_ids.numel() == 0:
             return bonus
-        terminal_mask = (candidate_ids.unsqueeze(1) == terminal_ids.unsqueeze(0)).any(dim=1)
+        terminal_mask = torch.isin(candidate_ids, terminal_ids)
         if not terminal_mask.any():
             return bonus
         close_bonus = min(1.5, 0.35 + 0.08 * float(generated_len - 10))
@@ -986,12 +1790,22 @@ class CEEngine:
         bias = torch.zeros(weight.shape[0], dtype=weight.dtype)
         self.apply_vocab_head(weight, bias=bias, scale=1.0)
 
-    def vocab_logits(self, query: torch.Tensor) -> torch.Tensor:
+    def vocab_logits(self, query: torch.Tensor, *, min_candidates: int | None = None) -> torch.Tensor:
+        """Full-vocab logits for `query` (d,) or (B, d).
+
+        With `min_candidates` and a MIPS index, only the probed shortlist is
+        scored (exactly) and every other entry is -inf; callers that keep just
+        their top candidates pass their candidate count here.
+        """
         if self.decoder_vocab_weight is not None:
+            if min_candidates is not None:
+                approx = self._approx_scores(query, "vocab_head", min_candidates)
+                if approx is not None:
+                    return approx
             bias = None if self.decoder_vocab_bias is None else self.decoder_vocab_bias.float()
             logits = F.linear(query.float(), self.decoder_vocab_weight.float(), bias)
             return float(self.decoder_vocab_scale) * logits
-        return self.lexical_scores(query.float())
+        return self.lexical_scores(query.float(), min_candidates=min_candidates)
 
     def _ngram_repeat_scores(self, history_ids: list[int] | None, candidate_ids: torch.Tensor) -> torch.Tensor:
         scores = torch.zeros(candidate_ids.shape[0], dtype=torch.float32, device=self.device)
@@ -1000,16 +1814,15 @@ class CEEngine:
         ngram = max(int(self.repeat_ngram), 2)
         if len(history_ids) < ngram - 1:
             return scores
-        prefix = tuple(int(x) for x in history_ids[-(ngram - 1):])
-        seen = {
-            tuple(int(x) for x in history_ids[idx : idx + ngram])
-            for idx in range(max(len(history_ids) - ngram + 1, 0))
-        }
-        if not seen:
+        if not isinstance(history_ids, TokenHistory) or history_ids.ngram != ngram:
+            history_ids = TokenHistory(history_ids, ngram=ngram)
+        followers = history_ids.continuations()
+        if not followers:
             return scores
-        values = [1.0 if (*prefix, int(token_id)) in seen else 0.0 for token_id in candidate_ids.tolist()]
-        return torch.tensor(values, dtype=torch.float32, device=self.device)
+        follower_ids = torch.tensor(sorted(followers), dtype=torch.long, device=self.device)
+        return torch.isin(candidate_ids, follower_ids).float()
 
+    @profiled("engine.curvature")
     def _curvature_adjust_logits(
         self,
         candidate_ids: torch.Tensor,
@@ -1049,8 +1862,7 @@ class CEEngine:
             k2 = 1.0 - F.cosine_similarity(accel_prev, accel_next, dim=1, eps=1e-6)
             k2 = k2.clamp_min(0.0)
 
-        lap = self.state_graph_laplacian().to(step_next.device, dtype=step_next.dtype)
-        lbo = (step_next @ lap).pow(2).mean(dim=1)
+        lbo = self.state_graph_stencil().apply(step_next).pow(2).mean(dim=1)
         lbo = lbo / lbo.mean().clamp_min(1e-6)
 
         context_break = torch.zeros_like(k1)
@@ -1085,12 +1897,13 @@ class CEEngine:
             "suppressed_count": int((suppression > 1e-3).sum().item()),
         }
 
+    @profiled("engine.codebook")
     def build_runtime_codebook(self, m_ref: torch.Tensor, top_k: int) -> torch.Tensor:
         if self.has_standalone_lexicon():
             query = self.masked_state(m_ref, include_struct=True)
             if query.abs().sum().item() <= 1e-8:
                 query = m_ref
-            scores = self.lexical_scores(query)
+            scores = self.lexical_scores(query, min_candidates=top_k)
             top_ids = torch.topk(scores, min(top_k, scores.numel())).indices
             return self.token_embedding(top_ids)
         raise RuntimeError("legacy teacher-dependent codebook path was removed from clarus/")
@@ -1127,7 +1940,7 @@ class CEEngine:
                 and self.decoder_token_state_proj.ndim == 2
                 and self.decoder_token_state_proj.shape[0] == proj_idx.numel()
             ):
-                correction = ce_hidden.index_select(0, proj_idx) @ self.decoder_token_state_proj
+                correction = ce_hidden.index_select(-1, proj_idx) @ self.decoder_token_state_proj
             else:
                 correction = ce_hidden @ self.decoder_token_state_proj
         if self.decoder_token_prev_proj is not None:
@@ -1139,6 +1952,8 @@ class CEEngine:
             return None
         return self.decoder_token_scale * correction
 
+
+    @profiled("engine.logits")
     def standalone_logits(
         self,
         ce_hidden: torch.Tensor,
@@ -1158,7 +1973,10 @@ class CEEngine:
         prev_emb = self.token_embedding([prev_id]).squeeze(0)
         state_hidden = ce_hidden.float()
         query = self.decoder_query(state_hidden, prev_emb)
-        logits = self.vocab_logits(query)
+        logits = self.vocab_logits(
+            query,
+            min_candidates=self._paper_candidate_count(self._vocab_out_size(), top_k),
+        )
         correction = self.decoder_token_correction(state_hidden, prev_emb)
         if correction is not None and self.decoder_token_ids is not None and self.decoder_token_ids.numel():
             logits = logits.clone()
@@ -1184,15 +2002,11 @@ class CEEngine:
 
         candidate_logits = logits.index_select(0, candidate_ids)
         if repeat_ids:
-            repeat_set = {int(token_id) for token_id in repeat_ids}
-            if repeat_set:
-                repeat_mask = torch.tensor(
-                    [int(token_id) in repeat_set for token_id in candidate_ids.tolist()],
-                    dtype=torch.bool,
-                    device=self.device,
-                )
-                candidate_logits = candidate_logits.clone()
-                candidate_logits[repeat_mask] -= repeat_penalty
+            repeat_mask = torch.isin(
+                candidate_ids,
+                torch.as_tensor(list(repeat_ids), dtype=torch.long, device=self.device),
+            )
+            candidate_logits = candidate_logits - float(repeat_penalty) * repeat_mask.float()
 
         eval_k = min(
             int(candidate_ids.numel()),
@@ -1230,6 +2044,234 @@ class CEEngine:
         curvature_meta["eval_candidate_count"] = int(eval_k)
         return logits, curvature_meta
 
+    def _pad_id_rows(self, rows: list[list[int]]) -> torch.Tensor:
+        width = max((len(row) for row in rows), default=0)
+        out = torch.full((len(rows), max(width, 1)), -1, dtype=torch.long)
+        for row_idx, row in enumerate(rows):
+            if row:
+                out[row_idx, : len(row)] = torch.tensor(row, dtype=torch.long)
+        return out.to(self.device)
+
+    @staticmethod
+    def _fill_curvature_history(
+        hidden: torch.Tensor,
+        prev_hidden: torch.Tensor | None,
+        prev_prev_hidden: torch.Tensor | None,
+    ) -> tuple[torch.Tensor, torch.Tensor]:
+        """Stand-ins for missing history so a batched row scores like the sequential path.
+
+        `prev := hidden` zeroes the previous step and `prev_prev := 2 prev -
+        hidden` zeroes the previous acceleration, so k1 / k2 come out as the
+        same constant for every candidate where the sequential path skips
+        them; risk shifts uniformly and suppression and acceptance match.
+        """
+        if prev_hidden is None:
+            # Sequential k2 also needs prev, so prev_prev is dropped with it.
+            return hidden, hidden
+        if prev_prev_hidden is None:
+            prev_prev_hidden = 2.0 * prev_hidden - hidden
+        return prev_hidden, prev_prev_hidden
+
+    @staticmethod
+    def _masked_row_stats(values: torch.Tensor, mask: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+        weight = mask.to(values.dtype)
+        count = weight.sum(dim=1, keepdim=True).clamp_min(1.0)
+        mean = (values * weight).sum(dim=1, keepdim=True) / count
+        var = (((values - mean) * weight) ** 2).sum(dim=1, keepdim=True) / count
+        return mean, var.sqrt()
+
+    @profiled("engine.curvature_batch")
+    def _curvature_adjust_logits_batch(
+        self,
+        candidate_ids: torch.Tensor,
+        candidate_logits: torch.Tensor,
+        candidate_mask: torch.Tensor,
+        *,
+        ce_hidden: torch.Tensor,
+        prev_hidden: torch.Tensor | None = None,
+        prev_prev_hidden: torch.Tensor | None = None,
+        history_ids: list[list[int]] | None = None,
+        context_anchor: torch.Tensor | None = None,
+    ) -> tuple[torch.Tensor, dict[str, object]]:
+        """Row-wise `_curvature_adjust_logits` over padded (B, E) candidates."""
+        batch, width = candidate_ids.shape
+        mask_f = candidate_mask.float()
+        safe_ids = candidate_ids.clamp_min(0)
+        candidate_emb = self.token_embedding(safe_ids.reshape(-1)).float().view(batch, width, self.d)
+        current_hidden = ce_hidden.float()
+        step_next = candidate_emb - current_hidden.unsqueeze(1)
+
+        k1 = torch.zeros(batch, width, dtype=torch.float32, device=self.device)
+        if prev_hidden is not None:
+            prev_step = (current_hidden - prev_hidden.float()).unsqueeze(1).expand_as(step_next)
+            k1 = (1.0 - F.cosine_similarity(prev_step, step_next, dim=-1, eps=1e-6)).clamp_min(0.0)
+
+        k2 = torch.zeros_like(k1)
+        if prev_hidden is not None and prev_prev_hidden is not None:
+            accel_prev = (current_hidden - 2.0 * prev_hidden.float() + prev_prev_hidden.float()).unsqueeze(1)
+            accel_prev = accel_prev.expand_as(step_next)
+            accel_next = candidate_emb - 2.0 * current_hidden.unsqueeze(1) + prev_hidden.float().unsqueeze(1)
+            k2 = (1.0 - F.cosine_similarity(accel_prev, accel_next, dim=-1, eps=1e-6)).clamp_min(0.0)
+
+        lbo = self.state_graph_stencil().apply(step_next).pow(2).mean(dim=-1)
+        lbo_mean, _ = self._masked_row_stats(lbo, candidate_mask)
+        lbo = lbo / lbo_mean.clamp_min(1e-6)
+
+        context_break = torch.zeros_like(k1)
+        if context_anchor is not None:
+            anchor = context_anchor.float().unsqueeze(1).expand_as(candidate_emb)
+            context_break = (1.0 - F.cosine_similarity(candidate_emb, anchor, dim=-1, eps=1e-6)).clamp_min(0.0)
+
+        repeat = torch.zeros_like(k1)
+        if history_ids is not None and any(history_ids):
+            window = max(int(self.repeat_window), 1)
+            recent_rows = [list(history[-window:]) if history else [] for history in history_ids]
+            recent = self._pad_id_rows(recent_rows)
+            recent_len = torch.tensor(
+                [max(len(row), 1) for row in recent_rows], dtype=torch.float32, device=self.device
+            )
+            counts = (candidate_ids.unsqueeze(2) == recent.unsqueeze(1)).float().sum(dim=2)
+            repeat = counts / recent_len.unsqueeze(1)
+            ngram = max(int(self.repeat_ngram), 2)
+            follower_rows: list[list[int]] = []
+            for history in history_ids:
+                if not history or len(history) < ngram - 1:
+                    follower_rows.append([])
+                    continue
+                if not isinstance(history, TokenHistory) or history.ngram != ngram:
+                    history = TokenHistory(history, ngram=ngram)
+                follower_rows.append(sorted(history.continuations()))
+            followers = self._pad_id_rows(follower_rows)
+            ngram_hit = (candidate_ids.unsqueeze(2) == followers.unsqueeze(1)).any(dim=2).float()
+            repeat = repeat + 2.0 * ngram_hit
+
+        combined = k1 + 0.5 * k2 + 0.3 * lbo + 0.25 * context_break + 1.5 * repeat
+        risk_mean, risk_std = self._masked_row_stats(combined, candidate_mask)
+        threshold = risk_mean + float(self.curvature_alpha) * risk_std
+        excess = (combined - threshold).clamp_min(0.0)
+        gate = torch.sigmoid(float(self.curvature_steepness) * (combined - threshold))
+        suppression = float(self.curvature_lambda) * gate * excess * mask_f
+        adjusted = candidate_logits - suppression
+        count = mask_f.sum(dim=1).clamp_min(1.0)
+        return adjusted, {
+            "candidate_ids": candidate_ids,
+            "candidate_mask": candidate_mask,
+            "combined_risk": combined,
+            "suppression": suppression,
+            "threshold": threshold.squeeze(1),
+            "curvature_risk_score": ((combined >= threshold).float() * mask_f).sum(dim=1) / count,
+            "suppressed_count": ((suppression > 1e-3) & candidate_mask).sum(dim=1),
+        }
+
+    @profiled("engine.logits_batch")
+    def standalone_logits_batch(
+        self,
+        ce_hidden: torch.Tensor,
+        prev_ids: torch.Tensor | list[int],
+        *,
+        temperature: float = 1.0,
+        top_k: int = 0,
+        repeat_ids: list[list[int]] | None = None,
+        repeat_penalty: float = 3.0,
+        history_ids: list[list[int]] | None = None,
+        prev_hidden: torch.Tensor | None = None,
+        prev_prev_hidden: torch.Tensor | None = None,
+        context_anchor: torch.Tensor | None = None,
+        generated_len: int | list[int] | torch.Tensor = 0,
+        return_meta: bool = False,
+    ) -> torch.Tensor | tuple[torch.Tensor, dict[str, object]]:
+        """Batched :meth:`standalone_logits` for B independent rows.
+
+        One GEMM produces the (B, vocab) logits; candidate sets are padded to
+        a common width with a validity mask so top-k selection, repeat
+        penalties and the curvature adjustment run as batched tensor ops.
+        Meta values are per-row tensors (no host sync).
+        """
+        state_hidden = ce_hidden.float()
+        batch = state_hidden.shape[0]
+        prev_ids = torch.as_tensor(prev_ids, dtype=torch.long, device=self.device).view(-1)
+        prev_emb = self.token_embedding(prev_ids).float().view(batch, self.d)
+        query = self.decoder_query(state_hidden, prev_emb)
+        logits = self.vocab_logits(
+            query,
+            min_candidates=self._paper_candidate_count(self._vocab_out_size(), top_k),
+        )
+        correction = self.decoder_token_correction(state_hidden, prev_emb)
+        if correction is not None and self.decoder_token_ids is not None and self.decoder_token_ids.numel():
+            logits = logits.clone()
+            logits[:, self.decoder_token_ids] += correction
+
+        vocab_size = logits.shape[-1]
+        candidate_k = min(self._paper_candidate_count(vocab_size, top_k), vocab_size)
+        top_ids = torch.topk(logits, candidate_k, dim=-1).indices
+        terminal_ids = self._sentence_terminal_ids()
+        candidate_ids = top_ids
+        candidate_mask = torch.ones_like(top_ids, dtype=torch.bool)
+        if terminal_ids.numel():
+            # Terminal ids are appended per row unless top-k already holds them.
+            term = terminal_ids.unsqueeze(0).expand(batch, -1)
+            term_new = ~(term.unsqueeze(2) == top_ids.unsqueeze(1)).any(dim=2)
+            candidate_ids = torch.cat([top_ids, term], dim=1)
+            candidate_mask = torch.cat([candidate_mask, term_new], dim=1)
+
+        candidate_logits = logits.gather(1, candidate_ids)
+        candidate_logits = candidate_logits.masked_fill(~candidate_mask, float("-inf"))
+        if repeat_ids is not None and any(repeat_ids):
+            repeat = self._pad_id_rows([list(row) for row in repeat_ids])
+            repeat_mask = (candidate_ids.unsqueeze(2) == repeat.unsqueeze(1)).any(dim=2)
+            candidate_logits = candidate_logits - float(repeat_penalty) * repeat_mask.float()
+
+        eval_k = min(
+            int(candidate_ids.shape[1]),
+            max(int(top_k) * 2, min(int(self.curvature_eval_topk), 96), 1),
+        )
+        eval_rank = torch.topk(candidate_logits, eval_k, dim=1).indices
+        eval_ids = candidate_ids.gather(1, eval_rank)
+        eval_logits = candidate_logits.gather(1, eval_rank)
+        eval_mask = candidate_mask.gather(1, eval_rank)
+        adjusted_eval_logits, curvature_meta = self._curvature_adjust_logits_batch(
+            eval_ids,
+            eval_logits,
+            eval_mask,
+            ce_hidden=ce_hidden,
+            prev_hidden=prev_hidden,
+            prev_prev_hidden=prev_prev_hidden,
+            history_ids=history_ids,
+            context_anchor=context_anchor,
+        )
+        candidate_logits = candidate_logits.scatter(1, eval_rank, adjusted_eval_logits)
+
+        gen_len = torch.as_tensor(generated_len, dtype=torch.float32, device=self.device)
+        gen_len = gen_len.expand(batch) if gen_len.ndim == 0 else gen_len.view(batch)
+        if terminal_ids.numel():
+            terminal_mask = torch.isin(candidate_ids, terminal_ids) & candidate_mask
+            close_bonus = (0.35 + 0.08 * (gen_len - 10.0)).clamp_max(1.5) * (gen_len >= 10.0).float()
+            bonus = terminal_mask.float() * close_bonus.unsqueeze(1)
+            if self.eos_token_id is not None:
+                # Same rule as _sentence_close_bonus: EOS gets +0.15 whenever the
+                # row closes at all, whether or not EOS itself is a terminal.
+                row_closes = terminal_mask.any(dim=1) & (gen_len >= 10.0)
+                is_eos = (candidate_ids == int(self.eos_token_id)) & candidate_mask
+                bonus = bonus + 0.15 * (is_eos & row_closes.unsqueeze(1)).float()
+            candidate_logits = candidate_logits + bonus
+
+        out = logits.new_full(logits.shape, float("-inf"))
+        out = out.scatter_reduce(
+            1,
+            candidate_ids,
+            candidate_logits.masked_fill(~candidate_mask, float("-inf")),
+            reduce="amax",
+        )
+        out = out / max(temperature, 1e-6)
+        if top_k > 0:
+            kth = torch.topk(out, min(top_k, vocab_size), dim=-1).values[:, -1:]
+            out = out.masked_fill(out < kth, float("-inf"))
+        if not return_meta:
+            return out
+        curvature_meta["candidate_count"] = candidate_mask.sum(dim=1)
+        curvature_meta["eval_candidate_count"] = eval_mask.sum(dim=1)
+        return out, curvature_meta
+
     def apply_vocab_head(
         self,
         weight: torch.Tensor,
@@ -1246,6 +2288,8 @@ class CEEngine:
         self.data["decoder_vocab_weight"] = self.decoder_vocab_weight.detach().cpu()
         self.data["decoder_vocab_bias"] = self.decoder_vocab_bias.detach().cpu()
         self.data["decoder_vocab_scale"] = float(self.decoder_vocab_scale)
+        self._invalidate_mips_index("vocab_head")
+        self.bump_relax_version()
 
     def apply_decoder_refine(
         self,
@@ -1261,6 +2305,7 @@ class CEEngine:
         if query_bias is not None:
             self.decoder_query_bias = query_bias.detach().float().to(self.device)
             self.data["decoder_query_bias"] = self.decoder_query_bias.detach().cpu()
+        self.bump_relax_version()
 
     def apply_token_head(
         self,
@@ -1282,6 +2327,7 @@ class CEEngine:
         self.data["decoder_token_prev_proj"] = None if prev_proj is None else prev_proj.detach().cpu()
         self.data["decoder_token_bias"] = None if bias is None else bias.detach().cpu()
         self.data["decoder_token_scale"] = float(self.decoder_token_scale)
+        self.bump_relax_version()
 
     def decoder_snapshot(self) -> dict[str, torch.Tensor | float | None]:
         def clone_cpu(value):
@@ -1321,6 +2367,7 @@ class CEEngine:
         self.decoder_vocab_weight = load_tensor("decoder_vocab_weight")
         self.decoder_vocab_bias = load_tensor("decoder_vocab_bias")
         self.decoder_vocab_scale = float(snapshot.get("decoder_vocab_scale", self.decoder_vocab_scale))
+        self._invalidate_mips_index("vocab_head")
         self.decoder_token_ids = load_tensor("decoder_token_ids")
         self.decoder_token_state_proj = load_tensor("decoder_token_state_proj")
         self.decoder_token_prev_proj = load_tensor("decoder_token_prev_proj")
@@ -1328,6 +2375,10 @@ class CEEngine:
         self.decoder_token_scale = float(snapshot.get("decoder_token_scale", self.decoder_token_scale))
         self.pq_centroids = load_tensor("pq_centroids")
         self.pq_codes = load_tensor("pq_codes")
+        self._pq_offset_codes = None
+        if self.pq_cache is not None:
+            self.pq_cache.clear()
+        self._invalidate_mips_index("pq")
         active_mask = snapshot.get("active_dim_mask")
         struct_mask = snapshot.get("struct_dim_mask")
         if active_mask is not None and struct_mask is not None:
@@ -1357,8 +2408,43 @@ class CEEngine:
             self.data[key] = None if value is None else value.clone()
         self.data["decoder_vocab_scale"] = float(self.decoder_vocab_scale)
         self.data["decoder_token_scale"] = float(self.decoder_token_scale)
+        self.bump_relax_version()
 
-    def standalone_generate(
+    def _refresh_pool(self) -> ThreadPoolExecutor:
+        """Single-worker executor for async refreshes, created on first use."""
+        if getattr(self, "_refresh_executor", None) is None:
+            self._refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ce-refresh")
+        return self._refresh_executor
+
+    def close(self):
+        """Shut down the async refresh worker, waiting for a relax in flight.
+
+        Safe to call more than once; a later async decode starts a new worker.
+        """
+        executor = getattr(self, "_refresh_executor", None)
+        self._refresh_executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _relax_in_background(self, ctx: PromptContext, args) -> dict:
+        """Worker-side refresh; on CUDA it runs on a side stream.
+
+        Grad mode is thread-local and the worker does not inherit the
+        caller's, so autograd is switched off here explicitly.
+        """
+        with torch.no_grad(), prof_span("generate.refresh"):
+            if self.device.type != "cuda":
+                return self.relax_context(ctx, args)
+            if getattr(self, "_refresh_stream", None) is None:
+                self._refresh_stream = torch.cuda.Stream(device=self.device)
+            stream = self._refresh_stream
+            stream.wait_stream(torch.cuda.default_stream(self.device))
+            with torch.cuda.stream(stream):
+                result = self.relax_context(ctx, args)
+            stream.synchronize()
+            return result
+
+    def _standalone_steps(
         self,
         prompt_ids: torch.Tensor,
         m_star: torch.Tensor,
@@ -1371,11 +2457,27 @@ class CEEngine:
         refresh_args=None,
         refresh_init_layer: int | None = None,
         refresh_phi: torch.Tensor | None = None,
-    ) -> tuple[str, list[int], dict[str, float | int | None]]:
+        cancel=None,
+        async_refresh: bool = False,
+        max_staleness: int = 1,
+    ):
+        """Core decode loop: yields one raw record per sampled token.
+
+        Chosen-token risk/suppression stay as device tensors so callers that
+        only need the summary avoid a host sync per token. The generator's
+        return value is the run meta dict (including `finish_reason`).
+
+        With `async_refresh` the refresh relax runs on a worker thread while
+        the following tokens are sampled from the previous hidden state. A
+        refresh is applied as soon as it finishes, and the loop blocks on it
+        once `max_staleness` tokens have been sampled since it was issued.
+        Refresh points that arrive while one is in flight are coalesced.
+        """
         if not self.has_standalone_lexicon():
             raise RuntimeError("Standalone decoder requires embeddings or PQ lexical memory")
 
         refresh_interval = max(int(refresh_interval), 0)
+        max_staleness = max(int(max_staleness), 0)
         if getattr(self, '_skip_ln_for_standalone', False):
             h = m_star.float().to(self.device)
         else:
@@ -1388,92 +2490,783 @@ class CEEngine:
         refresh_count = 0
         refresh_steps = 0
         refresh_time_s = 0.0
+        refresh_wait_s = 0.0
         refresh_cos: list[float] = []
-        chosen_risk: list[float] = []
-        chosen_suppression: list[float] = []
+        refresh_staleness: list[int] = []
+        chosen_risk_sum = torch.zeros((), dtype=torch.float32, device=self.device)
+        chosen_suppression_sum = torch.zeros((), dtype=torch.float32, device=self.device)
+        chosen_count = torch.zeros((), dtype=torch.float32, device=self.device)
         step_risk_score: list[float] = []
         suppression_hits = 0
-        history_ids = running_ids[0].tolist()
+        history_ids = TokenHistory(running_ids[0].tolist(), ngram=self.repeat_ngram)
+        prompt_state = None
+        if refresh_interval > 0 and refresh_args is not None:
+            prompt_state = self.prompt_state_accumulator(running_ids)
         prev_hidden = None
         prev_prev_hidden = None
         context_anchor = h.detach().clone()
+        finish_reason = "length"
+        # In-flight async refresh: (future, context, len(out_ids) when issued).
+        pending = None
+
+        def apply_refresh(refresh_ctx: PromptContext, refresh_result: dict, staleness: int):
+            nonlocal h, phi_state, init_layer, context_anchor
+            nonlocal refresh_count, refresh_steps, refresh_time_s
+            h = self.ce_hidden(refresh_result["m_star"])
+            phi_state = refresh_result["phi_updated"]
+            init_layer = refresh_ctx.best_layer
+            context_anchor = h.detach().clone()
+            refresh_count += 1
+            refresh_steps += int(refresh_result["steps"])
+            refresh_time_s += float(refresh_result["elapsed_s"])
+            refresh_staleness.append(staleness)
+            if refresh_result["cos_ms_h"] is not None:
+                refresh_cos.append(float(refresh_result["cos_ms_h"]))
+
+        def resolve_pending() -> dict:
+            nonlocal pending, refresh_wait_s
+            future, refresh_ctx, issued_at = pending
+            pending = None
+            t_wait = time.perf_counter()
+            refresh_result = future.result()
+            refresh_wait_s += time.perf_counter() - t_wait
+            apply_refresh(refresh_ctx, refresh_result, len(out_ids) - issued_at)
+            return refresh_result
+
+        try:
+            for _ in range(max_tok):
+                if cancel is not None and cancel.is_set():
+                    finish_reason = "cancelled"
+                    break
+                step_t0 = time.perf_counter()
+                refresh_result = None
+                if pending is not None and (
+                    pending[0].done() or len(out_ids) - pending[2] >= max_staleness
+                ):
+                    refresh_result = resolve_pending()
+                logits, step_meta = self.standalone_logits(
+                    h,
+                    prev_id,
+                    temperature=temperature,
+                    top_k=top_k,
+                    repeat_ids=out_ids[-max(int(self.repeat_window), 1) :],
+                    repeat_penalty=repeat_penalty,
+                    history_ids=history_ids,
+                    prev_hidden=prev_hidden,
+                    prev_prev_hidden=prev_prev_hidden,
+                    context_anchor=context_anchor,
+                    generated_len=len(out_ids),
+                    return_meta=True,
+                )
+                probs = F.softmax(logits, dim=-1)
+                next_id = torch.multinomial(probs, 1).item()
+                if self.eos_token_id is not None and next_id == self.eos_token_id:
+                    finish_reason = "eos"
+                    break
+                candidate_ids = step_meta["candidate_ids"]
+                step_risk = torch.zeros((), dtype=torch.float32, device=self.device)
+                step_suppression = torch.zeros((), dtype=torch.float32, device=self.device)
+                step_hit = torch.zeros((), dtype=torch.float32, device=self.device)
+                if candidate_ids.numel():
+                    # Eval candidates are unique, so the hit mask selects at most one row.
+                    hit = (candidate_ids == next_id).float()
+                    step_risk = (step_meta["combined_risk"].float() * hit).sum()
+                    step_suppression = (step_meta["suppression"].float() * hit).sum()
+                    step_hit = hit.sum()
+                    chosen_risk_sum = chosen_risk_sum + step_risk
+                    chosen_suppression_sum = chosen_suppression_sum + step_suppression
+                    chosen_count = chosen_count + step_hit
+                step_risk_score.append(float(step_meta["curvature_risk_score"]))
+                suppression_hits += int(step_meta["suppressed_count"])
+
+                step_hidden = h.detach().clone()
+                out_ids.append(next_id)
+                prev_id = next_id
+                next_token = torch.tensor([[next_id]], device=self.device)
+                running_ids = torch.cat([running_ids, next_token], dim=1)
+                history_ids.append(next_id)
+                if prompt_state is not None:
+                    self.advance_prompt_state(prompt_state, next_id)
+                prev_prev_hidden = prev_hidden
+                prev_hidden = step_hidden
+                if (
+                    refresh_interval > 0
+                    and refresh_args is not None
+                    and init_layer is not None
+                    and len(out_ids) < max_tok
+                    and len(out_ids) % refresh_interval == 0
+                ):
+                    if async_refresh:
+                        if pending is not None and pending[0].done():
+                            refresh_result = resolve_pending()
+                        if pending is None:
+                            refresh_ctx = self.context_from_ids(
+                                running_ids,
+                                prompt="",
+                                init_layer=init_layer,
+                                phi=phi_state,
+                                need_teacher=False,
+                                state=prompt_state,
+                            )
+                            future = self._refresh_pool().submit(
+                                self._relax_in_background, refresh_ctx, refresh_args
+                            )
+                            pending = (future, refresh_ctx, len(out_ids))
+                    else:
+                        with prof_span("generate.refresh"):
+                            refresh_ctx = self.context_from_ids(
+                                running_ids,
+                                prompt="",
+                                init_layer=init_layer,
+                                phi=phi_state,
+                                need_teacher=False,
+                                state=prompt_state,
+                            )
+                            refresh_result = self.relax_context(refresh_ctx, refresh_args)
+                        apply_refresh(refresh_ctx, refresh_result, 0)
+                prof_count("generate.tokens")
+                prof_observe("generate.token_s", time.perf_counter() - step_t0)
+                yield {
+                    "index": len(out_ids) - 1,
+                    "token_id": next_id,
+                    "chosen_risk": step_risk,
+                    "chosen_suppression": step_suppression,
+                    "chosen_hit": step_hit,
+                    "curvature_risk_score": float(step_meta["curvature_risk_score"]),
+                    "suppressed_count": int(step_meta["suppressed_count"]),
+                    "refreshed": refresh_result is not None,
+                    "refresh_steps": 0 if refresh_result is None else int(refresh_result["steps"]),
+                    "refresh_time_s": 0.0 if refresh_result is None else float(refresh_result["elapsed_s"]),
+                }
+        finally:
+            # Never leave a relax running against this engine once the caller
+            # is done; wait() rather than result() so a failed refresh cannot
+            # mask the exception (or GeneratorExit) already propagating.
+            if pending is not None:
+                wait([pending[0]])
+
+        n_chosen = int(chosen_count.item())
+        return {
+            "refresh_interval": refresh_interval,
+            "refresh_count": refresh_count,
+            "refresh_steps": refresh_steps,
+            "refresh_time_s": refresh_time_s,
+            "refresh_cos_mean": None if not refresh_cos else sum(refresh_cos) / len(refresh_cos),
+            "refresh_phi_norm": None if phi_state is None else float(phi_state.norm().item()),
+            "curvature_risk_score": None if not step_risk_score else sum(step_risk_score) / len(step_risk_score),
+            "chosen_risk_mean": None if n_chosen == 0 else float(chosen_risk_sum.item()) / n_chosen,
+            "chosen_suppression_mean": None if n_chosen == 0 else float(chosen_suppression_sum.item()) / n_chosen,
+            "suppression_hits": int(suppression_hits),
+            "finish_reason": finish_reason,
+            "async_refresh": bool(async_refresh),
+            "refresh_staleness_max": max(refresh_staleness, default=0),
+            "refresh_staleness_mean": (
+                None if not refresh_staleness else sum(refresh_staleness) / len(refresh_staleness)
+            ),
+            "refresh_wait_s": refresh_wait_s,
+        }
+
+    def standalone_generate(
+        self,
+        prompt_ids: torch.Tensor,
+        m_star: torch.Tensor,
+        *,
+        max_tok: int,
+        temperature: float,
+        top_k: int,
+        repeat_penalty: float,
+        refresh_interval: int = 0,
+        refresh_args=None,
+        refresh_init_layer: int | None = None,
+        refresh_phi: torch.Tensor | None = None,
+        async_refresh: bool = False,
+        max_staleness: int = 1,
+    ) -> tuple[str, list[int], dict[str, float | int | None]]:
+        steps = self._standalone_steps(
+            prompt_ids,
+            m_star,
+            max_tok=max_tok,
+            temperature=temperature,
+            top_k=top_k,
+            repeat_penalty=repeat_penalty,
+            refresh_interval=refresh_interval,
+            refresh_args=refresh_args,
+            refresh_init_layer=refresh_init_layer,
+            refresh_phi=refresh_phi,
+            async_refresh=async_refresh,
+            max_staleness=max_staleness,
+        )
+        out_ids: list[int] = []
+        while True:
+            try:
+                out_ids.append(int(next(steps)["token_id"]))
+            except StopIteration as stop:
+                meta = stop.value
+                break
+        return self.tok.decode(out_ids, skip_special_tokens=True), out_ids, meta
+
+    def speculative_generate(
+        self,
+        prompt_ids: torch.Tensor,
+        m_star: torch.Tensor,
+        *,
+        max_tok: int,
+        temperature: float,
+        top_k: int,
+        repeat_penalty: float,
+        refresh_args,
+        refresh_init_layer: int,
+        refresh_phi: torch.Tensor | None = None,
+        draft_tokens: int = 4,
+        risk_margin: float = 0.0,
+    ) -> tuple[str, list[int], dict[str, float | int | None]]:
+        """Standalone decoding with k-token drafts and one batched refresh per round.
+
+        Each round samples up to `draft_tokens` tokens from the current hidden
+        state, then relaxes every draft prefix `committed + drafts[:i+1]` in
+        one `relax_contexts` batch. Draft `i` is re-scored against the state
+        relaxed on `committed + drafts[:i]` only, so the verifier never sees
+        the token it judges; all positions go through one
+        `standalone_logits_batch` call. The longest prefix whose tokens stay in
+        the causal candidate set with curvature risk at most
+        `threshold + risk_margin` is kept. The first rejected position is
+        resampled from its causal logits and the remaining drafts are rolled
+        back; the next round then starts with a refresh over the committed
+        context. Batched prefixes all start from the round's phi rather than
+        chaining phi through each other, which is the one difference from
+        refreshing after every token.
+        """
+        if not self.has_standalone_lexicon():
+            raise RuntimeError("Standalone decoder requires embeddings or PQ lexical memory")
+        if refresh_args is None or refresh_init_layer is None:
+            raise ValueError("speculative decoding needs refresh_args and refresh_init_layer")
 
-        for _ in range(max_tok):
-            logits, step_meta = self.standalone_logits(
+        draft_tokens = max(int(draft_tokens), 1)
+        window = max(int(self.repeat_window), 1)
+        if getattr(self, '_skip_ln_for_standalone', False):
+            h = m_star.float().to(self.device)
+        else:
+            h = F.layer_norm(m_star, (self.d,), self.ln_w, self.ln_b)
+        prev_id = int(prompt_ids[0, -1].item())
+        running_ids = prompt_ids.clone()
+        out_ids: list[int] = []
+        history_ids = TokenHistory(running_ids[0].tolist(), ngram=self.repeat_ngram)
+        prompt_state = self.prompt_state_accumulator(running_ids)
+        phi_state = None if refresh_phi is None else refresh_phi.detach().clone().to(self.device)
+        init_layer = refresh_init_layer
+        prev_hidden = None
+        prev_prev_hidden = None
+        context_anchor = h.detach().clone()
+        stale = False
+        finish_reason = "length"
+        stats = {
+            "refresh_count": 0,
+            "refresh_steps": 0,
+            "refresh_time_s": 0.0,
+            "rounds": 0,
+            "drafted": 0,
+            "accepted": 0,
+            "corrections": 0,
+        }
+        refresh_cos: list[float] = []
+        chosen_risk: list[torch.Tensor] = []
+        chosen_suppression: list[torch.Tensor] = []
+        step_risk_score: list[torch.Tensor] = []
+        suppression_hits: list[torch.Tensor] = []
+
+        def refresh(ids: torch.Tensor, state: PromptStateAccumulator):
+            with prof_span("generate.refresh"):
+                ctx = self.context_from_ids(
+                    ids,
+                    prompt="",
+                    init_layer=init_layer,
+                    phi=phi_state,
+                    need_teacher=False,
+                    state=state,
+                )
+                result = self.relax_context(ctx, refresh_args)
+            stats["refresh_count"] += 1
+            stats["refresh_steps"] += int(result["steps"])
+            stats["refresh_time_s"] += float(result["elapsed_s"])
+            if result["cos_ms_h"] is not None:
+                refresh_cos.append(float(result["cos_ms_h"]))
+            return ctx, result
+
+        def commit(token_id: int, hidden: torch.Tensor, meta: dict, row: int):
+            nonlocal running_ids, prev_id, prev_hidden, prev_prev_hidden
+            hit = (meta["candidate_ids"][row] == token_id) & meta["candidate_mask"][row]
+            chosen_risk.append((meta["combined_risk"][row] * hit.float()).sum())
+            chosen_suppression.append((meta["suppression"][row] * hit.float()).sum())
+            step_risk_score.append(meta["curvature_risk_score"][row])
+            suppression_hits.append(meta["suppressed_count"][row])
+            out_ids.append(token_id)
+            running_ids = torch.cat([running_ids, running_ids.new_tensor([[token_id]])], dim=1)
+            history_ids.append(token_id)
+            self.advance_prompt_state(prompt_state, token_id)
+            prev_id = token_id
+            prev_prev_hidden = prev_hidden
+            prev_hidden = hidden
+
+        while len(out_ids) < max_tok:
+            if stale:
+                ctx, result = refresh(running_ids, prompt_state)
+                h = self.ce_hidden(result["m_star"])
+                phi_state = result["phi_updated"]
+                init_layer = ctx.best_layer
+                context_anchor = h.detach().clone()
+                stale = False
+
+            # Draft: sample from the current hidden state without refreshing.
+            drafts: list[int] = []
+            draft_history = TokenHistory(history_ids, ngram=self.repeat_ngram)
+            draft_prev = prev_id
+            draft_prev_hidden = prev_hidden
+            draft_prev_prev_hidden = prev_prev_hidden
+            hit_eos = False
+            for _ in range(min(draft_tokens, max_tok - len(out_ids))):
+                logits = self.standalone_logits(
+                    h,
+                    draft_prev,
+                    temperature=temperature,
+                    top_k=top_k,
+                    repeat_ids=(out_ids + drafts)[-window:],
+                    repeat_penalty=repeat_penalty,
+                    history_ids=draft_history,
+                    prev_hidden=draft_prev_hidden,
+                    prev_prev_hidden=draft_prev_prev_hidden,
+                    context_anchor=context_anchor,
+                    generated_len=len(out_ids) + len(drafts),
+                )
+                next_id = torch.multinomial(F.softmax(logits, dim=-1), 1).item()
+                if self.eos_token_id is not None and next_id == self.eos_token_id:
+                    hit_eos = True
+                    break
+                drafts.append(next_id)
+                draft_history.append(next_id)
+                draft_prev = next_id
+                draft_prev_prev_hidden = draft_prev_hidden
+                draft_prev_hidden = h
+            if not drafts:
+                finish_reason = "eos"
+                break
+
+            # Verify: relax every draft prefix in one batch; row i is judged on
+            # the state relaxed over committed + drafts[:i] only.
+            stats["rounds"] += 1
+            stats["drafted"] += len(drafts)
+            n = len(drafts)
+            ext_ctxs = []
+            ext_state = prompt_state.copy()
+            for row, token_id in enumerate(drafts):
+                self.advance_prompt_state(ext_state, token_id)
+                ext_ids = torch.cat([running_ids, running_ids.new_tensor([drafts[: row + 1]])], dim=1)
+                ext_ctxs.append(
+                    self.context_from_ids(
+                        ext_ids,
+                        prompt="",
+                        init_layer=init_layer,
+                        phi=phi_state,
+                        need_teacher=False,
+                        state=ext_state,
+                    )
+                )
+            t_verify = time.perf_counter()
+            with prof_span("generate.refresh"):
+                results = self.relax_contexts(ext_ctxs, refresh_args)
+            stats["refresh_count"] += n
+            stats["refresh_steps"] += sum(int(result["steps"]) for result in results)
+            stats["refresh_time_s"] += time.perf_counter() - t_verify
+            refresh_cos.extend(
+                float(result["cos_ms_h"]) for result in results if result["cos_ms_h"] is not None
+            )
+            # states[i] is relaxed on committed + drafts[:i]; states[n] covers every draft.
+            states = [h] + [self.ce_hidden(result["m_star"]) for result in results]
+            # Row i's history is states[i-1], states[i-2], falling back to the
+            # committed prev / prev_prev; missing entries get neutral stand-ins.
+            history = [prev_prev_hidden, prev_hidden] + states[:n]
+            row_prev_hidden, row_prev_prev_hidden = [], []
+            for row in range(n):
+                row_prev, row_prev_prev = self._fill_curvature_history(
+                    states[row], history[row + 1], history[row]
+                )
+                row_prev_hidden.append(row_prev)
+                row_prev_prev_hidden.append(row_prev_prev)
+            base_history = list(history_ids)
+            verify_logits, verify_meta = self.standalone_logits_batch(
+                torch.stack(states[:n], dim=0),
+                [prev_id] + drafts[:-1],
+                temperature=temperature,
+                top_k=top_k,
+                repeat_ids=[(out_ids + drafts[:row])[-window:] for row in range(n)],
+                repeat_penalty=repeat_penalty,
+                history_ids=[base_history + drafts[:row] for row in range(n)],
+                prev_hidden=torch.stack(row_prev_hidden, dim=0),
+                prev_prev_hidden=torch.stack(row_prev_prev_hidden, dim=0),
+                context_anchor=torch.stack([context_anchor] + states[1:n], dim=0),
+                generated_len=[len(out_ids) + row for row in range(n)],
+                return_meta=True,
+            )
+            draft_ids = torch.tensor(drafts, dtype=torch.long, device=self.device).unsqueeze(1)
+            hit = (verify_meta["candidate_ids"] == draft_ids) & verify_meta["candidate_mask"]
+            risk = (verify_meta["combined_risk"] * hit.float()).sum(dim=1)
+            ok = (
+                torch.isfinite(verify_logits.gather(1, draft_ids).squeeze(1))
+                & hit.any(dim=1)
+                & (risk <= verify_meta["threshold"] + float(risk_margin))
+            )
+            n_acc = int(ok.long().cumprod(dim=0).sum().item())
+            stats["accepted"] += n_acc
+            for row in range(n_acc):
+                commit(drafts[row], states[row], verify_meta, row)
+
+            if n_acc == n:
+                h = states[n]
+                phi_state = results[-1]["phi_updated"]
+                init_layer = ext_ctxs[-1].best_layer
+                context_anchor = h.detach().clone()
+                if hit_eos:
+                    finish_reason = "eos"
+                    break
+                continue
+
+            # Roll back drafts[n_acc:]; resample that position from its causal logits.
+            next_id = torch.multinomial(F.softmax(verify_logits[n_acc], dim=-1), 1).item()
+            if self.eos_token_id is not None and next_id == self.eos_token_id:
+                finish_reason = "eos"
+                break
+            stats["corrections"] += 1
+            commit(next_id, states[n_acc], verify_meta, n_acc)
+            stale = True
+
+        n_chosen = len(chosen_risk)
+        drafted = stats["drafted"]
+        return self.tok.decode(out_ids, skip_special_tokens=True), out_ids, {
+            "refresh_interval": draft_tokens,
+            "refresh_count": stats["refresh_count"],
+            "refresh_steps": stats["refresh_steps"],
+            "refresh_time_s": stats["refresh_time_s"],
+            "refresh_cos_mean": None if not refresh_cos else sum(refresh_cos) / len(refresh_cos),
+            "refresh_phi_norm": None if phi_state is None else float(phi_state.norm().item()),
+            "curvature_risk_score": (
+                None if not step_risk_score else float(torch.stack(step_risk_score).float().mean().item())
+            ),
+            "chosen_risk_mean": None if n_chosen == 0 else float(torch.stack(chosen_risk).mean().item()),
+            "chosen_suppression_mean": (
+                None if n_chosen == 0 else float(torch.stack(chosen_suppression).mean().item())
+            ),
+            "suppression_hits": 0 if not suppression_hits else int(torch.stack(suppression_hits).sum().item()),
+            "finish_reason": finish_reason,
+            "draft_tokens": draft_tokens,
+            "draft_rounds": stats["rounds"],
+            "draft_drafted": drafted,
+            "draft_accepted": stats["accepted"],
+            "draft_corrections": stats["corrections"],
+            "draft_acceptance_rate": None if drafted == 0 else stats["accepted"] / drafted,
+        }
+
+    def _decode_delta(
+        self,
+        token_ids: list[int],
+        prefix_offset: int,
+        read_offset: int,
+        *,
+        final: bool = False,
+    ) -> tuple[str, tuple[int, int]]:
+        """Text added by the tokens after `read_offset`, decoding only a trailing window.
+
+        `token_ids[prefix_offset:read_offset]` is already emitted context; it is
+        decoded with and without the pending tokens and only the difference is
+        returned, so each step costs O(window) instead of re-decoding the whole
+        output, and spacing that depends on the previous token still comes out
+        right. A pending tail that does not yet extend the context, or that
+        ends in a partial multi-byte sequence, is held back (unless `final`)
+        and the offsets stay put until it completes.
+        """
+        prefix_text = self.tok.decode(token_ids[prefix_offset:read_offset], skip_special_tokens=True)
+        new_text = self.tok.decode(token_ids[prefix_offset:], skip_special_tokens=True)
+        if final or (len(new_text) > len(prefix_text) and not new_text.endswith("\ufffd")):
+            return new_text[len(prefix_text):], (read_offset, len(token_ids))
+        return "", (prefix_offset, read_offset)
+
+    def stream_generate(
+        self,
+        prompt_ids: torch.Tensor,
+        m_star: torch.Tensor,
+        *,
+        max_tok: int,
+        temperature: float,
+        top_k: int,
+        repeat_penalty: float,
+        refresh_interval: int = 0,
+        refresh_args=None,
+        refresh_init_layer: int | None = None,
+        refresh_phi: torch.Tensor | None = None,
+        cancel=None,
+        async_refresh: bool = False,
+        max_staleness: int = 1,
+    ):
+        """Streaming variant of :meth:`standalone_generate`.
+
+        Yields one event dict per sampled token (`token_id`, `text_delta`,
+        chosen-token `risk`/`suppression`, refresh timing, `elapsed_s` since
+        the call) and a final event with `done=True`, the full `text`,
+        `token_ids` and the run `meta`. Generation stops early when `cancel`
+        (anything with `is_set()`, e.g. `threading.Event`) is set or when the
+        consumer closes the generator.
+        """
+        t0 = time.perf_counter()
+        steps = self._standalone_steps(
+            prompt_ids,
+            m_star,
+            max_tok=max_tok,
+            temperature=temperature,
+            top_k=top_k,
+            repeat_penalty=repeat_penalty,
+            refresh_interval=refresh_interval,
+            refresh_args=refresh_args,
+            refresh_init_layer=refresh_init_layer,
+            refresh_phi=refresh_phi,
+            cancel=cancel,
+            async_refresh=async_refresh,
+            max_staleness=max_staleness,
+        )
+        out_ids: list[int] = []
+        offsets = (0, 0)
+        meta: dict = {}
+        try:
+            while True:
+                try:
+                    record = next(steps)
+                except StopIteration as stop:
+                    meta = stop.value
+                    break
+                out_ids.append(int(record["token_id"]))
+                delta, offsets = self._decode_delta(out_ids, *offsets)
+                hit = float(record["chosen_hit"].item()) > 0.0
+                yield {
+                    "done": False,
+                    "index": record["index"],
+                    "token_id": record["token_id"],
+                    "text_delta": delta,
+                    "risk": float(record["chosen_risk"].item()) if hit else None,
+                    "suppression": float(record["chosen_suppression"].item()) if hit else None,
+                    "curvature_risk_score": record["curvature_risk_score"],
+                    "suppressed_count": record["suppressed_count"],
+                    "refreshed": record["refreshed"],
+                    "refresh_steps": record["refresh_steps"],
+                    "refresh_time_s": record["refresh_time_s"],
+                    "elapsed_s": time.perf_counter() - t0,
+                }
+        finally:
+            steps.close()
+        text = self.tok.decode(out_ids, skip_special_tokens=True)
+        yield {
+            "done": True,
+            "text": text,
+            "text_delta": self._decode_delta(out_ids, *offsets, final=True)[0],
+            "token_ids": out_ids,
+            "meta": meta,
+            "finish_reason": meta.get("finish_reason", "length"),
+            "elapsed_s": time.perf_counter() - t0,
+        }
+
+    def standalone_generate_batch(
+        self,
+        prompt_ids: list[torch.Tensor],
+        m_star: torch.Tensor,
+        *,
+        max_tok: int,
+        temperature: float,
+        top_k: int,
+        repeat_penalty: float,
+        refresh_interval: int = 0,
+        refresh_args=None,
+        refresh_init_layer: int | list[int] | None = None,
+        refresh_phi: torch.Tensor | None = None,
+    ) -> list[tuple[str, list[int], dict[str, float | int | None]]]:
+        """Decode B prompts in lockstep; returns one `standalone_generate` tuple per row.
+
+        Each step runs one :meth:`standalone_logits_batch` call and one
+        batched `multinomial`. Rows that emit EOS drop out of the working set,
+        and refreshes relax all remaining rows together via `relax_contexts`.
+        """
+        if not self.has_standalone_lexicon():
+            raise RuntimeError("Standalone decoder requires embeddings or PQ lexical memory")
+        batch = len(prompt_ids)
+        if batch == 0:
+            return []
+        if m_star.ndim != 2 or m_star.shape[0] != batch:
+            raise ValueError(f"expected {batch} relaxed states, got shape {tuple(m_star.shape)}")
+        m_star = m_star.float().to(self.device)
+
+        refresh_interval = max(int(refresh_interval), 0)
+        if getattr(self, '_skip_ln_for_standalone', False):
+            h = m_star
+        else:
+            h = F.layer_norm(m_star, (self.d,), self.ln_w, self.ln_b)
+        if isinstance(refresh_init_layer, (list, tuple)):
+            init_layers = [None if layer is None else int(layer) for layer in refresh_init_layer]
+        else:
+            init_layers = [refresh_init_layer] * batch
+        phi_states: list[torch.Tensor | None] = [
+            None if refresh_phi is None else refresh_phi[row].detach().clone().to(self.device)
+            for row in range(batch)
+        ]
+        running_ids = [ids.to(self.device).view(1, -1).clone() for ids in prompt_ids]
+        histories = [TokenHistory(ids[0].tolist(), ngram=self.repeat_ngram) for ids in running_ids]
+        prompt_states = [
+            self.prompt_state_accumulator(ids) if refresh_interval > 0 and refresh_args is not None else None
+            for ids in running_ids
+        ]
+        prev_ids = torch.tensor([int(ids[0, -1].item()) for ids in running_ids], device=self.device)
+        out_ids: list[list[int]] = [[] for _ in range(batch)]
+        finish = ["length"] * batch
+        stats = [
+            {"refresh_count": 0, "refresh_steps": 0, "refresh_time_s": 0.0, "refresh_cos": [], "risk": [], "hits": 0}
+            for _ in range(batch)
+        ]
+        chosen_risk_sum = torch.zeros(batch, dtype=torch.float32, device=self.device)
+        chosen_suppression_sum = torch.zeros(batch, dtype=torch.float32, device=self.device)
+        chosen_count = torch.zeros(batch, dtype=torch.float32, device=self.device)
+        rows = torch.arange(batch, device=self.device)
+        active = list(range(batch))
+        prev_hidden = None
+        prev_prev_hidden = None
+        context_anchor = h.detach().clone()
+
+        for step in range(max_tok):
+            if not active:
+                break
+            logits, step_meta = self.standalone_logits_batch(
                 h,
-                prev_id,
+                prev_ids,
                 temperature=temperature,
                 top_k=top_k,
-                repeat_ids=out_ids[-max(int(self.repeat_window), 1) :],
+                repeat_ids=[out_ids[row][-max(int(self.repeat_window), 1) :] for row in active],
                 repeat_penalty=repeat_penalty,
-                history_ids=history_ids,
+                history_ids=[histories[row] for row in active],
                 prev_hidden=prev_hidden,
                 prev_prev_hidden=prev_prev_hidden,
                 context_anchor=context_anchor,
-                generated_len=len(out_ids),
+                generated_len=step,
                 return_meta=True,
             )
-            probs = F.softmax(logits, dim=-1)
-            next_id = torch.multinomial(probs, 1).item()
-            if self.eos_token_id is not None and next_id == self.eos_token_id:
+            next_ids = torch.multinomial(F.softmax(logits, dim=-1), 1).squeeze(1)
+            hit = ((step_meta["candidate_ids"] == next_ids.unsqueeze(1)) & step_meta["candidate_mask"]).float()
+            next_list = next_ids.tolist()
+            risk_list = step_meta["curvature_risk_score"].tolist()
+            suppressed_list = step_meta["suppressed_count"].tolist()
+
+            keep = [
+                pos for pos, token_id in enumerate(next_list)
+                if self.eos_token_id is None or token_id != self.eos_token_id
+            ]
+            for pos in set(range(len(active))).difference(keep):
+                finish[active[pos]] = "eos"
+            if len(keep) < len(active):
+                keep_idx = torch.tensor(keep, dtype=torch.long, device=self.device)
+                h = h.index_select(0, keep_idx)
+                context_anchor = context_anchor.index_select(0, keep_idx)
+                prev_hidden = None if prev_hidden is None else prev_hidden.index_select(0, keep_idx)
+                prev_prev_hidden = None if prev_prev_hidden is None else prev_prev_hidden.index_select(0, keep_idx)
+                hit = hit.index_select(0, keep_idx)
+                next_ids = next_ids.index_select(0, keep_idx)
+                step_meta = {
+                    key: step_meta[key].index_select(0, keep_idx)
+                    for key in ("combined_risk", "suppression")
+                }
+                rows = rows.index_select(0, keep_idx)
+                active = [active[pos] for pos in keep]
+                risk_list = [risk_list[pos] for pos in keep]
+                suppressed_list = [suppressed_list[pos] for pos in keep]
+                next_list = [next_list[pos] for pos in keep]
+            if not active:
                 break
-            candidate_ids = step_meta["candidate_ids"]
-            if candidate_ids.numel():
-                match = torch.nonzero(candidate_ids == next_id, as_tuple=False)
-                if match.numel():
-                    idx = int(match[0, 0].item())
-                    risk_values = step_meta["combined_risk"]
-                    suppression_values = step_meta["suppression"]
-                    chosen_risk.append(float(risk_values[idx].item()))
-                    chosen_suppression.append(float(suppression_values[idx].item()))
-            step_risk_score.append(float(step_meta["curvature_risk_score"]))
-            suppression_hits += int(step_meta["suppressed_count"])
+
+            chosen_risk_sum.index_add_(0, rows, (step_meta["combined_risk"].float() * hit).sum(dim=1))
+            chosen_suppression_sum.index_add_(0, rows, (step_meta["suppression"].float() * hit).sum(dim=1))
+            chosen_count.index_add_(0, rows, hit.sum(dim=1))
+            for pos, row in enumerate(active):
+                token_id = int(next_list[pos])
+                stats[row]["risk"].append(float(risk_list[pos]))
+                stats[row]["hits"] += int(suppressed_list[pos])
+                out_ids[row].append(token_id)
+                histories[row].append(token_id)
+                running_ids[row] = torch.cat(
+                    [running_ids[row], torch.tensor([[token_id]], device=self.device)], dim=1
+                )
+                if prompt_states[row] is not None:
+                    self.advance_prompt_state(prompt_states[row], token_id)
 
             step_hidden = h.detach().clone()
-            out_ids.append(next_id)
-            prev_id = next_id
-            next_token = torch.tensor([[next_id]], device=self.device)
-            running_ids = torch.cat([running_ids, next_token], dim=1)
-            history_ids.append(next_id)
+            prev_ids = next_ids
             prev_prev_hidden = prev_hidden
             prev_hidden = step_hidden
+            n_out = step + 1
+            refresh_rows = [
+                pos for pos, row in enumerate(active)
+                if init_layers[row] is not None
+            ]
             if (
                 refresh_interval > 0
                 and refresh_args is not None
-                and init_layer is not None
-                and len(out_ids) < max_tok
-                and len(out_ids) % refresh_interval == 0
+                and refresh_rows
+                and n_out < max_tok
+                and n_out % refresh_interval == 0
             ):
-                refresh_ctx = self.context_from_ids(
-                    running_ids,
-                    init_layer=init_layer,
-                    phi=phi_state,
-                    need_teacher=False,
-                )
-                refresh_result = self.relax_context(refresh_ctx, refresh_args)
-                h = self.ce_hidden(refresh_result["m_star"])
-                phi_state = refresh_result["phi_updated"]
-                init_layer = refresh_ctx.best_layer
-                context_anchor = h.detach().clone()
-                refresh_count += 1
-                refresh_steps += int(refresh_result["steps"])
-                refresh_time_s += float(refresh_result["elapsed_s"])
-                if refresh_result["cos_ms_h"] is not None:
-                    refresh_cos.append(float(refresh_result["cos_ms_h"]))
-
-        meta = {
-            "refresh_interval": refresh_interval,
-            "refresh_count": refresh_count,
-            "refresh_steps": refresh_steps,
-            "refresh_time_s": refresh_time_s,
-            "refresh_cos_mean": None if not refresh_cos else sum(refresh_cos) / len(refresh_cos),
-            "refresh_phi_norm": None if phi_state is None else float(phi_state.norm().item()),
-            "curvature_risk_score": None if not step_risk_score else sum(step_risk_score) / len(step_risk_score),
-            "chosen_risk_mean": None if not chosen_risk else sum(chosen_risk) / len(chosen_risk),
-            "chosen_suppression_mean": None if not chosen_suppression else sum(chosen_suppression) / len(chosen_suppression),
-            "suppression_hits": int(suppression_hits),
-        }
-        return self.tok.decode(out_ids, skip_special_tokens=True), out_ids, meta
+                ctxs = [
+                    self.context_from_ids(
+                        running_ids[active[pos]],
+                        prompt="",
+                        init_layer=init_layers[active[pos]],
+                        phi=phi_states[active[pos]],
+                        need_teacher=False,
+                        state=prompt_states[active[pos]],
+                    )
+                    for pos in refresh_rows
+                ]
+                results = self.relax_contexts(ctxs, refresh_args)
+                refresh_idx = torch.tensor(refresh_rows, dtype=torch.long, device=self.device)
+                new_h = self.ce_hidden(torch.stack([result["m_star"] for result in results], dim=0))
+                h = h.index_copy(0, refresh_idx, new_h)
+                context_anchor = context_anchor.index_copy(0, refresh_idx, new_h.detach().clone())
+                for pos, ctx, result in zip(refresh_rows, ctxs, results):
+                    row = active[pos]
+                    phi_states[row] = result["phi_updated"]
+                    init_layers[row] = ctx.best_layer
+                    stats[row]["refresh_count"] += 1
+                    stats[row]["refresh_steps"] += int(result["steps"])
+                    stats[row]["refresh_time_s"] += float(result["elapsed_s"])
+                    if result["cos_ms_h"] is not None:
+                        stats[row]["refresh_cos"].append(float(result["cos_ms_h"]))
+
+        chosen_n = chosen_count.tolist()
+        risk_sums = chosen_risk_sum.tolist()
+        suppression_sums = chosen_suppression_sum.tolist()
+        outputs = []
+        for row in range(batch):
+            row_stats = stats[row]
+            n_chosen = int(chosen_n[row])
+            meta = {
+                "refresh_interval": refresh_interval,
+                "refresh_count": row_stats["refresh_count"],
+                "refresh_steps": row_stats["refresh_steps"],
+                "refresh_time_s": row_stats["refresh_time_s"],
+                "refresh_cos_mean": (
+                    None if not row_stats["refresh_cos"]
+                    else sum(row_stats["refresh_cos"]) / len(row_stats["refresh_cos"])
+                ),
+                "refresh_phi_norm": None if phi_states[row] is None else float(phi_states[row].norm().item()),
+                "curvature_risk_score": (
+                    None if not row_stats["risk"] else sum(row_stats["risk"]) / len(row_stats["risk"])
+                ),
+                "chosen_risk_mean": None if n_chosen == 0 else risk_sums[row] / n_chosen,
+                "chosen_suppression_mean": None if n_chosen == 0 else suppression_sums[row] / n_chosen,
+                "suppression_hits": int(row_stats["hits"]),
+                "finish_reason": finish[row],
+            }
+            outputs.append((self.tok.decode(out_ids[row], skip_special_tokens=True), out_ids[row], meta))
+        return outputs
 
     def legacy_generate(
         self,
@@ -1603,10 +3396,11 @@ class CEEngine:
         init_layer: int | None = None,
         phi: torch.Tensor | None = None,
         need_teacher: bool = True,
+        state: PromptStateAccumulator | None = None,
     ) -> PromptContext:
         if need_teacher and self.model is not None and not getattr(self, 'allow_pretrained_fallback', False):
             raise RuntimeError("teacher path is disabled in runtime-only mode")
-        m0, phi_base = self.runtime_prompt_state(prompt_ids, phi=phi)
+        m0, phi_base = self.runtime_prompt_state(prompt_ids if state is None else state, phi=phi)
         best_layer = int(init_layer) if init_layer is not None else int(
             self.data.get("default_init_layer", max(self.n_layer - 1, 0))
         )
@@ -1621,9 +3415,26 @@ class CEEngine:
             layer_scores={best_layer: float("nan")},
         )
 
+    def _warm_cache_scope(self, args) -> tuple:
+        """Warm-cache scope: relax version plus every argument the relaxed state depends on."""
+        return (int(self.relax_version),) + tuple(
+            getattr(args, name, None) for name in _WARM_CACHE_ARGS
+        ) + (getattr(args, "solver", "euler"),)
+
+    @profiled("engine.relax")
     def relax_context(self, ctx: PromptContext, args):
         dt_eff = min(float(args.dt), 0.9 * self.tau)
         cb_weight = self.portal if args.cb_weight is None else float(args.cb_weight)
+        token_ids = None
+        warm_m = None
+        if self.warm_cache is not None:
+            token_ids = ctx.prompt_ids.view(-1).tolist()
+            warm_scope = self._warm_cache_scope(args)
+            warm_m = self.warm_cache.lookup(warm_scope, token_ids)
+        # A warm start begins at an already relaxed state: skip the annealing
+        # phase and apply the convergence test after a short warm-up.
+        warmup_steps = 30 if warm_m is None else int(getattr(args, "warm_start_warmup", 2))
+        anneal_ratio = 0.6 if warm_m is None else 0.0
         codebook = self.build_runtime_codebook(ctx.m0, top_k=args.cb_topk)
         metric_basis = ce_build_metric_basis(
             codebook,
@@ -1655,13 +3466,96 @@ class CEEngine:
             lambda_phi=args.lambda_phi,
             lambda_var=args.lambda_var,
             noise_scale=args.noise_scale,
+            anneal_ratio=anneal_ratio,
+            tol=1e-4,
+            backend=args.backend,
+            seed=args.seed,
+            dense_w=self._dense_relax_w,
+            operator=self._current_relax_operator(),
+            warmup_steps=warmup_steps,
+            init=warm_m,
+            solver=getattr(args, "solver", "euler"),
+        )
+        elapsed = time.time() - t0
+        prof_count("relax.steps", n_steps)
+        if self.warm_cache is not None:
+            self.warm_cache.store(warm_scope, token_ids, m_star)
+        result = self._relax_result(ctx, m_star, hist, n_steps, elapsed, dt_eff)
+        result["warm_start"] = warm_m is not None
+        return result
+
+    @profiled("engine.relax_batch")
+    def relax_contexts(self, ctxs: list[PromptContext], args) -> list[dict]:
+        """Relax several prompt contexts together (one SpMM per step on the torch path)."""
+        if not ctxs:
+            return []
+        if self.warm_cache is not None:
+            # Warm starts change the init and the annealing per prompt; keep
+            # them (and their cache bookkeeping) on the sequential path.
+            return [self.relax_context(ctx, args) for ctx in ctxs]
+        dt_eff = min(float(args.dt), 0.9 * self.tau)
+        cb_weight = self.portal if args.cb_weight is None else float(args.cb_weight)
+        w_eigvecs = self._get_w_eigvecs(args.metric_rank)
+        codebooks = [self.build_runtime_codebook(ctx.m0, top_k=args.cb_topk) for ctx in ctxs]
+        metric_bases = [
+            ce_build_metric_basis(
+                codebook,
+                ctx.m0,
+                int(args.metric_rank),
+                w_eigvecs=w_eigvecs,
+                backend=args.backend,
+            )
+            for ctx, codebook in zip(ctxs, codebooks)
+        ]
+        m0 = torch.stack([ctx.m0 for ctx in ctxs], dim=0)
+        phi = torch.stack([ctx.phi for ctx in ctxs], dim=0)
+        t0 = time.time()
+        m_star, hists, steps = ce_relax_packed_batch(
+            self.W_pack[0],
+            self.W_pack[1],
+            self.W_pack[2],
+            m0,
+            phi,
+            m0,
+            codebooks,
+            metric_bases,
+            portal=self.portal,
+            bypass=self.bypass,
+            t_wake=self.t_wake,
+            beta=args.beta,
+            cb_w=cb_weight,
+            tau=self.tau,
+            dt=dt_eff,
+            max_steps=args.steps,
+            metric_rank=args.metric_rank,
+            lambda0=args.lambda0,
+            lambda_phi=args.lambda_phi,
+            lambda_var=args.lambda_var,
+            noise_scale=args.noise_scale,
             anneal_ratio=0.6,
             tol=1e-4,
             backend=args.backend,
             seed=args.seed,
             dense_w=self._dense_relax_w,
+            operator=self._current_relax_operator(),
+            solver=getattr(args, "solver", "euler"),
         )
         elapsed = time.time() - t0
+        prof_count("relax.steps", sum(steps))
+        return [
+            self._relax_result(ctx, m_star[row], hists[row], steps[row], elapsed, dt_eff)
+            for row, ctx in enumerate(ctxs)
+        ]
+
+    @staticmethod
+    def _relax_result(
+        ctx: PromptContext,
+        m_star: torch.Tensor,
+        hist: dict,
+        n_steps: int,
+        elapsed: float,
+        dt_eff: float,
+    ) -> dict:
         cos_ms = None
         if ctx.h_true is not None:
             cos_ms = F.cosine_similarity(m_star.unsqueeze(0), ctx.h_true).item()
@@ -1699,45 +3593,111 @@ class CEEngine:
         payload.update(updates)
         return SimpleNamespace(**payload)
 
-    def decode_outputs(self, ctx: PromptContext, relax_result: dict, args):
-        outputs: dict[str, str] = {}
-        meta: dict[str, object] = {}
-        chosen_mode = self.select_mode(relax_result["phi_updated"], args)
+    def _standalone_refresh_args(self, args):
+        if args.standalone_refresh_interval <= 0:
+            return None
+        return self._copy_args(
+            args,
+            steps=args.standalone_refresh_steps,
+            cb_topk=args.standalone_refresh_cb_topk,
+            metric_rank=args.standalone_refresh_metric_rank,
+            noise_scale=args.standalone_refresh_noise_scale,
+        )
 
-        def run_standalone():
-            refresh_args = None
-            if args.standalone_refresh_interval > 0:
-                refresh_args = self._copy_args(
-                    args,
-                    steps=args.standalone_refresh_steps,
-                    cb_topk=args.standalone_refresh_cb_topk,
-                    metric_rank=args.standalone_refresh_metric_rank,
-                    noise_scale=args.standalone_refresh_noise_scale,
-                )
-            text, token_ids, standalone_meta = self.standalone_generate(
-                ctx.prompt_ids,
-                relax_result["m_star"],
+    @staticmethod
+    def _fill_standalone_meta(meta: dict[str, object], token_ids: list[int], standalone_meta: dict) -> None:
+        meta["standalone_token_ids"] = token_ids
+        meta["standalone_refresh_interval"] = standalone_meta["refresh_interval"]
+        meta["standalone_refresh_count"] = standalone_meta["refresh_count"]
+        meta["standalone_refresh_steps"] = standalone_meta["refresh_steps"]
+        meta["standalone_refresh_time_s"] = standalone_meta["refresh_time_s"]
+        meta["standalone_refresh_cos_mean"] = standalone_meta["refresh_cos_mean"]
+        meta["standalone_refresh_phi_norm"] = standalone_meta["refresh_phi_norm"]
+        meta["standalone_curvature_risk"] = standalone_meta["curvature_risk_score"]
+        meta["standalone_chosen_risk_mean"] = standalone_meta["chosen_risk_mean"]
+        meta["standalone_chosen_suppression_mean"] = standalone_meta["chosen_suppression_mean"]
+        meta["standalone_suppression_hits"] = standalone_meta["suppression_hits"]
+        if standalone_meta.get("async_refresh"):
+            meta["standalone_refresh_staleness_max"] = standalone_meta["refresh_staleness_max"]
+            meta["standalone_refresh_staleness_mean"] = standalone_meta["refresh_staleness_mean"]
+            meta["standalone_refresh_wait_s"] = standalone_meta["refresh_wait_s"]
+        if "draft_tokens" in standalone_meta:
+            meta["standalone_draft_tokens"] = standalone_meta["draft_tokens"]
+            meta["standalone_draft_rounds"] = standalone_meta["draft_rounds"]
+            meta["standalone_draft_accepted"] = standalone_meta["draft_accepted"]
+            meta["standalone_draft_acceptance_rate"] = standalone_meta["draft_acceptance_rate"]
+
+    def decode_outputs_batch(self, ctxs: list[PromptContext], relax_results: list[dict], args):
+        """Batched :meth:`decode_outputs`: standalone rows share one lockstep decode."""
+        decoded: list[tuple[str, dict[str, str], dict[str, object]] | None] = [None] * len(ctxs)
+        standalone_rows: list[int] = []
+        for row, (ctx, relax_result) in enumerate(zip(ctxs, relax_results)):
+            if (
+                self.select_mode(relax_result["phi_updated"], args) == "standalone"
+                and int(getattr(args, "standalone_draft_tokens", 0)) <= 0
+                and not getattr(args, "standalone_async_refresh", False)
+            ):
+                standalone_rows.append(row)
+            else:
+                decoded[row] = self.decode_outputs(ctx, relax_result, args)
+        if standalone_rows:
+            generated = self.standalone_generate_batch(
+                [ctxs[row].prompt_ids for row in standalone_rows],
+                torch.stack([relax_results[row]["m_star"] for row in standalone_rows], dim=0),
                 max_tok=args.tokens,
                 temperature=args.temperature,
                 top_k=args.top_k,
                 repeat_penalty=args.repeat_penalty,
                 refresh_interval=args.standalone_refresh_interval,
-                refresh_args=refresh_args,
-                refresh_init_layer=ctx.best_layer,
-                refresh_phi=relax_result["phi_updated"],
+                refresh_args=self._standalone_refresh_args(args),
+                refresh_init_layer=[ctxs[row].best_layer for row in standalone_rows],
+                refresh_phi=torch.stack([relax_results[row]["phi_updated"] for row in standalone_rows], dim=0),
             )
+            for row, (text, token_ids, standalone_meta) in zip(standalone_rows, generated):
+                meta: dict[str, object] = {}
+                self._fill_standalone_meta(meta, token_ids, standalone_meta)
+                decoded[row] = ("standalone", {"standalone": ctxs[row].prompt + text}, meta)
+        return decoded
+
+    def decode_outputs(self, ctx: PromptContext, relax_result: dict, args):
+        outputs: dict[str, str] = {}
+        meta: dict[str, object] = {}
+        chosen_mode = self.select_mode(relax_result["phi_updated"], args)
+
+        def run_standalone():
+            refresh_args = self._standalone_refresh_args(args)
+            draft_tokens = int(getattr(args, "standalone_draft_tokens", 0))
+            if draft_tokens > 0 and refresh_args is not None:
+                text, token_ids, standalone_meta = self.speculative_generate(
+                    ctx.prompt_ids,
+                    relax_result["m_star"],
+                    max_tok=args.tokens,
+                    temperature=args.temperature,
+                    top_k=args.top_k,
+                    repeat_penalty=args.repeat_penalty,
+                    refresh_args=refresh_args,
+                    refresh_init_layer=ctx.best_layer,
+                    refresh_phi=relax_result["phi_updated"],
+                    draft_tokens=draft_tokens,
+                    risk_margin=float(getattr(args, "standalone_draft_risk_margin", 0.0)),
+                )
+            else:
+                text, token_ids, standalone_meta = self.standalone_generate(
+                    ctx.prompt_ids,
+                    relax_result["m_star"],
+                    max_tok=args.tokens,
+                    temperature=args.temperature,
+                    top_k=args.top_k,
+                    repeat_penalty=args.repeat_penalty,
+                    refresh_interval=args.standalone_refresh_interval,
+                    refresh_args=refresh_args,
+                    refresh_init_layer=ctx.best_layer,
+                    refresh_phi=relax_result["phi_updated"],
+                    async_refresh=bool(getattr(args, "standalone_async_refresh", False)),
+                    max_staleness=int(getattr(args, "standalone_max_staleness", 1)),
+                )
             outputs["standalone"] = ctx.prompt + text
-            meta["standalone_token_ids"] = token_ids
-            meta["standalone_refresh_interval"] = standalone_meta["refresh_interval"]
-            meta["standalone_refresh_count"] = standalone_meta["refresh_count"]
-            meta["standalone_refresh_steps"] = standalone_meta["refresh_steps"]
-            meta["standalone_refresh_time_s"] = standalone_meta["refresh_time_s"]
-            meta["standalone_refresh_cos_mean"] = standalone_meta["refresh_cos_mean"]
-            meta["standalone_refresh_phi_norm"] = standalone_meta["refresh_phi_norm"]
-            meta["standalone_curvature_risk"] = standalone_meta["curvature_risk_score"]
-            meta["standalone_chosen_risk_mean"] = standalone_meta["chosen_risk_mean"]
-            meta["standalone_chosen_suppression_mean"] = standalone_meta["chosen_suppression_mean"]
-            meta["standalone_suppression_hits"] = standalone_meta["suppression_hits"]
+            self._fill_standalone_meta(meta, token_ids, standalone_meta)
 
         def run_clarus_lm():
             gen = self._clm_generator
@@ -1823,6 +3783,7 @@ def main():
     ap.add_argument("--lambda-var", dest="lambda_var", type=float, default=0.25)
     ap.add_argument("--noise-scale", type=float, default=0.3)
     ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--relax-solver", dest="solver", default="euler", choices=list(RELAX_SOLVERS))
     ap.add_argument("--ce-strength", type=float, default=0.3)
     ap.add_argument(
         "--decode-mode",
@@ -1841,6 +3802,18 @@ def main():
     ap.add_argument("--standalone-refresh-cb-topk", type=int, default=128)
     ap.add_argument("--standalone-refresh-metric-rank", type=int, default=0)
     ap.add_argument("--standalone-refresh-noise-scale", type=float, default=0.0)
+    ap.add_argument("--standalone-draft-tokens", type=int, default=0,
+                    help="speculative decoding: draft this many tokens per refresh (0 = off)")
+    ap.add_argument("--standalone-draft-risk-margin", type=float, default=0.0)
+    ap.add_argument("--standalone-async-refresh", action="store_true",
+                    help="run refresh relax on a worker thread while sampling continues")
+    ap.add_argument("--standalone-max-staleness", type=int, default=1)
+    ap.add_argument("--pq-cache-size", type=int, default=2048,
+                    help="reconstructed PQ token rows kept in the LRU cache (0 = off)")
+    ap.add_argument("--pq-lut-bits", type=int, default=None, choices=[8],
+                    help="quantize the PQ scoring lookup table (PQ-only artifacts)")
+    ap.add_argument("--mips-nprobe", type=int, default=None,
+                    help="IVF lists scanned per vocab query when the artifact has a MIPS index (0 = exact)")
     ap.add_argument("--microsleep-every", type=int, default=0)
     ap.add_argument("--microsleep-replay-capacity", type=int, default=16)
     ap.add_argument("--microsleep-guard-prompts", nargs="*", default=None)
@@ -1862,11 +3835,19 @@ def main():
         default=0.15,
         help="Legacy sequential residual argument retained for CLI compatibility.",
     )
+    ap.add_argument("--profile-trace", default=None, help="write a Chrome trace of engine spans here")
     args = ap.parse_args()
+    if args.profile_trace:
+        PROFILER.enable()
     if args.compare_gpt2:
         raise RuntimeError("teacher/reference comparison is disabled in runtime-only mode")
 
-    eng = CEEngine(args.engine, device=args.device, backend=args.backend)
+    eng = CEEngine(
+        args.engine,
+        device=args.device,
+        backend=args.backend,
+        pq_cache_size=int(getattr(args, "pq_cache_size", 2048)),
+    )
     if eng.model is not None or eng.model_source != "runtime":
         raise RuntimeError("runtime-only execution requires a clone-free runtime artifact")
 
@@ -1874,6 +3855,10 @@ def main():
     if clm_ckpt:
         eng.attach_clarus_lm(clm_ckpt, device=args.device)
         safe_print(f"  clarus_lm attached from {clm_ckpt}")
+    if args.mips_nprobe is not None:
+        eng.mips_nprobe = int(args.mips_nprobe)
+    if args.pq_lut_bits is not None:
+        eng.pq_lut_bits = int(args.pq_lut_bits)
 
     mem = eng.memory_usage()
     prompts = build_prompt_list(args)
@@ -2103,6 +4088,11 @@ def main():
     with open(result_path, "w", encoding="utf-8") as f:
         json.dump(payload, f, indent=2, ensure_ascii=False)
     safe_print(f"\n  Results -> {result_path}")
+    if args.profile_trace:
+        PROFILER.export_chrome_trace(args.profile_trace)
+        safe_print(PROFILER.report())
+        safe_print(f"  Trace -> {args.profile_trace}")
+    eng.close()
 
 
 if __name__ == "__main__":
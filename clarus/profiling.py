@@ -0,0 +1,300 @@
+"""Low-overhead instrumentation: named spans, counters and histograms.
+
+Disabled by default; every hook then costs one attribute check. Enable with
+`CLARUS_PROFILE=1` in the environment or at runtime:
+
+    from clarus.profiling import PROFILER
+    PROFILER.enable()
+    ... run engine / sleep ...
+    print(PROFILER.report())
+    PROFILER.export_chrome_trace("trace.json")   # chrome://tracing / Perfetto
+
+Spans measure host wall time. CUDA kernels run asynchronously, so a span
+around GPU work only covers the launches unless the profiler synchronizes:
+`PROFILER.sync_cuda = True` (or `CLARUS_PROFILE_SYNC=1`) calls
+`torch.cuda.synchronize()` at span entry and exit, which gives true device
+time at the cost of serializing the stream.
+
+Memory stays bounded on long runs: each histogram keeps exact count / total /
+max plus a fixed-size uniform reservoir for the percentiles, and raw span
+events stop at `max_events`.
+
+Instrumented code uses the module-level helpers:
+
+    with span("engine.relax", steps=n):
+        ...
+    count("relax.steps", n)
+    observe("generate.token_s", dt)
+
+    @profiled("ce_ops.relax_packed")
+    def relax_packed(...): ...
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext
+
+_NULL_SPAN = nullcontext()
+
+
+def _cuda_sync() -> None:
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "args", "start")
+
+    def __init__(self, profiler: "Profiler", name: str, args: dict):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        if self.profiler.sync_cuda:
+            _cuda_sync()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler.sync_cuda:
+            _cuda_sync()
+        self.profiler._record_span(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class _Histogram:
+    """Exact count / total / max plus a uniform reservoir of at most `capacity` values."""
+
+    __slots__ = ("capacity", "count", "total", "max", "samples", "_rng")
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self.count = 0
+        self.total = 0.0
+        self.max = -math.inf
+        self.samples: list[float] = []
+        self._rng = random.Random(0)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if len(self.samples) < self.capacity:
+            self.samples.append(value)
+        else:
+            slot = self._rng.randrange(self.count)
+            if slot < self.capacity:
+                self.samples[slot] = value
+
+
+class Profiler:
+    """Collects span timings, counters and value histograms.
+
+    Span durations also feed a histogram under the span name, so `report()`
+    gives count / total / mean / p50 / p95 / max per phase. Percentiles come
+    from a reservoir of `max_samples` values per name; the other fields are
+    exact. Raw span events are kept (up to `max_events`) for Chrome trace
+    export.
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = False,
+        max_events: int = 200_000,
+        max_samples: int = 4096,
+        sync_cuda: bool = False,
+    ):
+        self.enabled = bool(enabled)
+        self.max_events = int(max_events)
+        self.max_samples = int(max_samples)
+        self.sync_cuda = bool(sync_cuda)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._events: list[tuple[str, float, float, int, dict]] = []
+        self._dropped = 0
+        self.counters: dict[str, float] = {}
+        self.histograms: dict[str, _Histogram] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._origin = time.perf_counter()
+            self._events.clear()
+            self._dropped = 0
+            self.counters.clear()
+            self.histograms.clear()
+
+    def span(self, name: str, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def count(self, name: str, value: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._histogram(name).add(float(value))
+
+    def _histogram(self, name: str) -> _Histogram:
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = _Histogram(self.max_samples)
+        return hist
+
+    def _record_span(self, name: str, start: float, end: float, args: dict) -> None:
+        with self._lock:
+            self._histogram(name).add(end - start)
+            if len(self._events) < self.max_events:
+                self._events.append((name, start, end, threading.get_ident(), args))
+            else:
+                self._dropped += 1
+
+    @staticmethod
+    def _summarize(count: int, total: float, peak: float, samples: list[float]) -> dict[str, float]:
+        ordered = sorted(samples)
+        n = len(ordered)
+
+        def pct(q: float) -> float:
+            return ordered[min(n - 1, max(0, math.ceil(q * n) - 1))]
+
+        return {
+            "count": count,
+            "total": total,
+            "mean": total / count,
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "max": peak,
+        }
+
+    def summary(self) -> dict:
+        with self._lock:
+            hist = {
+                name: (h.count, h.total, h.max, list(h.samples))
+                for name, h in self.histograms.items() if h.count
+            }
+            counters = dict(self.counters)
+            dropped = self._dropped
+        return {
+            "histograms": {name: self._summarize(*row) for name, row in sorted(hist.items())},
+            "counters": dict(sorted(counters.items())),
+            "dropped_events": dropped,
+        }
+
+    def report(self) -> str:
+        data = self.summary()
+        lines = [f"{'name':<36} {'count':>7} {'total':>10} {'mean':>10} {'p95':>10} {'max':>10}"]
+        for name, row in data["histograms"].items():
+            lines.append(
+                f"{name:<36} {row['count']:>7d} {row['total']:>10.4f} {row['mean']:>10.6f} "
+                f"{row['p95']:>10.6f} {row['max']:>10.6f}"
+            )
+        for name, value in data["counters"].items():
+            lines.append(f"{name:<36} {value:>7g}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict:
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+            counters = dict(self.counters)
+            origin = self._origin
+        trace = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": (start - origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": {key: _json_safe(value) for key, value in args.items()},
+            }
+            for name, start, end, tid, args in events
+        ]
+        if counters:
+            trace.append({
+                "name": "counters",
+                "ph": "C",
+                "ts": (time.perf_counter() - origin) * 1e6,
+                "pid": pid,
+                "args": counters,
+            })
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.chrome_trace(), fh)
+
+    def export_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.summary(), fh, indent=2)
+
+
+def _json_safe(value):
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    return repr(value)
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+PROFILER = Profiler(enabled=_env_flag("CLARUS_PROFILE"), sync_cuda=_env_flag("CLARUS_PROFILE_SYNC"))
+
+
+def span(name: str, **args):
+    if not PROFILER.enabled:
+        return _NULL_SPAN
+    return _Span(PROFILER, name, args)
+
+
+def count(name: str, value: float = 1) -> None:
+    if PROFILER.enabled:
+        PROFILER.count(name, value)
+
+
+def observe(name: str, value: float) -> None:
+    if PROFILER.enabled:
+        PROFILER.observe(name, value)
+
+
+def profiled(name: str):
+    """Decorator form of `span`; the enabled check happens per call."""
+
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not PROFILER.enabled:
+                return fn(*args, **kwargs)
+            with _Span(PROFILER, name, {}):
+                return fn(*args, **kwargs)
+
+        return inner
+
+    return wrap
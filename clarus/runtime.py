@@ -10,6 +10,7 @@ Concept layout from the refactor plan:
 - `BrainRuntime`: sparse lifecycle + mode switching + snapshot continuity
 """
 
+import math
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Dict
@@ -49,6 +50,27 @@ try:
     _HAS_RUST_KERNEL = True
 except ImportError:
     _HAS_RUST_KERNEL = False
+try:
+    from clarus._rust import nn_brain_step_inplace as _rust_brain_step_inplace
+except ImportError:
+    _rust_brain_step_inplace = None
+
+# State tensors the Rust cell step reads and writes, with their kernel dtypes.
+_RUST_STATE_FIELDS = (
+    ("activation", torch.float32),
+    ("refractory", torch.float32),
+    ("memory_trace", torch.float32),
+    ("adaptation", torch.float32),
+    ("stp_u", torch.float32),
+    ("stp_x", torch.float32),
+    ("bitfield", torch.uint8),
+)
+
+
+def _host_array(tensor: torch.Tensor, dtype: torch.dtype) -> np.ndarray:
+    """NumPy view of `tensor` on the host; copies only when device/dtype/layout differ."""
+    return tensor.detach().to(device="cpu", dtype=dtype).contiguous().numpy()
+
 
 _MODE_TO_INT = {
     "WAKE": 0,
@@ -104,6 +126,9 @@ class BrainRuntimeConfig:
     wake_threshold: float = 0.18
     memory_capacity: int = 32
     memory_topk: int = 4
+    # Hippocampus LSH recall (0 bits = exact scan); see HippocampusMemory.
+    memory_ann_bits: int = 0
+    memory_ann_tables: int = 4
     noise_sigma: float = NOISE_SIGMA
     dale_law: bool = True
     axon_delay: bool = True
@@ -175,6 +200,150 @@ class BrainRuntimeConfig:
         }[mode]
 
 
+def _next_mode(mode: RuntimeMode, sleep_pressure: float, external_norm: float, wake_threshold: float) -> RuntimeMode:
+    if mode is RuntimeMode.WAKE:
+        if sleep_pressure > 1.0 and external_norm < wake_threshold:
+            return RuntimeMode.NREM
+        return RuntimeMode.WAKE
+    if mode is RuntimeMode.NREM:
+        if external_norm > wake_threshold * 1.5:
+            return RuntimeMode.WAKE
+        if sleep_pressure < 0.45:
+            return RuntimeMode.REM
+        return RuntimeMode.NREM
+    if external_norm > wake_threshold or sleep_pressure < 0.15:
+        return RuntimeMode.WAKE
+    return RuntimeMode.REM
+
+
+def _f1_budget(config: BrainRuntimeConfig, mode: RuntimeMode, active_ratio_ema: float) -> int:
+    if not config.f1_self_measure:
+        return config.energy_budget(mode)
+    beta = config.f1_pull_strength
+    r_eff = beta * ACTIVE_RATIO + (1.0 - beta) * active_ratio_ema
+    r_eff = min(max(r_eff, config.f1_min_ratio), config.f1_max_ratio)
+    base = max(1, int(round(config.dim * r_eff)))
+    if mode is RuntimeMode.NREM:
+        return max(1, int(round(base * 0.5)))
+    if mode is RuntimeMode.REM:
+        return max(1, int(round(base * 0.75)))
+    return base
+
+
+def _advance_sleep_pressure(mode: RuntimeMode, sleep_pressure: float) -> float:
+    if mode is RuntimeMode.WAKE:
+        sleep_pressure += (SLEEP_PRESSURE_MAX - sleep_pressure) * (1.0 / TAU_W_STEPS)
+    elif mode is RuntimeMode.NREM:
+        sleep_pressure -= sleep_pressure * (1.0 / TAU_S_STEPS)
+    else:
+        sleep_pressure -= sleep_pressure * (1.0 / TAU_S_STEPS) * REM_TAU_FACTOR
+    return float(max(0.0, min(sleep_pressure, SLEEP_PRESSURE_MAX)))
+
+
+def _circadian_value(phase: float) -> float:
+    import math as _math
+    return CIRCADIAN_BASE + CIRCADIAN_AMP * _math.cos(2.0 * _math.pi * phase / CIRCADIAN_PERIOD)
+
+
+_NOISE_MODE_SCALE = {
+    RuntimeMode.WAKE: 1.0,
+    RuntimeMode.NREM: 0.3,
+    RuntimeMode.REM: 0.7,
+}
+
+_BRAINWAVE_BANDS = (
+    ("delta", BAND_DELTA), ("theta", BAND_THETA),
+    ("alpha", BAND_ALPHA), ("beta", BAND_BETA), ("gamma", BAND_GAMMA),
+)
+
+
+class BrainwaveEstimator:
+    """Streaming band powers of the global brainwave psi (Layer B / F.21).
+
+    Samples go into a fixed `window`-length ring. Once the ring is full only
+    the DFT bins that fall inside a band are tracked, with a sliding DFT:
+    `X_k <- (X_k - x_old + x_new) * exp(2j*pi*k/window)`, so a tick costs one
+    vectorised update over those bins. The spectrum is recomputed exactly
+    every `resync_every` pushes (default: once per window) to bound
+    round-off drift. Band sums are evaluated only in `band_powers()`; while
+    the ring is still filling that call falls back to an exact rfft over the
+    partial history. Bin k >= 1 of a full window is unaffected by the mean,
+    so the result matches the rfft of the mean-removed window.
+    """
+
+    def __init__(self, window: int = 1024, fs: float = 1000.0, resync_every: int | None = None):
+        if window < 8:
+            raise ValueError("brainwave window must hold at least 8 samples")
+        self.window = int(window)
+        self.fs = float(fs)
+        self.resync_every = int(resync_every) if resync_every is not None else self.window
+        freqs = np.arange(self.window // 2 + 1) * (self.fs / self.window)
+        masks = [(freqs >= lo) & (freqs < hi) for _, (lo, hi) in _BRAINWAVE_BANDS]
+        self._bins = np.flatnonzero(np.logical_or.reduce(masks))
+        self._band_index = [np.flatnonzero(mask[self._bins]) for mask in masks]
+        self._twiddle = np.exp(2j * np.pi * self._bins / self.window)
+        self._ring = np.zeros(self.window, dtype=np.float64)
+        self._spectrum = np.zeros(len(self._bins), dtype=np.complex128)
+        self._head = 0
+        self._count = 0
+        self._since_resync = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.window)
+
+    def reset(self) -> None:
+        self._ring.fill(0.0)
+        self._spectrum.fill(0.0)
+        self._head = 0
+        self._count = 0
+        self._since_resync = 0
+
+    def history(self) -> list[float]:
+        """Samples in the current window, oldest first."""
+        if self._count < self.window:
+            return self._ring[: self._count].tolist()
+        return np.roll(self._ring, -self._head).tolist()
+
+    def push(self, value: float) -> None:
+        value = float(value)
+        old = self._ring[self._head]
+        self._ring[self._head] = value
+        self._head = (self._head + 1) % self.window
+        self._count += 1
+        if self._count < self.window:
+            return
+        self._since_resync += 1
+        if self._count == self.window or self._since_resync >= self.resync_every:
+            self._resync()
+        else:
+            self._spectrum += value - old
+            self._spectrum *= self._twiddle
+
+    def _resync(self) -> None:
+        window = np.roll(self._ring, -self._head)
+        self._spectrum = np.fft.rfft(window)[self._bins]
+        self._since_resync = 0
+
+    def band_powers(self) -> dict[str, float]:
+        """Power per band, `sum |X_k|^2 / n`; empty below 8 samples."""
+        n = len(self)
+        if n < 8:
+            return {}
+        if n < self.window:
+            sig = self._ring[:n]
+            power = np.abs(np.fft.rfft(sig - sig.mean())) ** 2 / n
+            freqs = np.fft.rfftfreq(n, d=1.0 / self.fs)
+            return {
+                name: float(power[(freqs >= lo) & (freqs < hi)].sum())
+                for name, (lo, hi) in _BRAINWAVE_BANDS
+            }
+        power = (self._spectrum.real ** 2 + self._spectrum.imag ** 2) / n
+        return {
+            name: float(power[index].sum())
+            for (name, _), index in zip(_BRAINWAVE_BANDS, self._band_index)
+        }
+
+
 @dataclass
 class RuntimeStep:
     """High-level runtime summary returned to the Python control plane."""
@@ -214,21 +383,126 @@ class BrainRuntimeSnapshot:
 
 @dataclass
 class HippocampusMemory:
-    """Minimal fast-memory subsystem: encode, recall, replay priority."""
+    """Minimal fast-memory subsystem: encode, recall, replay priority.
+
+    Entries live in preallocated `(slots, dim)` key/value tensors that grow
+    geometrically up to `capacity`; a full store reuses the lowest-priority
+    slot in place. Priorities are kept as log-priorities relative to a global
+    decay offset, so `decay_priorities` is O(1) and recall/replay are one
+    matmul plus top-k over the occupied slots. `_seq` records insertion order
+    for eviction ties and `state_dict`.
+
+    With `ann_bits > 0`, recall over stores of at least `ann_min_size`
+    entries first shortlists slots from `ann_tables` random-hyperplane LSH
+    tables (`ann_bits`-bit buckets, maintained on every insert/evict) and
+    applies the same threshold/priority scoring to the shortlist only.
+    `recall_report` measures how often that matches the exact path.
+    """
     dim: int
     capacity: int = 32
     device: str | torch.device = "cpu"
-    _keys: list[torch.Tensor] = field(default_factory=list, init=False, repr=False)
-    _values: list[torch.Tensor] = field(default_factory=list, init=False, repr=False)
-    _priority: list[float] = field(default_factory=list, init=False, repr=False)
+    ann_bits: int = 0
+    ann_tables: int = 4
+    ann_min_size: int = 256
+    ann_seed: int = 0
+    _keys: torch.Tensor | None = field(default=None, init=False, repr=False)
+    _values: torch.Tensor | None = field(default=None, init=False, repr=False)
+    _log_priority: torch.Tensor | None = field(default=None, init=False, repr=False)
+    _seq: torch.Tensor | None = field(default=None, init=False, repr=False)
+    _size: int = field(default=0, init=False, repr=False)
+    _next_seq: int = field(default=0, init=False, repr=False)
+    _log_scale: float = field(default=0.0, init=False, repr=False)
+    _ann_planes: torch.Tensor | None = field(default=None, init=False, repr=False)
+    _ann_codes: torch.Tensor | None = field(default=None, init=False, repr=False)
+    _ann_buckets: list[dict[int, set[int]]] = field(default_factory=list, init=False, repr=False)
 
     def __post_init__(self) -> None:
         self.dim = int(self.dim)
         self.capacity = max(1, int(self.capacity))
         self.device = torch.device(self.device)
+        self.ann_bits = max(0, min(int(self.ann_bits), 62))
+        self.ann_tables = max(1, int(self.ann_tables))
+        if self.ann_bits:
+            gen = torch.Generator(device="cpu")
+            gen.manual_seed(int(self.ann_seed))
+            planes = torch.randn((self.ann_tables * self.ann_bits, self.dim), generator=gen)
+            self._ann_planes = planes.to(self.device)
+            self._ann_buckets = [{} for _ in range(self.ann_tables)]
 
     def __len__(self) -> int:
-        return len(self._priority)
+        return self._size
+
+    @property
+    def _priority(self) -> list[float]:
+        """Current priorities in insertion order."""
+        if self._size == 0:
+            return []
+        order = torch.argsort(self._seq[: self._size])
+        return self._current_priority()[order].tolist()
+
+    def _current_priority(self) -> torch.Tensor:
+        return torch.exp(self._log_priority[: self._size] + self._log_scale)
+
+    def _reserve(self, size: int) -> None:
+        allocated = 0 if self._keys is None else self._keys.shape[0]
+        if size <= allocated:
+            return
+        slots = min(self.capacity, max(size, 2 * allocated, 16))
+        keys = torch.zeros((slots, self.dim), dtype=torch.float32, device=self.device)
+        values = torch.zeros((slots, self.dim), dtype=torch.float32, device=self.device)
+        log_priority = torch.zeros(slots, dtype=torch.float64, device=self.device)
+        seq = torch.zeros(slots, dtype=torch.long, device=self.device)
+        if allocated:
+            keys[:allocated] = self._keys
+            values[:allocated] = self._values
+            log_priority[:allocated] = self._log_priority
+            seq[:allocated] = self._seq
+        self._keys, self._values, self._log_priority, self._seq = keys, values, log_priority, seq
+        if self.ann_bits:
+            codes = torch.zeros((slots, self.ann_tables), dtype=torch.long)
+            if allocated:
+                codes[:allocated] = self._ann_codes
+            self._ann_codes = codes
+
+    def _ann_hash(self, vectors: torch.Tensor) -> torch.Tensor:
+        """Bucket ids (N, ann_tables) from the signs of random projections."""
+        bits = (vectors.view(-1, self.dim).float() @ self._ann_planes.T) > 0
+        bits = bits.view(-1, self.ann_tables, self.ann_bits).long().cpu()
+        weights = torch.pow(2, torch.arange(self.ann_bits, dtype=torch.long))
+        return (bits * weights).sum(dim=2)
+
+    def _write(self, slot: int, key: torch.Tensor, value: torch.Tensor, priority: float) -> None:
+        """Store an entry in `slot`; slots below `_size` are being replaced."""
+        self._keys[slot] = key
+        self._values[slot] = value
+        self._log_priority[slot] = math.log(priority) - self._log_scale
+        self._seq[slot] = self._next_seq
+        self._next_seq += 1
+        if self.ann_bits:
+            if slot < self._size:
+                for table, code in enumerate(self._ann_codes[slot].tolist()):
+                    bucket = self._ann_buckets[table].get(code)
+                    if bucket is not None:
+                        bucket.discard(slot)
+                        if not bucket:
+                            del self._ann_buckets[table][code]
+            codes = self._ann_hash(self._keys[slot])[0]
+            self._ann_codes[slot] = codes
+            for table, code in enumerate(codes.tolist()):
+                self._ann_buckets[table].setdefault(code, set()).add(slot)
+
+    def _ann_candidates(self, cue: torch.Tensor) -> torch.Tensor:
+        slots: set[int] = set()
+        for table, code in enumerate(self._ann_hash(cue)[0].tolist()):
+            slots.update(self._ann_buckets[table].get(code, ()))
+        return torch.tensor(sorted(slots), dtype=torch.long, device=self.device)
+
+    def _eviction_slot(self) -> int:
+        """Lowest priority; the oldest entry wins ties."""
+        log_priority = self._log_priority[: self._size]
+        lowest = log_priority == log_priority.min()
+        seq = self._seq[: self._size].masked_fill(~lowest, torch.iinfo(torch.long).max)
+        return int(seq.argmin().item())
 
     def encode(
         self,
@@ -240,60 +514,133 @@ class HippocampusMemory:
         key = _normalize(key).to(self.device)
         value = key if value is None else value.detach().float().to(self.device)
         priority = float(max(priority, 1e-6))
-        if len(self._priority) >= self.capacity:
-            drop_idx = min(range(len(self._priority)), key=self._priority.__getitem__)
-            self._keys.pop(drop_idx)
-            self._values.pop(drop_idx)
-            self._priority.pop(drop_idx)
-        self._keys.append(key)
-        self._values.append(value)
-        self._priority.append(priority)
+        if self._size >= self.capacity:
+            self._write(self._eviction_slot(), key, value, priority)
+        else:
+            self._reserve(self._size + 1)
+            self._write(self._size, key, value, priority)
+            self._size += 1
 
     def decay_priorities(self, steps: int = 1) -> None:
-        """Exponential priority decay: P *= exp(-dt/tau_forget). (15_Equations D)"""
-        import math as _math
-        if not self._priority:
+        """Exponential priority decay: P *= exp(-dt/tau_forget). (15_Equations D)
+
+        Applied lazily through the shared log offset; folded into the stored
+        log-priorities once it grows large.
+        """
+        if self._size == 0:
             return
-        factor = _math.exp(-steps / FORGET_TAU)
-        self._priority = [p * factor for p in self._priority]
+        self._log_scale -= steps / FORGET_TAU
+        if abs(self._log_scale) > 1e3:
+            self._log_priority[: self._size] += self._log_scale
+            self._log_scale = 0.0
 
-    def recall(self, cue: torch.Tensor, *, topk: int = 4) -> torch.Tensor:
-        if not self._keys:
-            return torch.zeros(self.dim, device=self.device)
-        cue = _normalize(cue).to(self.device)
-        keys = torch.stack(self._keys, dim=0)
-        values = torch.stack(self._values, dim=0)
-        priority = torch.tensor(self._priority, dtype=torch.float32, device=self.device)
-        similarity = keys @ cue
+    def _recall_topk(
+        self,
+        cue: torch.Tensor,
+        topk: int,
+        *,
+        approximate: bool,
+    ) -> tuple[torch.Tensor, torch.Tensor] | None:
+        """(top scores, top slots) of the threshold/priority scoring, or None."""
+        if approximate:
+            slots = self._ann_candidates(cue)
+            if slots.numel() == 0:
+                return None
+            similarity = self._keys.index_select(0, slots) @ cue
+            log_priority = self._log_priority.index_select(0, slots)
+        else:
+            slots = None
+            similarity = self._keys[: self._size] @ cue
+            log_priority = self._log_priority[: self._size]
         above_threshold = similarity >= RECALL_SIMILARITY_THRESHOLD
         if not above_threshold.any():
-            return torch.zeros(self.dim, device=self.device)
-        score = similarity + priority.log()
+            return None
+        score = (similarity + (log_priority + self._log_scale).to(similarity.dtype))
         score = score.masked_fill(~above_threshold, float("-inf"))
         k = min(max(int(topk), 1), int(above_threshold.sum().item()))
         top_score, top_idx = torch.topk(score, k=k)
+        if slots is not None:
+            top_idx = slots.index_select(0, top_idx)
+        return top_score, top_idx
+
+    def _use_ann(self) -> bool:
+        return bool(self.ann_bits) and self._size >= self.ann_min_size
+
+    def recall(self, cue: torch.Tensor, *, topk: int = 4) -> torch.Tensor:
+        if self._size == 0:
+            return torch.zeros(self.dim, device=self.device)
+        cue = _normalize(cue).to(self.device)
+        top = self._recall_topk(cue, topk, approximate=self._use_ann())
+        if top is None:
+            return torch.zeros(self.dim, device=self.device)
+        top_score, top_idx = top
         weights = torch.softmax(top_score, dim=0)
-        return torch.sum(values[top_idx] * weights.unsqueeze(1), dim=0)
+        return weights @ self._values.index_select(0, top_idx)
+
+    def recall_report(self, cues: torch.Tensor, *, topk: int = 4) -> dict[str, float]:
+        """recall@k of the LSH shortlist against the exact scan over `cues` (Q, dim).
+
+        Queries whose exact result is empty are skipped; `empty_rate` is the
+        share of the rest for which the shortlist produced nothing.
+        """
+        if not self.ann_bits:
+            raise RuntimeError("recall_report needs an ANN-enabled memory (ann_bits > 0)")
+        hits = 0
+        total = 0
+        empty = 0
+        queries = 0
+        candidates = 0
+        for cue in cues.view(-1, self.dim):
+            cue = _normalize(cue).to(self.device)
+            exact = self._recall_topk(cue, topk, approximate=False)
+            if exact is None:
+                continue
+            queries += 1
+            candidates += int(self._ann_candidates(cue).numel())
+            approx = self._recall_topk(cue, topk, approximate=True)
+            exact_ids = set(exact[1].tolist())
+            total += len(exact_ids)
+            if approx is None:
+                empty += 1
+                continue
+            hits += len(exact_ids & set(approx[1].tolist()))
+        return {
+            "queries": queries,
+            "recall_at_k": hits / total if total else 1.0,
+            "empty_rate": empty / queries if queries else 0.0,
+            "mean_candidates": candidates / queries if queries else 0.0,
+            "size": self._size,
+        }
 
     def replay(self, mode: RuntimeMode) -> torch.Tensor:
-        if not self._keys:
+        if self._size == 0:
             return torch.zeros(self.dim, device=self.device)
-        k = 1 if mode is RuntimeMode.NREM else min(3, len(self._keys))
-        priority = torch.tensor(self._priority, dtype=torch.float32, device=self.device)
-        top_idx = torch.topk(priority, k=k).indices
-        values = torch.stack(self._values, dim=0)[top_idx]
-        weights = torch.softmax(priority[top_idx], dim=0)
-        return torch.sum(values * weights.unsqueeze(1), dim=0)
+        k = 1 if mode is RuntimeMode.NREM else min(3, self._size)
+        priority = self._current_priority().to(torch.float32)
+        top_priority, top_idx = torch.topk(priority, k=k)
+        weights = torch.softmax(top_priority, dim=0)
+        return weights @ self._values.index_select(0, top_idx)
 
     def state_dict(self) -> dict[str, object]:
-        keys = torch.stack(self._keys, dim=0).cpu() if self._keys else torch.empty((0, self.dim))
-        values = torch.stack(self._values, dim=0).cpu() if self._values else torch.empty((0, self.dim))
+        if self._size == 0:
+            keys = torch.empty((0, self.dim))
+            values = torch.empty((0, self.dim))
+            priority: list[float] = []
+        else:
+            order = torch.argsort(self._seq[: self._size])
+            keys = self._keys[: self._size][order].cpu().clone()
+            values = self._values[: self._size][order].cpu().clone()
+            priority = self._current_priority()[order].tolist()
         return {
             "dim": self.dim,
             "capacity": self.capacity,
             "keys": keys,
             "values": values,
-            "priority": list(self._priority),
+            "priority": priority,
+            "ann_bits": self.ann_bits,
+            "ann_tables": self.ann_tables,
+            "ann_min_size": self.ann_min_size,
+            "ann_seed": self.ann_seed,
         }
 
     @classmethod
@@ -303,18 +650,181 @@ class HippocampusMemory:
         *,
         device: str | torch.device = "cpu",
     ) -> "HippocampusMemory":
-        mem = cls(int(state["dim"]), capacity=int(state["capacity"]), device=device)
+        mem = cls(
+            int(state["dim"]),
+            capacity=int(state["capacity"]),
+            device=device,
+            ann_bits=int(state.get("ann_bits", 0)),
+            ann_tables=int(state.get("ann_tables", 4)),
+            ann_min_size=int(state.get("ann_min_size", 256)),
+            ann_seed=int(state.get("ann_seed", 0)),
+        )
         keys = state.get("keys", torch.empty((0, mem.dim)))
         values = state.get("values", torch.empty((0, mem.dim)))
         priority = state.get("priority", [])
         if isinstance(keys, torch.Tensor) and isinstance(values, torch.Tensor):
-            for idx, score in enumerate(priority):
-                mem._keys.append(keys[idx].to(mem.device).float())
-                mem._values.append(values[idx].to(mem.device).float())
-                mem._priority.append(float(score))
+            count = min(len(priority), mem.capacity)
+            mem._reserve(count)
+            for idx in range(count):
+                mem._write(
+                    idx,
+                    keys[idx].to(mem.device).float(),
+                    values[idx].to(mem.device).float(),
+                    max(float(priority[idx]), 1e-300),
+                )
+            mem._size = count
         return mem
 
 
+# Cell math shared by `BrainRuntime` (one brain, `(d,)` tensors) and
+# `BrainRuntimePool` (`(N, d)` tensors). Per-mode coefficients are floats for
+# one brain or `(N, 1)` columns for a pool; both broadcast over the last dim.
+
+
+def _mode_coefficients(config: BrainRuntimeConfig, mode: RuntimeMode) -> dict[str, float]:
+    return {
+        "replay_mix": config.replay_mix(mode),
+        "activation_keep": 1.0 - config.activation_decay(mode),
+        "activation_gain": config.activation_gain(mode),
+        "refractory_keep": 1.0 - config.refractory_decay(mode),
+        "refractory_gain": config.refractory_gain(mode),
+        "noise_scale": config.noise_sigma * _NOISE_MODE_SCALE[mode],
+    }
+
+
+def _step_noise(step: int, dim: int, device: torch.device) -> torch.Tensor:
+    """Unit cell noise for tick `step` (15_Equations A.2), seeded for reproducibility."""
+    gen = torch.Generator(device=device)
+    gen.manual_seed(step * 31337 + 7)
+    return torch.randn((dim,), generator=gen, device=device, dtype=torch.float32)
+
+
+def _stp_update(
+    stp_u: torch.Tensor,
+    stp_x: torch.Tensor,
+    spike: torch.Tensor,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Short-term facilitation / depression (Eq J.19--J.20)."""
+    new_u = stp_u + (-STP_TAU_FAC_INV * stp_u + STP_U_BASE * (1.0 - stp_u) * spike)
+    new_x = stp_x + (STP_TAU_REC * (1.0 - stp_x) - stp_u * stp_x * spike)
+    return new_u.clamp(0.0, 1.0), new_x.clamp(0.0, 1.0)
+
+
+def _cell_update(
+    config: BrainRuntimeConfig,
+    coeffs: dict,
+    *,
+    activation: torch.Tensor,
+    refractory: torch.Tensor,
+    memory_trace: torch.Tensor,
+    adaptation: torch.Tensor,
+    bitfield: torch.Tensor,
+    goal: torch.Tensor,
+    recurrent: torch.Tensor,
+    external: torch.Tensor,
+    replay: torch.Tensor,
+    noise: torch.Tensor,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """One cell tick (Eq A.1--A.7); returns new (activation, refractory, memory_trace, adaptation, bitfield)."""
+    drive = (
+        recurrent
+        + config.external_gain * external
+        + config.goal_gain * goal
+        + coeffs["replay_mix"] * replay
+        - config.refractory_scale * refractory
+        - ADAPTATION_COUPLING * adaptation
+        + coeffs["noise_scale"] * noise
+    )
+    new_activation = (
+        coeffs["activation_keep"] * activation + coeffs["activation_gain"] * torch.tanh(drive)
+    ).clamp(-1.0, 1.0)
+    new_refractory = (
+        coeffs["refractory_keep"] * refractory + coeffs["refractory_gain"] * new_activation.square()
+    )
+    new_trace = (1.0 - MEMORY_TRACE_DECAY) * memory_trace + MEMORY_TRACE_DECAY * new_activation
+    new_adaptation = (
+        (1.0 - ADAPTATION_DECAY) * adaptation + ADAPTATION_DECAY * new_activation.square()
+    ).clamp(0.0, ADAPTATION_CLAMP)
+    new_bitfield = bitfield.clone()
+    new_bitfield[new_activation >= config.bit_upper_threshold] = 1
+    new_bitfield[new_activation <= config.bit_lower_threshold] = 0
+    return new_activation, new_refractory, new_trace, new_adaptation, new_bitfield
+
+
+def _cell_salience(
+    activation: torch.Tensor,
+    external: torch.Tensor,
+    replay: torch.Tensor,
+    goal: torch.Tensor,
+    refractory: torch.Tensor,
+) -> torch.Tensor:
+    """Module salience for active selection."""
+    return (
+        activation.abs()
+        + 0.35 * external.abs()
+        + 0.25 * replay.abs()
+        + 0.20 * goal.abs()
+        - 0.15 * refractory
+    )
+
+
+def _cell_energy(
+    activation: torch.Tensor,
+    recurrent: torch.Tensor,
+    refractory: torch.Tensor,
+    memory_trace: torch.Tensor,
+    adaptation: torch.Tensor,
+    replay: torch.Tensor,
+) -> torch.Tensor:
+    """Per-brain energy, reduced over the last dim."""
+    coupling = 0.5 * (activation * recurrent).sum(dim=-1).abs()
+    local = (
+        refractory.mean(dim=-1)
+        + 0.25 * memory_trace.abs().mean(dim=-1)
+        + 0.10 * adaptation.abs().mean(dim=-1)
+    )
+    return coupling + local + 0.1 * replay.abs().mean(dim=-1)
+
+
+def _select_active_rows(salience: torch.Tensor, budgets: list[int], threshold: float) -> torch.Tensor:
+    """Top-`budgets[i]` eligible modules of each row of `salience` (N, d)."""
+    mask = torch.zeros_like(salience, dtype=torch.bool)
+    eligible = salience >= threshold
+    counts = eligible.sum(dim=1).tolist()
+    keep = [
+        max(0, min(int(budget), salience.shape[1], int(count)))
+        for budget, count in zip(budgets, counts)
+    ]
+    k_max = max(keep)
+    if k_max == 0:
+        return mask
+    scored = salience.masked_fill(~eligible, float("-inf"))
+    _, idx = torch.topk(scored, k=k_max, dim=1)
+    rank = torch.arange(k_max, device=salience.device).unsqueeze(0)
+    take = rank < torch.tensor(keep, device=salience.device).unsqueeze(1)
+    mask.scatter_(1, idx, take)
+    return mask
+
+
+def _lifecycle_update(
+    config: BrainRuntimeConfig,
+    salience: torch.Tensor,
+    active_mask: torch.Tensor,
+    inactive_steps: torch.Tensor,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """New (lifecycle codes, inactive step counts) after one tick."""
+    inactive_steps = torch.where(active_mask, torch.zeros_like(inactive_steps), inactive_steps + 1)
+    lifecycle = torch.full_like(inactive_steps, _LIFECYCLE_TO_CODE[ModuleLifecycle.IDLE])
+    lifecycle[salience < config.idle_threshold] = _LIFECYCLE_TO_CODE[ModuleLifecycle.DORMANT]
+    lifecycle[
+        (inactive_steps >= config.dormant_after)
+        & (salience < config.idle_threshold)
+    ] = _LIFECYCLE_TO_CODE[ModuleLifecycle.DORMANT]
+    lifecycle[inactive_steps >= config.sleeping_after] = _LIFECYCLE_TO_CODE[ModuleLifecycle.SLEEPING]
+    lifecycle[active_mask] = _LIFECYCLE_TO_CODE[ModuleLifecycle.ACTIVE]
+    return lifecycle, inactive_steps
+
+
 class BrainRuntime:
     """Reference runtime stack.
 
@@ -323,6 +833,13 @@ class BrainRuntime:
     - mode update: `RuntimeMode`
     - hippocampus/replay: `HippocampusMemory`
     - global summary: `RuntimeStep` and `BrainRuntimeSnapshot`
+
+    State tensors (`activation`, `refractory`, `memory_trace`, `adaptation`,
+    `stp_u`, `stp_x`, `bitfield`) are backend-dependent across `step()`: the
+    torch path and the off-CPU Rust path rebind fresh tensors each tick, while
+    the CPU Rust path keeps them as the kernel's persistent buffers and
+    updates them in place. Clone a state tensor (or take `snapshot()`) to
+    keep its value across ticks.
     """
     def __init__(
         self,
@@ -359,6 +876,8 @@ class BrainRuntime:
             dtype=self.weight.dtype,
             check_invariants=False,
         )
+        self._rust_weight = None
+        self._rust_buffers: dict[str, tuple[torch.Tensor, np.ndarray]] = {}
 
         self.activation = torch.zeros(self.config.dim, device=self.device)
         self.refractory = torch.zeros(self.config.dim, device=self.device)
@@ -406,14 +925,15 @@ class BrainRuntime:
             self._delay_buffer = None
             self._delay_idx = 0
 
-        # Brainwave history for FFT
-        self._brainwave_history: list[float] = []
-        self._brainwave_max_len = 1024
+        # Streaming brainwave band-power estimator over the last 1024 ticks
+        self._brainwave = BrainwaveEstimator(window=1024, fs=1000.0)
 
         self.hippocampus = HippocampusMemory(
             self.config.dim,
             capacity=self.config.memory_capacity,
             device=self.device,
+            ann_bits=self.config.memory_ann_bits,
+            ann_tables=self.config.memory_ann_tables,
         )
 
     def _rebuild_sparse(self) -> None:
@@ -437,26 +957,27 @@ class BrainRuntime:
             check_invariants=False,
         )
 
-    def brainwave_observable(self) -> dict[str, float]:
-        """Compute global brainwave and band powers via FFT (Layer B / F.21)."""
+    @property
+    def _brainwave_history(self) -> list[float]:
+        return self._brainwave.history()
+
+    @property
+    def _brainwave_max_len(self) -> int:
+        return self._brainwave.window
+
+    def _record_brainwave(self) -> float:
         psi = float(self.activation.abs().mean().item())
-        self._brainwave_history.append(psi)
-        if len(self._brainwave_history) > self._brainwave_max_len:
-            self._brainwave_history = self._brainwave_history[-self._brainwave_max_len:]
-        result: dict[str, float] = {"psi_global": psi}
-        if len(self._brainwave_history) < 8:
-            return result
-        sig = torch.tensor(self._brainwave_history, dtype=torch.float32)
-        fft_vals = torch.fft.rfft(sig - sig.mean())
-        power = (fft_vals.abs() ** 2) / len(sig)
-        fs = 1000.0  # 1 step = 1ms
-        freqs = torch.fft.rfftfreq(len(sig), d=1.0 / fs)
-        for name, (lo, hi) in [
-            ("delta", BAND_DELTA), ("theta", BAND_THETA),
-            ("alpha", BAND_ALPHA), ("beta", BAND_BETA), ("gamma", BAND_GAMMA),
-        ]:
-            mask = (freqs >= lo) & (freqs < hi)
-            result[name] = float(power[mask].sum().item()) if mask.any() else 0.0
+        self._brainwave.push(psi)
+        return psi
+
+    def brainwave_observable(self) -> dict[str, float]:
+        """Record psi and return it with the band powers (Layer B / F.21).
+
+        `step()` only records psi; band sums are evaluated here, on demand,
+        from the streaming estimator.
+        """
+        result: dict[str, float] = {"psi_global": self._record_brainwave()}
+        result.update(self._brainwave.band_powers())
         return result
 
     def energy_full(self) -> float:
@@ -554,17 +1075,7 @@ class BrainRuntime:
             r_eff = clip(beta * ACTIVE_RATIO + (1 - beta) * ema, lo, hi).
         Mode multipliers are preserved (1.0/0.5/0.75 for WAKE/NREM/REM).
         """
-        if not self.config.f1_self_measure:
-            return self.config.energy_budget(mode)
-        beta = self.config.f1_pull_strength
-        r_eff = beta * ACTIVE_RATIO + (1.0 - beta) * self.active_ratio_ema
-        r_eff = min(max(r_eff, self.config.f1_min_ratio), self.config.f1_max_ratio)
-        base = max(1, int(round(self.config.dim * r_eff)))
-        if mode is RuntimeMode.NREM:
-            return max(1, int(round(base * 0.5)))
-        if mode is RuntimeMode.REM:
-            return max(1, int(round(base * 0.75)))
-        return base
+        return _f1_budget(self.config, mode, self.active_ratio_ema)
 
     def _f1_update_ema(self, active_count: int) -> None:
         if not self.config.f1_self_measure:
@@ -605,95 +1116,25 @@ class BrainRuntime:
     def _matvec(self, x: torch.Tensor) -> torch.Tensor:
         return torch.sparse.mm(self.sparse_weight, x.unsqueeze(1)).squeeze(1)
 
-    def _select_active(self, salience: torch.Tensor, budget: int) -> torch.Tensor:
-        budget = max(0, min(int(budget), salience.numel()))
-        mask = torch.zeros_like(salience, dtype=torch.bool)
-        if budget == 0:
-            return mask
-        eligible = salience >= self.config.active_threshold
-        eligible_count = int(eligible.sum().item())
-        if eligible_count == 0:
-            return mask
-        budget = min(budget, eligible_count)
-        scored = salience.masked_fill(~eligible, float("-inf"))
-        _, idx = torch.topk(scored, k=budget)
-        mask[idx] = True
-        return mask
-
     def _auto_mode(self, external_norm: float) -> RuntimeMode:
-        if self.mode is RuntimeMode.WAKE:
-            if self.sleep_pressure > 1.0 and external_norm < self.config.wake_threshold:
-                return RuntimeMode.NREM
-            return RuntimeMode.WAKE
-        if self.mode is RuntimeMode.NREM:
-            if external_norm > self.config.wake_threshold * 1.5:
-                return RuntimeMode.WAKE
-            if self.sleep_pressure < 0.45:
-                return RuntimeMode.REM
-            return RuntimeMode.NREM
-        if external_norm > self.config.wake_threshold or self.sleep_pressure < 0.15:
-            return RuntimeMode.WAKE
-        return RuntimeMode.REM
+        return _next_mode(self.mode, self.sleep_pressure, external_norm, self.config.wake_threshold)
 
     def _update_sleep_state(self, mode: RuntimeMode, active_count: int, external_norm: float) -> None:
         """Borbely 2-Process model with circadian (15_Equations.md C.2)."""
-        import math as _math
         self.arousal = float(external_norm)
-        tau_w_inv = 1.0 / TAU_W_STEPS
-        tau_s_inv = 1.0 / TAU_S_STEPS
-
         # Process C: circadian modulation
         self.circadian_phase += 1.0
-        circadian = CIRCADIAN_BASE + CIRCADIAN_AMP * _math.cos(
-            2.0 * _math.pi * self.circadian_phase / CIRCADIAN_PERIOD
-        )
-
         # Process S: homeostatic pressure
-        if mode is RuntimeMode.WAKE:
-            self.sleep_pressure += (SLEEP_PRESSURE_MAX - self.sleep_pressure) * tau_w_inv
-        elif mode is RuntimeMode.NREM:
-            self.sleep_pressure -= self.sleep_pressure * tau_s_inv
+        self.sleep_pressure = _advance_sleep_pressure(mode, self.sleep_pressure)
+        if mode is RuntimeMode.NREM:
             self.nrem_cycle_count += 1
-        else:
-            self.sleep_pressure -= self.sleep_pressure * tau_s_inv * REM_TAU_FACTOR
-        self.sleep_pressure = float(max(0.0, min(self.sleep_pressure, SLEEP_PRESSURE_MAX)))
-        self._circadian_value = circadian
+        self._circadian_value = _circadian_value(self.circadian_phase)
 
     def nrem_target_length(self) -> float:
         """T_NREM(n) = T0 * alpha^n -- decreasing NREM length within a night."""
         base = TAU_S_STEPS * 2.0
         return base * (NREM_LENGTH_DECAY ** self.nrem_cycle_count)
 
-    def _update_lifecycle(self, salience: torch.Tensor, active_mask: torch.Tensor) -> None:
-        self.inactive_steps = torch.where(
-            active_mask,
-            torch.zeros_like(self.inactive_steps),
-            self.inactive_steps + 1,
-        )
-        lifecycle = torch.full_like(
-            self.lifecycle,
-            _LIFECYCLE_TO_CODE[ModuleLifecycle.IDLE],
-        )
-        lifecycle[salience < self.config.idle_threshold] = _LIFECYCLE_TO_CODE[ModuleLifecycle.DORMANT]
-        lifecycle[
-            (self.inactive_steps >= self.config.dormant_after)
-            & (salience < self.config.idle_threshold)
-        ] = _LIFECYCLE_TO_CODE[ModuleLifecycle.DORMANT]
-        lifecycle[self.inactive_steps >= self.config.sleeping_after] = _LIFECYCLE_TO_CODE[
-            ModuleLifecycle.SLEEPING
-        ]
-        lifecycle[active_mask] = _LIFECYCLE_TO_CODE[ModuleLifecycle.ACTIVE]
-        self.lifecycle = lifecycle
-
-    def _energy(self, recurrent: torch.Tensor, replay: torch.Tensor) -> float:
-        coupling = 0.5 * torch.dot(self.activation, recurrent).abs()
-        local = (self.refractory.mean()
-                 + 0.25 * self.memory_trace.abs().mean()
-                 + 0.10 * self.adaptation.abs().mean())
-        replay_term = 0.1 * replay.abs().mean()
-        total = coupling + local + replay_term
-        return float(total.item())
-
     def _use_rust(self) -> bool:
         if not _HAS_RUST_KERNEL:
             return False
@@ -703,60 +1144,102 @@ class BrainRuntime:
             return True
         return False
 
+    def _rust_weight_pack(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """CSR arrays for the Rust kernel, converted once per weight rebuild."""
+        cached = self._rust_weight
+        if (
+            cached is not None
+            and cached[0] is self.values
+            and cached[1] is self.col_idx
+            and cached[2] is self.row_ptr
+        ):
+            return cached[3]
+        pack = (
+            _host_array(self.values, torch.float32),
+            _host_array(self.col_idx, torch.int32),
+            _host_array(self.row_ptr, torch.int32),
+        )
+        self._rust_weight = (self.values, self.col_idx, self.row_ptr, pack)
+        return pack
+
+    def _rust_state_buffers(self) -> dict[str, np.ndarray]:
+        """Host arrays the Rust kernel updates in place.
+
+        On CPU these are NumPy views of the state tensors themselves, so every
+        kernel tick overwrites `self.activation` and friends in place; a caller
+        holding one of them across `step()` sees it change. A state tensor
+        replaced from outside (snapshot restore, torch step) is first copied
+        once into a private contiguous buffer, so the tensor that was handed in
+        (e.g. a snapshot's) is never written. Off CPU, pinned host staging
+        buffers are kept and filled from the device state each tick, and the
+        device state is rebound to fresh tensors afterwards.
+        """
+        on_cpu = self.device.type == "cpu"
+        arrays: dict[str, np.ndarray] = {}
+        for name, dtype in _RUST_STATE_FIELDS:
+            tensor = getattr(self, name)
+            entry = self._rust_buffers.get(name)
+            if on_cpu:
+                if entry is None or entry[0] is not tensor:
+                    host = tensor.detach().to(dtype=dtype).clone(memory_format=torch.contiguous_format)
+                    setattr(self, name, host)
+                    entry = (host, host.numpy())
+                    self._rust_buffers[name] = entry
+            else:
+                if entry is None or entry[0].shape != tensor.shape:
+                    host = torch.empty(tensor.shape, dtype=dtype, pin_memory=torch.cuda.is_available())
+                    entry = (host, host.numpy())
+                    self._rust_buffers[name] = entry
+                entry[0].copy_(tensor)
+            arrays[name] = entry[1]
+        return arrays
+
     def _step_rust(
         self,
         external: torch.Tensor,
         replay: torch.Tensor,
         mode: RuntimeMode,
     ) -> tuple[int, float]:
-        """Delegate the cell-step hot path to the Rust kernel."""
+        """Delegate the cell-step hot path to the Rust kernel.
+
+        The weight pack is converted once per rebuild and the state lives in
+        persistent host buffers (see `_rust_state_buffers`) that the kernel
+        updates in place; builds without `nn_brain_step_inplace` copy the
+        returned arrays back into the same buffers.
+        """
         budget = self.config.energy_budget(mode)
         mode_int = _MODE_TO_INT.get(mode.value, 0)
-        act_np = self.activation.detach().cpu().numpy().astype(np.float32)
-        ref_np = self.refractory.detach().cpu().numpy().astype(np.float32)
-        mem_np = self.memory_trace.detach().cpu().numpy().astype(np.float32)
-        adapt_np = self.adaptation.detach().cpu().numpy().astype(np.float32)
-        su_np = self.stp_u.detach().cpu().numpy().astype(np.float32)
-        sx_np = self.stp_x.detach().cpu().numpy().astype(np.float32)
-        bit_np = self.bitfield.detach().cpu().numpy().astype(np.uint8)
-        ext_np = external.detach().cpu().numpy().astype(np.float32)
-        goal_np = self.goal.detach().cpu().numpy().astype(np.float32)
-        replay_np = replay.detach().cpu().numpy().astype(np.float32)
-        val_np = self.values.detach().cpu().numpy().astype(np.float32)
-        col_np = self.col_idx.detach().cpu().numpy().astype(np.int32)
-        row_np = self.row_ptr.detach().cpu().numpy().astype(np.int32)
-
-        (new_act, new_ref, new_mem, new_adapt,
-         new_su, new_sx, new_bit, active_count, energy) = _rust_brain_step(
-            val_np, col_np, row_np,
-            act_np, ref_np, mem_np, adapt_np, su_np, sx_np, bit_np,
-            ext_np, goal_np, replay_np,
-            mode_int, budget,
+        values, col_idx, row_ptr = self._rust_weight_pack()
+        state = self._rust_state_buffers()
+        state_arrays = [state[name] for name, _ in _RUST_STATE_FIELDS]
+        inputs = (
+            _host_array(external, torch.float32),
+            _host_array(self.goal, torch.float32),
+            _host_array(replay, torch.float32),
         )
-        self.activation = torch.from_numpy(np.array(new_act, dtype=np.float32)).to(self.device)
-        self.refractory = torch.from_numpy(np.array(new_ref, dtype=np.float32)).to(self.device)
-        self.memory_trace = torch.from_numpy(np.array(new_mem, dtype=np.float32)).to(self.device)
-        self.adaptation = torch.from_numpy(np.array(new_adapt, dtype=np.float32)).to(self.device)
-        self.stp_u = torch.from_numpy(np.array(new_su, dtype=np.float32)).to(self.device)
-        self.stp_x = torch.from_numpy(np.array(new_sx, dtype=np.float32)).to(self.device)
-        self.bitfield = torch.from_numpy(np.array(new_bit, dtype=np.uint8)).to(self.device)
-        return int(active_count), float(energy)
 
-    def _compute_salience(
-        self,
-        activation: torch.Tensor,
-        external: torch.Tensor,
-        replay: torch.Tensor,
-        refractory: torch.Tensor,
-    ) -> torch.Tensor:
-        """Compute module salience for active selection (shared by step logic)."""
-        return (
-            activation.abs()
-            + 0.35 * external.abs()
-            + 0.25 * replay.abs()
-            + 0.20 * self.goal.abs()
-            - 0.15 * refractory
-        )
+        if _rust_brain_step_inplace is not None:
+            active_count, energy = _rust_brain_step_inplace(
+                values, col_idx, row_ptr,
+                *state_arrays,
+                *inputs,
+                mode_int, budget,
+            )
+        else:
+            outputs = _rust_brain_step(
+                values, col_idx, row_ptr,
+                *state_arrays,
+                *inputs,
+                mode_int, budget,
+            )
+            for array, new in zip(state_arrays, outputs[:7]):
+                np.copyto(array, new)
+            active_count, energy = outputs[7], outputs[8]
+
+        if self.device.type != "cpu":
+            for name, _ in _RUST_STATE_FIELDS:
+                setattr(self, name, self._rust_buffers[name][0].to(self.device, non_blocking=True))
+        return int(active_count), float(energy)
 
     def _step_torch(
         self,
@@ -769,76 +1252,46 @@ class BrainRuntime:
         Returns (salience, recurrent, energy) to avoid recomputation in step().
         """
         prev_active = self.active_mask().float()
-
-        spike = prev_active
-        stp_u = self.stp_u + (-STP_TAU_FAC_INV * self.stp_u + STP_U_BASE * (1.0 - self.stp_u) * spike)
-        stp_x = self.stp_x + (STP_TAU_REC * (1.0 - self.stp_x) - self.stp_u * self.stp_x * spike)
-        stp_u = stp_u.clamp(0.0, 1.0)
-        stp_x = stp_x.clamp(0.0, 1.0)
-
-        pre = stp_u * stp_x * self.activation * prev_active
+        stp_u, stp_x = _stp_update(self.stp_u, self.stp_x, prev_active)
 
         # Axon delay: use delayed activation for recurrent input
         if self._delay_buffer is not None:
-            delayed = self._delay_buffer[self._delay_idx % self.config.max_axon_delay]
-            pre_delayed = stp_u * stp_x * delayed * prev_active
-            recurrent = self._matvec(pre_delayed)
-            self._delay_buffer[self._delay_idx % self.config.max_axon_delay] = self.activation.detach()
+            slot = self._delay_idx % self.config.max_axon_delay
+            recurrent = self._matvec(stp_u * stp_x * self._delay_buffer[slot] * prev_active)
+            self._delay_buffer[slot] = self.activation.detach()
             self._delay_idx += 1
         else:
-            recurrent = self._matvec(pre)
-
-        adapt_force = ADAPTATION_COUPLING * self.adaptation
-
-        # Noise injection (15_Equations A.2): mode-scaled, seeded for reproducibility
-        noise_scale = {
-            RuntimeMode.WAKE: 1.0,
-            RuntimeMode.NREM: 0.3,
-            RuntimeMode.REM: 0.7,
-        }[mode]
-        gen = torch.Generator(device=self.activation.device)
-        gen.manual_seed(self.step_index * 31337 + 7)
-        noise = self.config.noise_sigma * noise_scale * torch.randn(
-            self.activation.shape, generator=gen, device=self.activation.device, dtype=self.activation.dtype
+            recurrent = self._matvec(stp_u * stp_x * self.activation * prev_active)
+
+        noise = _step_noise(self.step_index, self.config.dim, self.activation.device)
+        (
+            self.activation,
+            self.refractory,
+            self.memory_trace,
+            self.adaptation,
+            self.bitfield,
+        ) = _cell_update(
+            self.config,
+            _mode_coefficients(self.config, mode),
+            activation=self.activation,
+            refractory=self.refractory,
+            memory_trace=self.memory_trace,
+            adaptation=self.adaptation,
+            bitfield=self.bitfield,
+            goal=self.goal,
+            recurrent=recurrent,
+            external=external,
+            replay=replay,
+            noise=noise,
         )
-
-        drive = (
-            recurrent
-            + self.config.external_gain * external
-            + self.config.goal_gain * self.goal
-            + self.config.replay_mix(mode) * replay
-            - self.config.refractory_scale * self.refractory
-            - adapt_force
-            + noise
-        )
-        activation = (
-            (1.0 - self.config.activation_decay(mode)) * self.activation
-            + self.config.activation_gain(mode) * torch.tanh(drive)
-        ).clamp(-1.0, 1.0)
-        refractory = (
-            (1.0 - self.config.refractory_decay(mode)) * self.refractory
-            + self.config.refractory_gain(mode) * activation.square()
-        )
-        memory_trace = (1.0 - MEMORY_TRACE_DECAY) * self.memory_trace + MEMORY_TRACE_DECAY * activation
-        adaptation = (
-            (1.0 - ADAPTATION_DECAY) * self.adaptation + ADAPTATION_DECAY * activation.square()
-        ).clamp(0.0, ADAPTATION_CLAMP)
-
-        bitfield = self.bitfield.clone()
-        bitfield[activation >= self.config.bit_upper_threshold] = 1
-        bitfield[activation <= self.config.bit_lower_threshold] = 0
-
-        self.activation = activation
-        self.refractory = refractory
-        self.memory_trace = memory_trace
-        self.adaptation = adaptation
         self.stp_u = stp_u
         self.stp_x = stp_x
-        self.bitfield = bitfield
 
-        salience = self._compute_salience(activation, external, replay, refractory)
-        energy = self._energy(recurrent, replay)
-        return salience, recurrent, energy
+        salience = _cell_salience(self.activation, external, replay, self.goal, self.refractory)
+        energy = _cell_energy(
+            self.activation, recurrent, self.refractory, self.memory_trace, self.adaptation, replay
+        )
+        return salience, recurrent, float(energy.item())
 
     def step(
         self,
@@ -861,16 +1314,20 @@ class BrainRuntime:
 
         if self._use_rust():
             active_count, energy = self._step_rust(external, replay, mode)
-            salience = self._compute_salience(self.activation, external, replay, self.refractory)
+            salience = _cell_salience(self.activation, external, replay, self.goal, self.refractory)
         else:
             salience, _recurrent, energy = self._step_torch(external, replay, mode)
 
-        active_mask = self._select_active(salience, self._f1_effective_budget(mode))
+        active_mask = _select_active_rows(
+            salience.unsqueeze(0), [self._f1_effective_budget(mode)], self.config.active_threshold
+        )[0]
         active_count = int(active_mask.sum().item())
         self._f1_update_ema(active_count)
         self.mode = mode
         self.mode_occupancy[mode.value] = self.mode_occupancy.get(mode.value, 0) + 1
-        self._update_lifecycle(salience, active_mask)
+        self.lifecycle, self.inactive_steps = _lifecycle_update(
+            self.config, salience, active_mask, self.inactive_steps
+        )
 
         priority = float((salience[active_mask].mean().item() if active_count else salience.mean().item()) + external_norm)
         if mode is RuntimeMode.WAKE and (external_norm > NORM_EPS or self.goal.norm().item() > NORM_EPS):
@@ -881,7 +1338,7 @@ class BrainRuntime:
 
         self.hippocampus.decay_priorities()
         self._update_sleep_state(mode, active_count, external_norm)
-        self.brainwave_observable()
+        self._record_brainwave()
         self.step_index += 1
         return RuntimeStep(
             step=self.step_index,
@@ -898,16 +1355,16 @@ class BrainRuntime:
         return BrainRuntimeSnapshot(
             config=self.config,
             weight=self.weight.detach().cpu(),
-            activation=self.activation.detach().cpu(),
-            refractory=self.refractory.detach().cpu(),
-            memory_trace=self.memory_trace.detach().cpu(),
-            adaptation=self.adaptation.detach().cpu(),
-            stp_u=self.stp_u.detach().cpu(),
-            stp_x=self.stp_x.detach().cpu(),
-            bitfield=self.bitfield.detach().cpu(),
-            goal=self.goal.detach().cpu(),
-            lifecycle=self.lifecycle.detach().cpu(),
-            inactive_steps=self.inactive_steps.detach().cpu(),
+            activation=self.activation.detach().cpu().clone(),
+            refractory=self.refractory.detach().cpu().clone(),
+            memory_trace=self.memory_trace.detach().cpu().clone(),
+            adaptation=self.adaptation.detach().cpu().clone(),
+            stp_u=self.stp_u.detach().cpu().clone(),
+            stp_x=self.stp_x.detach().cpu().clone(),
+            bitfield=self.bitfield.detach().cpu().clone(),
+            goal=self.goal.detach().cpu().clone(),
+            lifecycle=self.lifecycle.detach().cpu().clone(),
+            inactive_steps=self.inactive_steps.detach().cpu().clone(),
             mode=self.mode,
             sleep_pressure=float(self.sleep_pressure),
             arousal=float(self.arousal),
@@ -955,3 +1412,324 @@ class BrainRuntime:
         if snapshot.active_ratio_ema >= 0.0:
             runtime.active_ratio_ema = float(snapshot.active_ratio_ema)
         return runtime
+
+
+class BrainRuntimePool:
+    """N independent brains sharing one weight matrix, stepped together.
+
+    Cell state (activation, refractory, memory trace, adaptation, STP,
+    bitfield, goal, lifecycle) is stored as `(N, d)` tensors, so one tick is
+    one sparse-dense matmul for the whole population; per-brain modes enter
+    as `(N, 1)` coefficient columns. Mode control, sleep pressure and the
+    hippocampus stay per brain. The cell math is the same module-level
+    helpers `BrainRuntime` runs on its torch path, so a pool restored from
+    snapshots reproduces the corresponding single runtimes under the same
+    inputs.
+    """
+
+    def __init__(
+        self,
+        weight: torch.Tensor,
+        n_brains: int,
+        *,
+        config: BrainRuntimeConfig,
+        device: str | torch.device | None = None,
+    ) -> None:
+        n_brains = int(n_brains)
+        if n_brains <= 0:
+            raise ValueError("pool needs at least one brain")
+        # The prototype owns the shared weight, its CSR form and the Dale mask.
+        self._proto = BrainRuntime(weight, config=config, backend="torch", device=device)
+        self.config = config
+        self.device = self._proto.device
+        self.n_brains = n_brains
+        dim = self.config.dim
+        shape = (n_brains, dim)
+
+        self.activation = torch.zeros(shape, device=self.device)
+        self.refractory = torch.zeros(shape, device=self.device)
+        self.memory_trace = torch.zeros(shape, device=self.device)
+        self.adaptation = torch.zeros(shape, device=self.device)
+        self.stp_u = torch.full(shape, 0.5, device=self.device)
+        self.stp_x = torch.ones(shape, device=self.device)
+        self.bitfield = torch.zeros(shape, dtype=torch.uint8, device=self.device)
+        self.goal = torch.zeros(shape, device=self.device)
+        self.lifecycle = torch.full(
+            shape,
+            _LIFECYCLE_TO_CODE[ModuleLifecycle.DORMANT],
+            dtype=torch.int64,
+            device=self.device,
+        )
+        self.inactive_steps = torch.zeros(shape, dtype=torch.int64, device=self.device)
+        if self.config.axon_delay:
+            self._delay_buffer = torch.zeros(
+                n_brains, self.config.max_axon_delay, dim, device=self.device
+            )
+        else:
+            self._delay_buffer = None
+        self._delay_idx = [0] * n_brains
+
+        self.modes = [RuntimeMode.WAKE] * n_brains
+        self.sleep_pressure = [0.0] * n_brains
+        self.arousal = [0.0] * n_brains
+        self.step_index = [0] * n_brains
+        self.circadian_phase = [0.0] * n_brains
+        self.nrem_cycle_count = [0] * n_brains
+        self.mode_occupancy = [
+            {mode.value: 0 for mode in RuntimeMode} for _ in range(n_brains)
+        ]
+        self.active_ratio_ema = [float(self.config.active_ratio)] * n_brains
+        self.hippocampus = [
+            HippocampusMemory(
+                dim,
+                capacity=self.config.memory_capacity,
+                device=self.device,
+                ann_bits=self.config.memory_ann_bits,
+                ann_tables=self.config.memory_ann_tables,
+            )
+            for _ in range(n_brains)
+        ]
+        self._brainwave = [BrainwaveEstimator(window=1024, fs=1000.0) for _ in range(n_brains)]
+
+    @property
+    def weight(self) -> torch.Tensor:
+        return self._proto.weight
+
+    def __len__(self) -> int:
+        return self.n_brains
+
+    @classmethod
+    def from_snapshots(
+        cls,
+        snapshots: list[BrainRuntimeSnapshot],
+        *,
+        device: str | torch.device | None = None,
+    ) -> "BrainRuntimePool":
+        if not snapshots:
+            raise ValueError("from_snapshots needs at least one snapshot")
+        pool = cls(snapshots[0].weight, len(snapshots), config=snapshots[0].config, device=device)
+        for idx, snapshot in enumerate(snapshots):
+            pool.restore(idx, snapshot)
+        return pool
+
+    def _matmul(self, x: torch.Tensor) -> torch.Tensor:
+        return torch.sparse.mm(self._proto.sparse_weight, x.T).T
+
+    def _mode_columns(self, modes: list[RuntimeMode]) -> dict[str, torch.Tensor]:
+        """`_mode_coefficients` for every brain, stacked into `(N, 1)` columns."""
+        rows = [_mode_coefficients(self.config, mode) for mode in modes]
+        return {
+            key: torch.tensor([row[key] for row in rows], dtype=torch.float32, device=self.device).unsqueeze(1)
+            for key in rows[0]
+        }
+
+    def _noise(self) -> torch.Tensor:
+        """Per-brain unit noise; brains at the same step index share one draw."""
+        draws: dict[int, torch.Tensor] = {}
+        for step in self.step_index:
+            if step not in draws:
+                draws[step] = _step_noise(step, self.config.dim, self.device)
+        return torch.stack([draws[step] for step in self.step_index], dim=0)
+
+    def step(
+        self,
+        *,
+        external_input: torch.Tensor | None = None,
+        cue: torch.Tensor | None = None,
+        force_mode: RuntimeMode | list[RuntimeMode | None] | None = None,
+    ) -> list[RuntimeStep]:
+        """Advance every brain one tick; inputs are `(N, d)`, modes one per brain."""
+        n, dim = self.n_brains, self.config.dim
+        external = (
+            torch.zeros((n, dim), device=self.device)
+            if external_input is None
+            else external_input.detach().float().to(self.device).view(n, dim)
+        )
+        cue = self.activation if cue is None else cue.detach().float().to(self.device).view(n, dim)
+        if force_mode is None or isinstance(force_mode, RuntimeMode):
+            force_modes = [force_mode] * n
+        else:
+            force_modes = list(force_mode)
+            if len(force_modes) != n:
+                raise ValueError("force_mode list must have one entry per brain")
+        external_norms = [float(external[idx].norm().item()) for idx in range(n)]
+        modes = [
+            forced or _next_mode(self.modes[idx], self.sleep_pressure[idx], external_norms[idx],
+                                 self.config.wake_threshold)
+            for idx, forced in enumerate(force_modes)
+        ]
+        replay_rows = []
+        for idx, mode in enumerate(modes):
+            memory = self.hippocampus[idx]
+            replay_row = memory.recall(cue[idx], topk=self.config.memory_topk)
+            if mode is not RuntimeMode.WAKE and len(memory) > 0:
+                replay_row = 0.5 * replay_row + 0.5 * memory.replay(mode)
+            replay_rows.append(replay_row)
+        replay = torch.stack(replay_rows, dim=0)
+
+        # Cell step, Eq A.1--A.7 / J.19--J.20, batched over brains.
+        prev_active = (self.lifecycle == _LIFECYCLE_TO_CODE[ModuleLifecycle.ACTIVE]).float()
+        stp_u, stp_x = _stp_update(self.stp_u, self.stp_x, prev_active)
+        if self._delay_buffer is not None:
+            rows = torch.arange(n, device=self.device)
+            slots = torch.tensor(
+                [i % self.config.max_axon_delay for i in self._delay_idx], device=self.device
+            )
+            delayed = self._delay_buffer[rows, slots]
+            recurrent = self._matmul(stp_u * stp_x * delayed * prev_active)
+            self._delay_buffer[rows, slots] = self.activation.detach()
+            self._delay_idx = [i + 1 for i in self._delay_idx]
+        else:
+            recurrent = self._matmul(stp_u * stp_x * self.activation * prev_active)
+
+        cfg = self.config
+        (
+            self.activation,
+            self.refractory,
+            self.memory_trace,
+            self.adaptation,
+            self.bitfield,
+        ) = _cell_update(
+            cfg,
+            self._mode_columns(modes),
+            activation=self.activation,
+            refractory=self.refractory,
+            memory_trace=self.memory_trace,
+            adaptation=self.adaptation,
+            bitfield=self.bitfield,
+            goal=self.goal,
+            recurrent=recurrent,
+            external=external,
+            replay=replay,
+            noise=self._noise(),
+        )
+        self.stp_u = stp_u
+        self.stp_x = stp_x
+        activation = self.activation
+        memory_trace = self.memory_trace
+
+        salience = _cell_salience(activation, external, replay, self.goal, self.refractory)
+        energy = _cell_energy(
+            activation, recurrent, self.refractory, memory_trace, self.adaptation, replay
+        ).tolist()
+
+        budgets = [_f1_budget(cfg, mode, self.active_ratio_ema[idx]) for idx, mode in enumerate(modes)]
+        active_mask = _select_active_rows(salience, budgets, cfg.active_threshold)
+        active_counts = active_mask.sum(dim=1).tolist()
+        self.lifecycle, self.inactive_steps = _lifecycle_update(cfg, salience, active_mask, self.inactive_steps)
+        lifecycle_counts = {
+            lifecycle.value: (self.lifecycle == code).sum(dim=1).tolist()
+            for code, lifecycle in _CODE_TO_LIFECYCLE.items()
+        }
+        psi = activation.abs().mean(dim=1).tolist()
+        goal_norms = self.goal.norm(dim=1).tolist()
+        replay_norms = replay.norm(dim=1).tolist()
+
+        results: list[RuntimeStep] = []
+        for idx, mode in enumerate(modes):
+            active_count = int(active_counts[idx])
+            if cfg.f1_self_measure:
+                p_emp = float(active_count) / float(dim)
+                self.active_ratio_ema[idx] = (
+                    (1.0 - cfg.f1_ema_alpha) * self.active_ratio_ema[idx] + cfg.f1_ema_alpha * p_emp
+                )
+            self.modes[idx] = mode
+            self.mode_occupancy[idx][mode.value] = self.mode_occupancy[idx].get(mode.value, 0) + 1
+
+            row_salience = salience[idx]
+            row_mask = active_mask[idx]
+            mean_salience = row_salience[row_mask].mean() if active_count else row_salience.mean()
+            priority = float(mean_salience.item() + external_norms[idx])
+            memory = self.hippocampus[idx]
+            if mode is RuntimeMode.WAKE and (external_norms[idx] > NORM_EPS or goal_norms[idx] > NORM_EPS):
+                memory.encode(activation[idx], value=memory_trace[idx], priority=priority)
+            elif mode is not RuntimeMode.WAKE and len(memory) > 0:
+                consolidated = 0.85 * activation[idx] + 0.15 * replay[idx]
+                memory.encode(consolidated, value=memory_trace[idx], priority=priority * 0.5)
+            memory.decay_priorities()
+
+            self.arousal[idx] = external_norms[idx]
+            self.circadian_phase[idx] += 1.0
+            self.sleep_pressure[idx] = _advance_sleep_pressure(mode, self.sleep_pressure[idx])
+            if mode is RuntimeMode.NREM:
+                self.nrem_cycle_count[idx] += 1
+            self._brainwave[idx].push(psi[idx])
+            self.step_index[idx] += 1
+            results.append(RuntimeStep(
+                step=self.step_index[idx],
+                mode=mode,
+                energy=float(energy[idx]),
+                active_modules=active_count,
+                replay_norm=float(replay_norms[idx]),
+                sleep_pressure=self.sleep_pressure[idx],
+                arousal=self.arousal[idx],
+                lifecycle_counts={name: int(counts[idx]) for name, counts in lifecycle_counts.items()},
+            ))
+        return results
+
+    def set_goal(self, idx: int, goal: torch.Tensor | None) -> None:
+        if goal is None:
+            self.goal[idx].zero_()
+            return
+        goal = goal.detach().float().to(self.device)
+        if goal.numel() != self.config.dim:
+            raise ValueError("goal size must match runtime dimension")
+        self.goal[idx] = goal.view(self.config.dim)
+
+    def snapshot(self, idx: int) -> BrainRuntimeSnapshot:
+        """Snapshot of brain `idx`, restorable by `BrainRuntime.from_snapshot`."""
+        return BrainRuntimeSnapshot(
+            config=self.config,
+            weight=self.weight.detach().cpu(),
+            activation=self.activation[idx].detach().cpu().clone(),
+            refractory=self.refractory[idx].detach().cpu().clone(),
+            memory_trace=self.memory_trace[idx].detach().cpu().clone(),
+            adaptation=self.adaptation[idx].detach().cpu().clone(),
+            stp_u=self.stp_u[idx].detach().cpu().clone(),
+            stp_x=self.stp_x[idx].detach().cpu().clone(),
+            bitfield=self.bitfield[idx].detach().cpu().clone(),
+            goal=self.goal[idx].detach().cpu().clone(),
+            lifecycle=self.lifecycle[idx].detach().cpu().clone(),
+            inactive_steps=self.inactive_steps[idx].detach().cpu().clone(),
+            mode=self.modes[idx],
+            sleep_pressure=float(self.sleep_pressure[idx]),
+            arousal=float(self.arousal[idx]),
+            step=self.step_index[idx],
+            hippocampus=self.hippocampus[idx].state_dict(),
+            mode_occupancy=dict(self.mode_occupancy[idx]),
+            active_ratio_ema=float(self.active_ratio_ema[idx]),
+        )
+
+    def restore(self, idx: int, snapshot: BrainRuntimeSnapshot) -> None:
+        """Load `snapshot` into slot `idx`, matching `BrainRuntime.from_snapshot`."""
+        if snapshot.config.dim != self.config.dim:
+            raise ValueError("snapshot dimension does not match the pool")
+        self.activation[idx] = snapshot.activation.to(self.device).float()
+        self.refractory[idx] = snapshot.refractory.to(self.device).float()
+        self.memory_trace[idx] = snapshot.memory_trace.to(self.device).float()
+        self.adaptation[idx] = snapshot.adaptation.to(self.device).float()
+        self.stp_u[idx] = snapshot.stp_u.to(self.device).float()
+        self.stp_x[idx] = snapshot.stp_x.to(self.device).float()
+        self.bitfield[idx] = snapshot.bitfield.to(self.device).to(torch.uint8)
+        self.goal[idx] = snapshot.goal.to(self.device).float()
+        self.lifecycle[idx] = snapshot.lifecycle.to(self.device).to(torch.int64)
+        self.inactive_steps[idx] = snapshot.inactive_steps.to(self.device).to(torch.int64)
+        if self._delay_buffer is not None:
+            self._delay_buffer[idx].zero_()
+        self._delay_idx[idx] = 0
+        self.modes[idx] = snapshot.mode
+        self.sleep_pressure[idx] = float(snapshot.sleep_pressure)
+        self.arousal[idx] = float(snapshot.arousal)
+        self.step_index[idx] = int(snapshot.step)
+        self.circadian_phase[idx] = 0.0
+        self.nrem_cycle_count[idx] = 0
+        self.hippocampus[idx] = HippocampusMemory.from_state_dict(snapshot.hippocampus, device=self.device)
+        occupancy = {mode.value: 0 for mode in RuntimeMode}
+        for key in occupancy:
+            occupancy[key] = int((snapshot.mode_occupancy or {}).get(key, 0))
+        self.mode_occupancy[idx] = occupancy
+        self.active_ratio_ema[idx] = (
+            float(snapshot.active_ratio_ema) if snapshot.active_ratio_ema >= 0.0
+            else float(self.config.active_ratio)
+        )
+        self._brainwave[idx].reset()
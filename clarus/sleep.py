@@ -16,12 +16,14 @@ import torch
 import torch.nn.functional as F
 
 try:
-    from .engine import CEEngine, DEFAULT_PROMPTS, state_partition_counts
-    from .ce_ops import pq_build_codebook
+    from .engine import CEEngine, DEFAULT_PROMPTS, TokenHistory, state_partition_counts
+    from .ce_ops import pq_build_codebook, pq_encode
+    from .profiling import PROFILER, profiled
     from .utils import safe_print
 except ImportError:
-    from clarus.engine import CEEngine, DEFAULT_PROMPTS, state_partition_counts
-    from clarus.ce_ops import pq_build_codebook
+    from clarus.engine import CEEngine, DEFAULT_PROMPTS, TokenHistory, state_partition_counts
+    from clarus.ce_ops import pq_build_codebook, pq_encode
+    from clarus.profiling import PROFILER, profiled
     from clarus.utils import safe_print
 
 
@@ -286,6 +288,7 @@ def batch_weights(batch: SleepBatch, rem_weight: float) -> torch.Tensor:
     return weights
 
 
+@profiled("sleep.fit_decoder_from_batch")
 def fit_decoder_from_batch(
     batch: SleepBatch,
     *,
@@ -316,6 +319,7 @@ def fit_decoder_from_batch(
     return state_proj, prev_proj, bias
 
 
+@profiled("sleep.fit_token_head_from_batch")
 def fit_token_head_from_batch(
     batch: SleepBatch,
     *,
@@ -375,6 +379,7 @@ def fit_token_head_from_batch(
     )
 
 
+@profiled("sleep.finetune_vocab_head_from_batch")
 def finetune_vocab_head_from_batch(
     eng: CEEngine,
     batch: SleepBatch,
@@ -632,6 +637,7 @@ def _target_distribution(
     return target_emb, top_idx.detach().cpu(), probs.detach().cpu(), soft_target
 
 
+@profiled("sleep.collect_sleep_batch")
 def collect_sleep_batch(
     eng: CEEngine,
     prompts: list[str],
@@ -715,7 +721,10 @@ def collect_sleep_batch(
                 ce_hidden = eng.ce_hidden(relax_result["m_star"]).detach()
                 phi_state = relax_result["phi_updated"].detach()
             init_layer = ctx.best_layer
-            history_ids = ids[0].tolist()
+            history_ids = TokenHistory(ids[0].tolist(), ngram=eng.repeat_ngram)
+            prompt_state = None
+            if refresh_args is not None:
+                prompt_state = eng.prompt_state_accumulator(ids, window=int(context_window))
             prev_hidden = None
             prev_prev_hidden = None
             context_anchor = ce_hidden.detach().clone()
@@ -780,6 +789,8 @@ def collect_sleep_batch(
                 if ids.shape[1] > int(context_window):
                     ids = ids[:, -int(context_window) :]
                 history_ids.append(target_id)
+                if prompt_state is not None:
+                    eng.advance_prompt_state(prompt_state, target_id)
                 if (
                     refresh_args is not None
                     and target_pos + 1 < max_stop
@@ -787,9 +798,11 @@ def collect_sleep_batch(
                 ):
                     refresh_ctx = eng.context_from_ids(
                         ids,
+                        prompt="",
                         init_layer=init_layer,
                         phi=phi_state,
                         need_teacher=False,
+                        state=prompt_state,
                     )
                     refresh_result = eng.relax_context(refresh_ctx, refresh_args)
                     ce_hidden = eng.ce_hidden(refresh_result["m_star"]).detach()
@@ -912,13 +925,21 @@ def normalize_update(matrix: torch.Tensor) -> torch.Tensor:
     return matrix / peak
 
 
-def smooth_weight_matrix(w: torch.Tensor, laplacian: torch.Tensor, eta: float) -> torch.Tensor:
-    lap = laplacian.float()
+def smooth_weight_matrix(w: torch.Tensor, laplacian, eta: float) -> torch.Tensor:
     w = w.float()
-    smoothed = w - float(eta) * (lap @ w + w @ lap) / 2.0
+    if isinstance(laplacian, torch.Tensor):
+        lap = laplacian.float()
+        lap_w = lap @ w
+        w_lap = w @ lap
+    else:
+        # Stencil operators apply L along the last dim; L is symmetric.
+        lap_w = laplacian.apply(w.T).T
+        w_lap = laplacian.apply(w)
+    smoothed = w - float(eta) * (lap_w + w_lap) / 2.0
     return 0.5 * (smoothed + smoothed.T)
 
 
+@profiled("sleep.apply_nrem_weight_update")
 def apply_nrem_weight_update(
     eng: CEEngine,
     batch: SleepBatch,
@@ -934,7 +955,7 @@ def apply_nrem_weight_update(
     if eng.active_dim_mask is None or eng.struct_dim_mask is None:
         eng.apply_state_partition(partition["active_mask"], partition["struct_mask"])
 
-    lap = eng.state_graph_laplacian().detach().cpu()
+    lap = eng.state_graph_stencil().to(device="cpu")
     delta = covariance_delta(batch, emphasize_hard=1.0)
     plastic_mask = row_topk_mask(delta, eng.active_ratio)
     update = normalize_update(delta * plastic_mask)
@@ -956,6 +977,7 @@ def apply_nrem_weight_update(
     }
 
 
+@profiled("sleep.apply_rem_weight_update")
 def apply_rem_weight_update(
     eng: CEEngine,
     batch: SleepBatch,
@@ -1001,6 +1023,7 @@ def apply_rem_weight_update(
     }
 
 
+@profiled("sleep.evaluate_guard_set")
 def evaluate_guard_set(
     eng: CEEngine,
     prompts: list[str],
@@ -1014,6 +1037,7 @@ def evaluate_guard_set(
     refresh_noise_scale: float,
     context_window: int = 64,
     seed_tokens: int = 8,
+    batch_size: int = 16,
 ) -> dict[str, float]:
     if not prompts:
         return {"top1_acc": 0.0, "top10_acc": 0.0, "top50_acc": 0.0, "curvature_risk": 0.0, "samples": 0}
@@ -1030,73 +1054,112 @@ def evaluate_guard_set(
 
     from tqdm import tqdm as _tqdm
 
-    top1 = 0
-    top10 = 0
-    top50 = 0
-    total = 0
-    curvature_risk = 0.0
-
-    for prompt in _tqdm(prompts, desc="    guard", unit="doc", ncols=80):
+    windows: list[tuple[str, torch.Tensor, int, int]] = []
+    for prompt in prompts:
         full_ids = eng.tok.encode(prompt, return_tensors="pt").to(eng.device)
         if full_ids.shape[1] <= 1:
             continue
         cursor = min(max(int(seed_tokens), 1), full_ids.shape[1] - 1)
         while cursor < full_ids.shape[1]:
-            ids = _context_slice(full_ids, cursor, context_window)
-            ctx = eng.context_from_ids(ids, prompt=prompt)
-            relax_result = eng.relax_context(ctx, ce_args)
-            ce_hidden = eng.ce_hidden(relax_result["m_star"]).detach()
-            phi_state = relax_result["phi_updated"].detach()
-            init_layer = ctx.best_layer
-            history_ids = ids[0].tolist()
-            prev_hidden = None
-            prev_prev_hidden = None
-            context_anchor = ce_hidden.detach().clone()
             max_stop = min(full_ids.shape[1], cursor + max_new_tokens)
+            windows.append((prompt, full_ids, cursor, max_stop))
+            cursor = max_stop
 
-            for target_pos in range(cursor, max_stop):
-                prev_id = int(ids[0, -1].item())
-                target_id = int(full_ids[0, target_pos].item())
-                logits, step_meta = eng.standalone_logits(
-                    ce_hidden,
-                    prev_id,
-                    temperature=1.0,
-                    history_ids=history_ids,
-                    prev_hidden=prev_hidden,
-                    prev_prev_hidden=prev_prev_hidden,
-                    context_anchor=context_anchor,
-                    return_meta=True,
-                )
-                top_ids = torch.topk(logits, min(50, logits.numel())).indices.tolist()
-                top1 += int(top_ids[0] == target_id)
-                top10 += int(target_id in top_ids[:10])
-                top50 += int(target_id in top_ids)
-                curvature_risk += float(step_meta["curvature_risk_score"])
-                total += 1
+    top1 = 0
+    top10 = 0
+    top50 = 0
+    total = 0
+    curvature_risk = 0.0
 
-                step_hidden = ce_hidden.detach().clone()
-                prev_prev_hidden = prev_hidden
-                prev_hidden = step_hidden
-                ids = torch.cat([ids, torch.tensor([[target_id]], device=eng.device)], dim=1)
+    # Windows are independent, so `batch_size` of them are teacher-forced in
+    # lockstep through standalone_logits_batch / relax_contexts.
+    batch_size = max(int(batch_size), 1)
+    chunks = [windows[idx : idx + batch_size] for idx in range(0, len(windows), batch_size)]
+    for chunk in _tqdm(chunks, desc="    guard", unit="batch", ncols=80):
+        ids_rows = [_context_slice(full_ids, cursor, context_window) for _, full_ids, cursor, _ in chunk]
+        ctxs = [eng.context_from_ids(ids, prompt=prompt) for ids, (prompt, _, _, _) in zip(ids_rows, chunk)]
+        relax_results = eng.relax_contexts(ctxs, ce_args)
+        ce_hidden = eng.ce_hidden(torch.stack([result["m_star"] for result in relax_results], dim=0)).detach()
+        phi_states = [result["phi_updated"].detach() for result in relax_results]
+        init_layers = [ctx.best_layer for ctx in ctxs]
+        histories = [TokenHistory(ids[0].tolist(), ngram=eng.repeat_ngram) for ids in ids_rows]
+        prompt_states = [
+            eng.prompt_state_accumulator(ids, window=int(context_window)) if refresh_args is not None else None
+            for ids in ids_rows
+        ]
+        targets = [
+            full_ids[0, cursor:max_stop].tolist() for _, full_ids, cursor, max_stop in chunk
+        ]
+        active = list(range(len(chunk)))
+        prev_hidden = None
+        prev_prev_hidden = None
+        context_anchor = ce_hidden.detach().clone()
+
+        offset = 0
+        while active:
+            keep = [pos for pos, row in enumerate(active) if offset < len(targets[row])]
+            if len(keep) < len(active):
+                keep_idx = torch.tensor(keep, dtype=torch.long, device=eng.device)
+                ce_hidden = ce_hidden.index_select(0, keep_idx)
+                context_anchor = context_anchor.index_select(0, keep_idx)
+                prev_hidden = None if prev_hidden is None else prev_hidden.index_select(0, keep_idx)
+                prev_prev_hidden = None if prev_prev_hidden is None else prev_prev_hidden.index_select(0, keep_idx)
+                active = [active[pos] for pos in keep]
+                if not active:
+                    break
+
+            target_ids = torch.tensor([targets[row][offset] for row in active], device=eng.device)
+            logits, step_meta = eng.standalone_logits_batch(
+                ce_hidden,
+                [int(ids_rows[row][0, -1].item()) for row in active],
+                temperature=1.0,
+                history_ids=[histories[row] for row in active],
+                prev_hidden=prev_hidden,
+                prev_prev_hidden=prev_prev_hidden,
+                context_anchor=context_anchor,
+                return_meta=True,
+            )
+            top_ids = torch.topk(logits, min(50, logits.shape[-1]), dim=-1).indices
+            match = top_ids == target_ids.unsqueeze(1)
+            top1 += int(match[:, :1].any(dim=1).sum().item())
+            top10 += int(match[:, :10].any(dim=1).sum().item())
+            top50 += int(match.any(dim=1).sum().item())
+            curvature_risk += float(step_meta["curvature_risk_score"].sum().item())
+            total += len(active)
+
+            step_hidden = ce_hidden.detach().clone()
+            prev_prev_hidden = prev_hidden
+            prev_hidden = step_hidden
+            for row in active:
+                target_id = int(targets[row][offset])
+                ids = torch.cat([ids_rows[row], torch.tensor([[target_id]], device=eng.device)], dim=1)
                 if ids.shape[1] > int(context_window):
                     ids = ids[:, -int(context_window) :]
-                history_ids.append(target_id)
-                if (
-                    refresh_args is not None
-                    and target_pos + 1 < max_stop
-                    and (target_pos - cursor + 1) % refresh_interval == 0
-                ):
-                    refresh_ctx = eng.context_from_ids(
-                        ids,
-                        init_layer=init_layer,
-                        phi=phi_state,
+                ids_rows[row] = ids
+                histories[row].append(target_id)
+                if prompt_states[row] is not None:
+                    eng.advance_prompt_state(prompt_states[row], target_id)
+            offset += 1
+            refresh_rows = [pos for pos, row in enumerate(active) if offset < len(targets[row])]
+            if refresh_args is not None and refresh_rows and offset % refresh_interval == 0:
+                refresh_ctxs = [
+                    eng.context_from_ids(
+                        ids_rows[active[pos]],
+                        prompt="",
+                        init_layer=init_layers[active[pos]],
+                        phi=phi_states[active[pos]],
                         need_teacher=False,
+                        state=prompt_states[active[pos]],
                     )
-                    refresh_result = eng.relax_context(refresh_ctx, refresh_args)
-                    ce_hidden = eng.ce_hidden(refresh_result["m_star"]).detach()
-                    phi_state = refresh_result["phi_updated"].detach()
-                    init_layer = refresh_ctx.best_layer
-            cursor = max_stop
+                    for pos in refresh_rows
+                ]
+                refresh_results = eng.relax_contexts(refresh_ctxs, refresh_args)
+                refresh_idx = torch.tensor(refresh_rows, dtype=torch.long, device=eng.device)
+                new_hidden = torch.stack([result["m_star"] for result in refresh_results], dim=0)
+                ce_hidden = ce_hidden.index_copy(0, refresh_idx, eng.ce_hidden(new_hidden).detach())
+                for pos, ctx, result in zip(refresh_rows, refresh_ctxs, refresh_results):
+                    phi_states[active[pos]] = result["phi_updated"].detach()
+                    init_layers[active[pos]] = ctx.best_layer
 
     return {
         "top1_acc": top1 / max(total, 1),
@@ -1128,6 +1191,7 @@ def should_accept_guard_update(
     )
 
 
+@profiled("sleep.run_guarded_microsleep_step")
 def run_guarded_microsleep_step(
     eng: CEEngine,
     buffer: PromptReplayBuffer,
@@ -1247,6 +1311,7 @@ def run_guarded_microsleep_step(
     }
 
 
+@profiled("sleep.maybe_refresh_pq")
 def maybe_refresh_pq(
     eng: CEEngine,
     batch: SleepBatch,
@@ -1276,26 +1341,19 @@ def maybe_refresh_pq(
         batch_size=batch_size,
         sample_size=min(sample_size, pool.shape[0]),
         seed=0,
+        encode=False,
     )
     centroids = pq["centroids"].cpu()
+    codes = pq_encode(emb, centroids, batch_size=batch_size)
 
-    codes = torch.empty((emb.shape[0], centroids.shape[0]), dtype=torch.uint8)
-    for sub_idx in range(centroids.shape[0]):
-        start = sub_idx * subdim
-        stop = start + subdim
-        dist = torch.cdist(emb[:, start:stop], centroids[sub_idx].float())
-        codes[:, sub_idx] = dist.argmin(dim=1).to(torch.uint8)
-
-    eng.pq_centroids = centroids.to(eng.device)
-    eng.pq_codes = codes.to(eng.device)
-    eng.data["pq_centroids"] = centroids
-    eng.data["pq_codes"] = codes
+    eng.apply_pq(centroids, codes)
     return {
         "pq_centroids_mb": centroids.numel() * centroids.element_size() / 1024 / 1024,
         "pq_codes_mb": codes.numel() * codes.element_size() / 1024 / 1024,
     }
 
 
+@profiled("sleep.run_sleep_cycle")
 def run_sleep_cycle(
     eng: CEEngine,
     prompts: list[str],
@@ -1769,7 +1827,10 @@ def main():
     ap.add_argument("--noise-scale", type=float, default=0.3)
     ap.add_argument("--seed", type=int, default=0)
     ap.add_argument("--device", default="cpu")
+    ap.add_argument("--profile-trace", default=None, help="write a Chrome trace of engine/sleep spans here")
     args = ap.parse_args()
+    if args.profile_trace:
+        PROFILER.enable()
 
     eng = CEEngine(args.engine, device=args.device, backend=args.backend)
 
@@ -1912,6 +1973,10 @@ def main():
         json.dump(result_payload, f, ensure_ascii=False, indent=2)
     safe_print(f"  saved_engine={out_path}")
     safe_print(f"  saved_report={result_path}")
+    if args.profile_trace:
+        PROFILER.export_chrome_trace(args.profile_trace)
+        safe_print(PROFILER.report())
+        safe_print(f"  saved_trace={args.profile_trace}")
 
 
 if __name__ == "__main__":
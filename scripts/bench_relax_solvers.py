@@ -0,0 +1,145 @@
+"""Relax solver benchmark: steps-to-tolerance and wall time per solver.
+
+Loads one or more saved runtime artifacts, builds a prompt context for each
+prompt and relaxes it with every requested solver (`euler`, `anderson`,
+`nesterov`). Noise is off by default so runs are deterministic and the final
+states can be compared against the Euler reference.
+
+Run:
+    .venv/Scripts/python.exe scripts/bench_relax_solvers.py --engine clarus/runtime.pt
+    .venv/Scripts/python.exe scripts/bench_relax_solvers.py --engine a.pt b.pt --steps 400 --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import torch
+import torch.nn.functional as F
+
+from clarus.ce_ops import RELAX_SOLVERS
+from clarus.engine import CEEngine
+
+
+PROMPTS = [
+    "인공지능의 미래는",
+    "오늘 날씨가",
+    "한국에서 가장 유명한 음식은",
+    "서울의 봄은",
+]
+
+
+def safe_print(*a, **k) -> None:
+    try:
+        print(*a, **k, flush=True)
+    except UnicodeEncodeError:
+        sys.stdout.buffer.write((" ".join(map(str, a)) + "\n").encode("utf-8", "replace"))
+
+
+def relax_args(args, solver: str) -> argparse.Namespace:
+    return argparse.Namespace(
+        dt=args.dt,
+        cb_weight=None,
+        cb_topk=args.cb_topk,
+        beta=1.0,
+        steps=args.steps,
+        backend="torch",
+        metric_rank=args.metric_rank,
+        lambda0=1.0,
+        lambda_phi=0.5,
+        lambda_var=0.25,
+        noise_scale=args.noise_scale,
+        seed=args.seed,
+        solver=solver,
+    )
+
+
+def time_relax(eng: CEEngine, ctx, ce_args, repeat: int) -> tuple[dict, list[float]]:
+    times: list[float] = []
+    result: dict = {}
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        result = eng.relax_context(ctx, ce_args)
+        times.append(time.perf_counter() - t0)
+    return result, times
+
+
+def bench_artifact(path: str, args) -> list[dict]:
+    eng = CEEngine(path, device=args.device, backend="torch")
+    rows: list[dict] = []
+    for prompt in args.prompts or PROMPTS:
+        ctx = eng.prompt_context(prompt)
+        reference = None
+        for solver in args.solvers:
+            result, times = time_relax(eng, ctx, relax_args(args, solver), args.repeat)
+            if reference is None:
+                reference = result["m_star"]
+            cos_ref = F.cosine_similarity(
+                result["m_star"].unsqueeze(0), reference.unsqueeze(0)
+            ).item()
+            hist = result["hist"]
+            rows.append({
+                "artifact": path,
+                "prompt": prompt,
+                "solver": solver,
+                "steps": int(result["steps"]),
+                "wall_ms": statistics.median(times) * 1000.0,
+                "final_E": hist["E"][-1] if hist["E"] else float("nan"),
+                "best_E": min(hist["E"]) if hist["E"] else float("nan"),
+                "final_delta": hist["delta"][-1] if hist["delta"] else float("nan"),
+                "cos_vs_first": cos_ref,
+            })
+    return rows
+
+
+def summarize(rows: list[dict], solvers: list[str]) -> None:
+    safe_print(f"{'solver':<10} {'steps':>8} {'wall_ms':>10} {'best_E':>12} {'cos':>8}")
+    for solver in solvers:
+        sel = [r for r in rows if r["solver"] == solver]
+        if not sel:
+            continue
+        safe_print(
+            f"{solver:<10} "
+            f"{statistics.mean(r['steps'] for r in sel):>8.1f} "
+            f"{statistics.mean(r['wall_ms'] for r in sel):>10.2f} "
+            f"{statistics.mean(r['best_E'] for r in sel):>12.5f} "
+            f"{statistics.mean(r['cos_vs_first'] for r in sel):>8.4f}"
+        )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--engine", nargs="+", required=True, help="runtime artifact path(s)")
+    ap.add_argument("--prompts", nargs="*", default=None)
+    ap.add_argument("--solvers", nargs="+", default=list(RELAX_SOLVERS), choices=list(RELAX_SOLVERS))
+    ap.add_argument("--steps", type=int, default=200)
+    ap.add_argument("--dt", type=float, default=0.01)
+    ap.add_argument("--cb-topk", type=int, default=128)
+    ap.add_argument("--metric-rank", type=int, default=8)
+    ap.add_argument("--noise-scale", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--device", default="cpu")
+    ap.add_argument("--json", default=None, help="optional path for per-run JSON rows")
+    args = ap.parse_args()
+
+    torch.manual_seed(args.seed)
+    rows: list[dict] = []
+    for path in args.engine:
+        safe_print(f"== {path}")
+        art_rows = bench_artifact(path, args)
+        summarize(art_rows, args.solvers)
+        rows.extend(art_rows)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(rows, fh, ensure_ascii=False, indent=2)
+        safe_print(f"wrote {len(rows)} rows to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
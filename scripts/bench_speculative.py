@@ -0,0 +1,179 @@
+"""Speculative standalone decoding vs. refreshing after every token.
+
+For each prompt and seed, decodes once with `standalone_generate`
+(`refresh_interval=1`, the quality reference) and once with
+`speculative_generate`. Reports the chosen-token curvature risk of both, the
+draft acceptance rate and the wall time, and flags prompts whose mean chosen
+risk drifts from the reference by more than `--risk-tol`.
+
+Run:
+    .venv/Scripts/python.exe scripts/bench_speculative.py --engine clarus/runtime.pt
+    .venv/Scripts/python.exe scripts/bench_speculative.py --engine clarus/runtime.pt --draft-tokens 2 4 8 --seeds 0 1 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import torch
+
+from clarus.ce_ops import RELAX_SOLVERS
+from clarus.engine import CEEngine
+
+
+PROMPTS = [
+    "인공지능의 미래는",
+    "오늘 날씨가",
+    "한국에서 가장 유명한 음식은",
+    "서울의 봄은",
+]
+
+
+def safe_print(*a, **k) -> None:
+    try:
+        print(*a, **k, flush=True)
+    except UnicodeEncodeError:
+        sys.stdout.buffer.write((" ".join(map(str, a)) + "\n").encode("utf-8", "replace"))
+
+
+def relax_args(args) -> argparse.Namespace:
+    return argparse.Namespace(
+        dt=args.dt,
+        cb_weight=None,
+        cb_topk=args.cb_topk,
+        beta=1.0,
+        steps=args.steps,
+        backend="torch",
+        metric_rank=args.metric_rank,
+        lambda0=1.0,
+        lambda_phi=0.5,
+        lambda_var=0.25,
+        noise_scale=0.0,
+        seed=0,
+        solver=args.solver,
+    )
+
+
+def timed(fn, seed: int):
+    torch.manual_seed(seed)
+    t0 = time.perf_counter()
+    _, ids, meta = fn()
+    return ids, meta, time.perf_counter() - t0
+
+
+def bench_artifact(path: str, args) -> list[dict]:
+    eng = CEEngine(path, device=args.device, backend="torch")
+    ce_args = relax_args(args)
+    rows: list[dict] = []
+    for prompt in args.prompts or PROMPTS:
+        ctx = eng.prompt_context(prompt)
+        gen_kwargs = dict(
+            max_tok=args.max_tokens,
+            temperature=args.temperature,
+            top_k=args.top_k,
+            repeat_penalty=args.repeat_penalty,
+            refresh_args=ce_args,
+            refresh_init_layer=ctx.best_layer,
+            refresh_phi=ctx.phi,
+        )
+        for seed in args.seeds:
+            base_ids, base_meta, base_s = timed(
+                lambda: eng.standalone_generate(ctx.prompt_ids, ctx.m0, refresh_interval=1, **gen_kwargs),
+                seed,
+            )
+            for k in args.draft_tokens:
+                spec_ids, spec_meta, spec_s = timed(
+                    lambda: eng.speculative_generate(
+                        ctx.prompt_ids,
+                        ctx.m0,
+                        draft_tokens=k,
+                        risk_margin=args.risk_margin,
+                        **gen_kwargs,
+                    ),
+                    seed,
+                )
+                base_risk = base_meta["chosen_risk_mean"]
+                spec_risk = spec_meta["chosen_risk_mean"]
+                rows.append({
+                    "artifact": path,
+                    "prompt": prompt,
+                    "seed": seed,
+                    "draft_tokens": k,
+                    "base_chosen_risk": base_risk,
+                    "spec_chosen_risk": spec_risk,
+                    "risk_delta": None if base_risk is None or spec_risk is None else spec_risk - base_risk,
+                    "acceptance": spec_meta["draft_acceptance_rate"],
+                    "base_tokens": len(base_ids),
+                    "spec_tokens": len(spec_ids),
+                    "base_refreshes": base_meta["refresh_count"],
+                    "spec_rounds": spec_meta["draft_rounds"],
+                    "base_ms": base_s * 1000.0,
+                    "spec_ms": spec_s * 1000.0,
+                })
+    return rows
+
+
+def summarize(rows: list[dict], args) -> None:
+    safe_print(
+        f"{'k':>3} {'base_risk':>10} {'spec_risk':>10} {'|delta|':>9} {'accept':>7} "
+        f"{'base_ms':>9} {'spec_ms':>9} {'within':>7}"
+    )
+    for k in args.draft_tokens:
+        sel = [r for r in rows if r["draft_tokens"] == k and r["risk_delta"] is not None]
+        if not sel:
+            continue
+        accepts = [r["acceptance"] for r in sel if r["acceptance"] is not None]
+        within = sum(abs(r["risk_delta"]) <= args.risk_tol for r in sel)
+        safe_print(
+            f"{k:>3} "
+            f"{statistics.mean(r['base_chosen_risk'] for r in sel):>10.4f} "
+            f"{statistics.mean(r['spec_chosen_risk'] for r in sel):>10.4f} "
+            f"{statistics.mean(abs(r['risk_delta']) for r in sel):>9.4f} "
+            f"{statistics.mean(accepts) if accepts else float('nan'):>7.3f} "
+            f"{statistics.mean(r['base_ms'] for r in sel):>9.1f} "
+            f"{statistics.mean(r['spec_ms'] for r in sel):>9.1f} "
+            f"{within:>3}/{len(sel):<3}"
+        )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--engine", nargs="+", required=True, help="runtime artifact path(s)")
+    ap.add_argument("--prompts", nargs="*", default=None)
+    ap.add_argument("--draft-tokens", nargs="+", type=int, default=[4])
+    ap.add_argument("--risk-margin", type=float, default=0.0)
+    ap.add_argument("--risk-tol", type=float, default=0.05,
+                    help="allowed |chosen risk delta| vs. the refresh-every-token reference")
+    ap.add_argument("--seeds", nargs="+", type=int, default=[0])
+    ap.add_argument("--max-tokens", type=int, default=32)
+    ap.add_argument("--temperature", type=float, default=0.8)
+    ap.add_argument("--top-k", type=int, default=40)
+    ap.add_argument("--repeat-penalty", type=float, default=1.3)
+    ap.add_argument("--steps", type=int, default=100)
+    ap.add_argument("--dt", type=float, default=0.01)
+    ap.add_argument("--cb-topk", type=int, default=128)
+    ap.add_argument("--metric-rank", type=int, default=8)
+    ap.add_argument("--solver", default="euler", choices=list(RELAX_SOLVERS))
+    ap.add_argument("--device", default="cpu")
+    ap.add_argument("--json", default=None, help="optional path for per-run JSON rows")
+    args = ap.parse_args()
+
+    rows: list[dict] = []
+    for path in args.engine:
+        safe_print(f"== {path}")
+        art_rows = bench_artifact(path, args)
+        summarize(art_rows, args)
+        rows.extend(art_rows)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(rows, fh, ensure_ascii=False, indent=2)
+        safe_print(f"wrote {len(rows)} rows to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
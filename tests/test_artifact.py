@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+import torch
+
+from clarus.artifact import (
+    MANIFEST_NAME,
+    PAGE_ALIGN,
+    MappedArtifact,
+    compact_tensors,
+    load_artifact,
+    save_artifact_dir,
+)
+
+
+def test_artifact_dir_round_trips_tensors_and_values(tmp_path):
+    torch.manual_seed(0)
+    data = {
+        "d": 4,
+        "tau": 0.5,
+        "name": "unit",
+        "flag": None,
+        "emb_weight": torch.randn(5, 4),
+        "codes": torch.randint(0, 255, (7, 3), dtype=torch.uint8),
+        "ids": torch.tensor([3, 1, 2], dtype=torch.long),
+        "mask": torch.tensor([True, False, True]),
+        "half": torch.randn(3, 2).half(),
+        "empty": torch.zeros(0, 4),
+        "W_layers": [torch.randn(4, 4), torch.randn(4, 4)],
+        "nested": {"inner": torch.arange(6).view(2, 3), "scale": 2.0},
+        "shape": (2, 3),
+    }
+    out = tmp_path / "runtime.ce"
+    manifest = save_artifact_dir(data, str(out))
+    for entry in manifest["tensors"].values():
+        assert entry["offset"] % PAGE_ALIGN == 0
+    with open(os.path.join(out, MANIFEST_NAME), encoding="utf-8") as fh:
+        assert json.load(fh)["format_version"] == manifest["format_version"]
+
+    loaded = load_artifact(str(out))
+    assert isinstance(loaded, MappedArtifact)
+    assert set(loaded) == set(data)
+    assert loaded.loaded_keys() == []
+    for key in ("emb_weight", "codes", "ids", "mask", "half", "empty"):
+        assert loaded[key].dtype == data[key].dtype
+        assert torch.equal(loaded[key], data[key])
+    assert loaded["d"] == 4 and loaded["name"] == "unit" and loaded["flag"] is None
+    assert all(torch.equal(a, b) for a, b in zip(loaded["W_layers"], data["W_layers"]))
+    assert torch.equal(loaded["nested"]["inner"], data["nested"]["inner"])
+    assert loaded["shape"] == (2, 3)
+
+
+def test_mapped_artifact_overrides_stay_in_memory(tmp_path):
+    out = tmp_path / "runtime.ce"
+    save_artifact_dir({"W": torch.ones(2, 2), "keep": 1}, str(out))
+    loaded = load_artifact(str(out))
+    loaded["W"].mul_(3.0)
+    loaded["extra"] = torch.zeros(1)
+    del loaded["keep"]
+    assert set(loaded) == {"W", "extra"}
+    assert loaded.get("keep") is None
+
+    reread = load_artifact(str(out))
+    assert torch.equal(reread["W"], torch.ones(2, 2))
+    assert set(dict(reread)) == {"W", "keep"}
+
+    save_artifact_dir(dict(loaded), str(out))
+    assert torch.equal(loaded["W"], torch.full((2, 2), 3.0))
+    assert torch.equal(load_artifact(str(out))["W"], torch.full((2, 2), 3.0))
+
+
+def test_artifact_dir_rejects_unsupported_values(tmp_path):
+    with pytest.raises(ValueError):
+        save_artifact_dir({"bad": object()}, str(tmp_path / "bad.ce"))
+
+
+def test_resave_replaces_directory_and_pickle_copies_only_used_bytes(tmp_path):
+    out = tmp_path / "runtime.ce"
+    data = {"big": torch.randn(256, 256), "small": torch.arange(4), "nested": [torch.ones(3)]}
+    save_artifact_dir(data, str(out))
+    loaded = load_artifact(str(out))
+    save_artifact_dir({"small": loaded["small"] + 1}, str(out))
+    assert sorted(os.listdir(tmp_path)) == ["runtime.ce"]
+    assert set(load_artifact(str(out))) == {"small"}
+    assert torch.equal(loaded["big"], data["big"])
+
+    compact = compact_tensors(dict(loaded))
+    assert compact["small"].untyped_storage().nbytes() == 4 * 8
+    assert torch.equal(compact["nested"][0], torch.ones(3))
+    pickled = tmp_path / "small.pt"
+    torch.save({"small": compact["small"]}, pickled)
+    assert os.path.getsize(pickled) < 4096
@@ -10,16 +10,21 @@ import torch.nn.functional as F
 from clarus.ce_ops import (
     DEFAULT_CB_W,
     build_metric_basis,
+    build_relax_operator,
     ce_backend,
     codebook_pull,
+    extreme_eigs,
     has_cuda,
     has_rust,
     pack_sparse,
     pq_build_codebook,
+    pq_encode,
+    pq_offset_codes,
     pq_reconstruct_tokens,
     pq_scores,
     relax,
     relax_packed,
+    relax_packed_batch,
 )
 
 
@@ -178,6 +183,155 @@ def test_relax_torch_produces_finite_histories():
     assert min(hist["E"]) <= hist["E"][0]
 
 
+def test_relax_torch_sync_interval_does_not_change_result():
+    w, b, phi, m0, codebook = make_case(seed=16)
+    values, col_idx, row_ptr = pack_sparse(w, backend="torch")
+    basis = build_metric_basis(codebook, m0, rank=4, backend="torch")
+    kwargs = {**relax_kwargs(), "tol": 1e-3, "noise_scale": 1.0}
+    runs = [
+        relax_packed(
+            values, col_idx, row_ptr, b, phi, m0, codebook, basis,
+            backend="torch", sync_every=every, **kwargs
+        )
+        for every in (1, 5, 64)
+    ]
+    m_ref, hist_ref, steps_ref = runs[0]
+    for m_star, hist, steps in runs[1:]:
+        assert steps == steps_ref
+        assert torch.equal(m_star, m_ref)
+        assert hist["E"] == hist_ref["E"]
+        assert hist["phi_var"] == hist_ref["phi_var"]
+
+
+def test_relax_batch_matches_per_row_relax_without_noise():
+    w, *_ = make_case(seed=12)
+    values, col_idx, row_ptr = pack_sparse(w, backend="torch")
+    rows = [make_case(seed=seed, n_code=6 + seed % 3) for seed in (13, 14, 15)]
+    b = torch.stack([row[1] for row in rows])
+    phi = torch.stack([row[2] for row in rows])
+    m0 = torch.stack([row[3] for row in rows])
+    codebooks = [row[4] for row in rows]
+    bases = [build_metric_basis(cb, m0[i], rank=4, backend="torch") for i, cb in enumerate(codebooks)]
+    kwargs = {**relax_kwargs(), "tol": 1e-3}
+
+    m_batch, hists, steps = relax_packed_batch(
+        values, col_idx, row_ptr, b, phi, m0, codebooks, bases, backend="torch", **kwargs
+    )
+    assert m_batch.shape == m0.shape
+    for i in range(len(rows)):
+        m_ref, hist_ref, steps_ref = relax_packed(
+            values, col_idx, row_ptr, b[i], phi[i], m0[i], codebooks[i], bases[i],
+            backend="torch", **kwargs
+        )
+        assert steps[i] == steps_ref
+        assert len(hists[i]["E"]) == steps_ref
+        assert torch.allclose(m_batch[i], m_ref, atol=1e-4, rtol=1e-4)
+        assert max(abs(a - b) for a, b in zip(hists[i]["E"], hist_ref["E"])) < 1e-4
+
+
+def test_relax_batch_noise_is_seeded_per_row():
+    w, *_ = make_case(seed=12)
+    values, col_idx, row_ptr = pack_sparse(w, backend="torch")
+    rows = [make_case(seed=seed) for seed in (13, 14)]
+    b = torch.stack([row[1] for row in rows])
+    phi = torch.stack([row[2] for row in rows])
+    m0 = torch.stack([row[3] for row in rows])
+    codebooks = [row[4] for row in rows]
+    bases = [build_metric_basis(cb, m0[i], rank=4, backend="torch") for i, cb in enumerate(codebooks)]
+    kwargs = {**relax_kwargs(), "tol": 1e-3, "noise_scale": 1.0}
+
+    m_pair, _, steps_pair = relax_packed_batch(
+        values, col_idx, row_ptr, b, phi, m0, codebooks, bases, backend="torch", **kwargs
+    )
+    m_last, _, steps_last = relax_packed_batch(
+        values, col_idx, row_ptr, b[1:], phi[1:], m0[1:], codebooks[1:], bases[1:], backend="torch", **kwargs
+    )
+    m_ref, _, steps_ref = relax_packed(
+        values, col_idx, row_ptr, b[1], phi[1], m0[1], codebooks[1], bases[1], backend="torch", **kwargs
+    )
+    assert steps_pair[1] == steps_last[0] == steps_ref
+    assert torch.allclose(m_pair[1], m_last[0], atol=1e-5)
+    assert torch.allclose(m_last[0], m_ref, atol=1e-4, rtol=1e-4)
+
+
+def test_relax_batch_compacts_noise_when_a_row_converges_early():
+    w, b, phi, m0, codebook = make_case(seed=12)
+    values, col_idx, row_ptr = pack_sparse(w, backend="torch")
+    basis = build_metric_basis(codebook, m0, rank=4, backend="torch")
+    zeros = torch.zeros_like(m0)
+    # Row 0 sits at a fixed point (no field, zero codes) and converges right
+    # after warmup; row 1 is still moving while noise is on for every step.
+    kwargs = {
+        **relax_kwargs(), "tol": 1e-4, "noise_scale": 1e-6, "anneal_ratio": 1.0, "max_steps": 120,
+    }
+    m_batch, _, steps = relax_packed_batch(
+        values, col_idx, row_ptr,
+        torch.stack([zeros, b]), torch.stack([zeros, phi]), torch.stack([zeros, m0]),
+        [torch.zeros_like(codebook), codebook], [basis, basis],
+        backend="torch", sync_every=1, **kwargs
+    )
+    m_ref, _, steps_ref = relax_packed(
+        values, col_idx, row_ptr, b, phi, m0, codebook, basis, backend="torch", **kwargs
+    )
+    assert m_batch.shape == (2, m0.numel())
+    assert steps[0] < steps[1] == steps_ref
+    assert torch.allclose(m_batch[0], zeros, atol=1e-4)
+    assert torch.allclose(m_batch[1], m_ref, atol=1e-4, rtol=1e-4)
+
+
+def test_relax_operator_caches_csr_and_spectral_radius():
+    w, b, phi, m0, codebook = make_case(seed=18)
+    values, col_idx, row_ptr = pack_sparse(w, backend="torch")
+    op = build_relax_operator(values, col_idx, row_ptr, version=3, power_iters=200)
+    rho = float(torch.linalg.eigvalsh(w).abs().max().item())
+    assert op.version == 3
+    assert op.sparse_mat is not None
+    assert op.spectral_radius == pytest.approx(rho, rel=1e-2)
+
+    basis = build_metric_basis(codebook, m0, rank=4, backend="torch")
+    kwargs = relax_kwargs()
+    m_op, hist_op, steps_op = relax_packed(
+        values, col_idx, row_ptr, b, phi, m0, codebook, basis,
+        backend="torch", operator=op, **kwargs
+    )
+    m_dense, hist_dense, steps_dense = relax(
+        w, b, phi, m0, codebook, basis, backend="torch", operator=op, **kwargs
+    )
+    assert steps_op == steps_dense
+    assert torch.allclose(m_op, m_dense)
+    assert hist_op["E"] == hist_dense["E"]
+
+
+def test_extreme_eigs_lanczos_matches_dense_eigh():
+    g = torch.Generator().manual_seed(21)
+    d = 160
+    q, _ = torch.linalg.qr(torch.randn(d, d, generator=g, dtype=torch.float64))
+    spectrum = torch.linspace(-1.0, 0.5, d, dtype=torch.float64)
+    spectrum[:3] = torch.tensor([-9.0, -7.0, -5.0], dtype=torch.float64)
+    spectrum[-1] = 4.0
+    w = ((q * spectrum) @ q.T).float()
+    w = 0.5 * (w + w.T)
+    op = build_relax_operator(*pack_sparse(w, backend="torch"), spectral_radius=0.0)
+
+    lam_max, vals, vecs = extreme_eigs(op, k_smallest=3, iters=60)
+    ref_vals, ref_vecs = torch.linalg.eigh(w.double())
+    assert lam_max >= float(ref_vals[-1]) - 1e-4
+    assert lam_max == pytest.approx(float(ref_vals[-1]), abs=1e-2)
+    assert torch.allclose(vals.double(), ref_vals[:3], atol=1e-3)
+    overlap = (vecs.double() @ ref_vecs[:, :3]).abs().diagonal()
+    assert torch.all(overlap > 0.999)
+
+    dense_max, dense_vals, _ = extreme_eigs(op, k_smallest=2, iters=d)
+    assert dense_max == pytest.approx(float(ref_vals[-1]), abs=1e-4)
+    assert torch.allclose(dense_vals.double(), ref_vals[:2], atol=1e-4)
+
+    # Too few steps to converge: the residual check keeps extending the run.
+    short_max, short_vals, short_vecs = extreme_eigs(op, k_smallest=3, iters=4)
+    assert short_max >= float(ref_vals[-1]) - 1e-4
+    assert torch.allclose(short_vals.double(), ref_vals[:3], atol=1e-2)
+    assert torch.all((short_vecs.double() @ ref_vecs[:, :3]).abs().diagonal() > 0.99)
+
+
 def test_update_phi_preserves_signed_residual_direction():
     phi = torch.zeros(3)
     m_star = torch.tensor([1.0, -2.0, 0.0])
@@ -250,6 +404,50 @@ def test_riemannian_metric_is_numerically_stable_on_constructed_case():
     assert cos_rie >= cos_euc - 5e-2
 
 
+def test_accelerated_solvers_reach_lower_energy_within_budget():
+    dim = 10
+    torch.manual_seed(17)
+    target = F.normalize(torch.randn(dim), dim=0)
+    w = -torch.eye(dim)
+    b = target * 0.6
+    phi = target * 0.2
+    m0 = torch.randn(dim)
+    codebook = torch.stack([target, -target, torch.randn(dim)]).float()
+    values, col_idx, row_ptr = pack_sparse(w, backend="torch")
+    basis = build_metric_basis(codebook, m0, rank=2, backend="torch")
+    kwargs = relax_kwargs()
+
+    best = {}
+    for solver in ("euler", "anderson", "nesterov"):
+        m_star, hist, steps = relax_packed(
+            values, col_idx, row_ptr, b, phi, m0, codebook, basis,
+            backend="torch", solver=solver, **kwargs
+        )
+        assert torch.isfinite(m_star).all()
+        assert len(hist["E"]) == steps
+        assert min(hist["E"]) <= hist["E"][0]
+        best[solver] = min(hist["E"])
+    assert best["anderson"] <= best["euler"] + 1e-6
+    assert best["nesterov"] <= best["euler"] + 1e-6
+
+    with pytest.raises(ValueError):
+        relax_packed(values, col_idx, row_ptr, b, phi, m0, solver="newton", **kwargs)
+
+    m_batch, _, steps = relax_packed_batch(
+        values, col_idx, row_ptr, b.unsqueeze(0), phi.unsqueeze(0), m0.unsqueeze(0),
+        codebook, basis, backend="torch", solver="anderson", **kwargs
+    )
+    m_ref, _, steps_ref = relax_packed(
+        values, col_idx, row_ptr, b, phi, m0, codebook, basis,
+        backend="torch", solver="anderson", **kwargs
+    )
+    assert steps == [steps_ref]
+    assert torch.allclose(m_batch[0], m_ref)
+    with pytest.raises(ValueError):
+        relax_packed_batch(values, col_idx, row_ptr, b.unsqueeze(0), phi.unsqueeze(0), m0.unsqueeze(0),
+                           solver="newton", **kwargs)
+
+
 def test_pq_build_and_reconstruct_shapes_are_consistent():
     torch.manual_seed(21)
     emb = torch.randn(64, 12)
@@ -271,6 +469,53 @@ def test_pq_build_and_reconstruct_shapes_are_consistent():
     assert torch.isfinite(recon).all()
 
 
+def test_pq_kmeanspp_converges_early_and_encode_matches_nearest():
+    torch.manual_seed(23)
+    emb = torch.randn(40, 6)
+    pq = pq_build_codebook(
+        emb,
+        subdim=2,
+        bits=2,
+        iters=50,
+        batch_size=64,
+        sample_size=40,
+        seed=3,
+        init="kmeans++",
+    )
+    assert pq["iters_run"] < 50
+    centroids = pq["centroids"].float()
+    codes = pq_encode(emb, centroids, batch_size=7)
+    assert codes.shape == pq["codes"].shape and codes.dtype == torch.uint8
+    for sub_idx in range(3):
+        dist = torch.cdist(emb[:, 2 * sub_idx : 2 * sub_idx + 2], centroids[sub_idx])
+        assert torch.equal(codes[:, sub_idx].long(), dist.argmin(dim=1))
+
+    with pytest.raises(ValueError):
+        pq_build_codebook(emb, subdim=2, bits=2, init="spectral")
+
+
+def test_pq_scores_fused_matches_reconstruction_batched_and_quantized():
+    gen = torch.Generator().manual_seed(24)
+    centroids = torch.randn(3, 4, 2, generator=gen)
+    codes = torch.randint(0, 4, (50, 3), generator=gen).to(torch.uint8)
+    queries = torch.randn(2, 6, generator=gen)
+    expected = queries @ pq_reconstruct_tokens(centroids, codes).T
+    offsets = pq_offset_codes(codes, 4)
+    assert offsets.dtype == torch.int32
+
+    batched = pq_scores(queries, centroids, codes, offset_codes=offsets, chunk_size=7)
+    assert batched.shape == (2, 50)
+    assert torch.allclose(batched, expected, atol=1e-5)
+    assert torch.allclose(pq_scores(queries[1], centroids, codes), expected[1], atol=1e-5)
+
+    quantized = pq_scores(queries, centroids, codes, lut_bits=8)
+    lut_range = (queries.abs().max() * centroids.abs().max() * 2 * 2 * 3).item()
+    assert (quantized - expected).abs().max().item() <= lut_range / 255.0
+
+    with pytest.raises(ValueError):
+        pq_scores(queries, centroids, codes, lut_bits=4)
+
+
 def test_pq_scores_rank_reconstructed_self_highest_on_small_case():
     torch.manual_seed(22)
     emb = torch.randn(32, 8)
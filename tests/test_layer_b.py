@@ -1,8 +1,10 @@
 """Layer B: Field coupling, energy, brainwave observable."""
 
+import math
+
 import torch
 import pytest
-from clarus.runtime import BrainRuntime, BrainRuntimeConfig, RuntimeMode
+from clarus.runtime import BrainRuntime, BrainRuntimeConfig, BrainwaveEstimator, RuntimeMode
 
 
 def make_runtime(dim=64):
@@ -55,6 +57,57 @@ class TestBrainwave:
         assert len(rt._brainwave_history) <= rt._brainwave_max_len
 
 
+def reference_band_powers(history, fs=1000.0):
+    sig = torch.tensor(history, dtype=torch.float64)
+    power = torch.fft.rfft(sig - sig.mean()).abs() ** 2 / len(sig)
+    freqs = torch.fft.rfftfreq(len(sig), d=1.0 / fs)
+    bands = {"delta": (0.5, 4.0), "theta": (4.0, 8.0), "alpha": (8.0, 13.0),
+             "beta": (13.0, 30.0), "gamma": (30.0, 100.0)}
+    return {
+        name: float(power[(freqs >= lo) & (freqs < hi)].sum())
+        for name, (lo, hi) in bands.items()
+    }
+
+
+class TestBrainwaveEstimator:
+    @staticmethod
+    def signal(t):
+        return 0.5 + math.sin(2 * math.pi * 10.0 * t / 1000.0) + 0.3 * math.sin(2 * math.pi * 40.0 * t / 1000.0)
+
+    @pytest.mark.parametrize("n", [7, 100, 256, 1500, 3000])
+    def test_matches_rfft_reference(self, n):
+        est = BrainwaveEstimator(window=256, resync_every=10_000)
+        for t in range(n):
+            est.push(self.signal(t))
+        assert len(est.history()) == min(n, 256)
+        got = est.band_powers()
+        if n < 8:
+            assert got == {}
+            return
+        ref = reference_band_powers(est.history())
+        for band, value in ref.items():
+            assert got[band] == pytest.approx(value, rel=1e-6, abs=1e-9)
+
+    def test_reset_clears_window(self):
+        est = BrainwaveEstimator(window=64)
+        for t in range(200):
+            est.push(self.signal(t))
+        est.reset()
+        assert len(est) == 0
+        assert est.band_powers() == {}
+
+    def test_runtime_step_records_without_band_sums(self):
+        rt = make_runtime()
+        for _ in range(30):
+            rt.step(external_input=torch.randn(64) * 0.3)
+        assert len(rt._brainwave_history) == 30
+        obs = rt.brainwave_observable()
+        assert len(rt._brainwave_history) == 31
+        ref = reference_band_powers(rt._brainwave_history)
+        for band, value in ref.items():
+            assert obs[band] == pytest.approx(value, rel=1e-6, abs=1e-12)
+
+
 class TestRiemannianWeight:
     def test_build_riemannian_weight(self):
         dim = 32
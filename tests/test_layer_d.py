@@ -77,3 +77,58 @@ class TestReplay:
         sd = mem.state_dict()
         mem2 = HippocampusMemory.from_state_dict(sd)
         assert len(mem2) == len(mem)
+
+    def test_eviction_reuses_lowest_priority_slot(self):
+        mem = HippocampusMemory(dim=8, capacity=3)
+        keys = [torch.randn(8) for _ in range(4)]
+        for key, prio in zip(keys, [2.0, 1.0, 3.0]):
+            mem.encode(key, priority=prio)
+        mem.decay_priorities(steps=10)
+        mem.encode(keys[3], priority=5.0)
+        factor = torch.exp(torch.tensor(-10.0 / FORGET_TAU, dtype=torch.float64)).item()
+        assert mem._priority == pytest.approx([2.0 * factor, 3.0 * factor, 5.0], rel=1e-6)
+        sd = mem.state_dict()
+        expected = torch.stack([keys[0], keys[2], keys[3]])
+        expected = expected / expected.norm(dim=1, keepdim=True)
+        assert torch.allclose(sd["keys"], expected, atol=1e-6)
+
+    def test_recall_matches_weighted_topk(self):
+        mem = HippocampusMemory(dim=16, capacity=64)
+        keys = torch.randn(40, 16)
+        for idx in range(40):
+            mem.encode(keys[idx], priority=float(idx % 5 + 1))
+        cue = keys[7]
+        keys_n = keys / keys.norm(dim=1, keepdim=True)
+        sim = keys_n @ (cue / cue.norm())
+        prio = torch.tensor([float(i % 5 + 1) for i in range(40)])
+        score = (sim + prio.log()).masked_fill(sim < RECALL_SIMILARITY_THRESHOLD, float("-inf"))
+        top_score, top_idx = torch.topk(score, k=min(4, int((sim >= RECALL_SIMILARITY_THRESHOLD).sum())))
+        expected = torch.softmax(top_score, dim=0) @ keys_n[top_idx]
+        assert torch.allclose(mem.recall(cue), expected, atol=1e-5)
+
+
+class TestApproximateRecall:
+    def test_lsh_recall_tracks_exact_with_inserts_and_evictions(self):
+        gen = torch.Generator().manual_seed(0)
+        mem = HippocampusMemory(dim=16, capacity=200, ann_bits=6, ann_tables=8, ann_min_size=1)
+        for _ in range(260):
+            mem.encode(torch.randn(16, generator=gen), priority=1.0)
+        assert len(mem) == 200
+        bucket_total = sum(len(slots) for table in mem._ann_buckets for slots in table.values())
+        assert bucket_total == 200 * 8
+
+        keys = mem.state_dict()["keys"][:50]
+        cues = keys + 0.05 * torch.randn(keys.shape, generator=gen)
+        report = mem.recall_report(cues, topk=1)
+        assert report["queries"] == 50
+        assert report["recall_at_k"] >= 0.8
+        assert report["mean_candidates"] < 200
+
+        exact = HippocampusMemory.from_state_dict({**mem.state_dict(), "ann_bits": 0})
+        mem.ann_min_size = 10**6
+        assert torch.allclose(mem.recall(cues[0]), exact.recall(cues[0]), atol=1e-6)
+
+    def test_recall_report_requires_ann(self):
+        mem = HippocampusMemory(dim=8, capacity=4)
+        with pytest.raises(RuntimeError):
+            mem.recall_report(torch.randn(2, 8))
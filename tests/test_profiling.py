@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+
+from clarus.profiling import Profiler, profiled
+
+
+def test_profiler_records_spans_counters_and_trace(tmp_path):
+    prof = Profiler()
+    with prof.span("off"):
+        pass
+    prof.count("off")
+    assert prof.summary()["histograms"] == {} and prof.summary()["counters"] == {}
+
+    prof.enable()
+    for step in range(3):
+        with prof.span("phase", step=step):
+            prof.count("tokens", 2)
+            prof.observe("token_s", 0.5 * (step + 1))
+    summary = prof.summary()
+    assert summary["histograms"]["phase"]["count"] == 3
+    assert summary["histograms"]["token_s"]["max"] == 1.5
+    assert summary["counters"]["tokens"] == 6
+    assert "phase" in prof.report()
+
+    out = tmp_path / "trace.json"
+    prof.export_chrome_trace(str(out))
+    trace = json.loads(out.read_text(encoding="utf-8"))["traceEvents"]
+    spans = [event for event in trace if event["ph"] == "X"]
+    assert [event["args"]["step"] for event in spans] == [0, 1, 2]
+    assert all(event["dur"] >= 0 for event in spans)
+
+    prof.reset()
+    assert prof.summary()["histograms"] == {}
+
+
+def test_profiled_decorator_checks_global_switch():
+    from clarus.profiling import PROFILER
+
+    @profiled("unit.fn")
+    def fn(x):
+        return x + 1
+
+    was_enabled = PROFILER.enabled
+    PROFILER.reset()
+    try:
+        PROFILER.disable()
+        assert fn(1) == 2
+        assert "unit.fn" not in PROFILER.summary()["histograms"]
+        PROFILER.enable()
+        assert fn(2) == 3
+        assert PROFILER.summary()["histograms"]["unit.fn"]["count"] == 1
+    finally:
+        PROFILER.enabled = was_enabled
+        PROFILER.reset()
+
+
+def test_profiler_histograms_stay_bounded():
+    prof = Profiler(enabled=True, max_samples=16)
+    for step in range(10_000):
+        prof.observe("token_s", float(step))
+    row = prof.summary()["histograms"]["token_s"]
+    assert row["count"] == 10_000
+    assert row["total"] == sum(range(10_000))
+    assert row["max"] == 9999.0
+    assert 0.0 <= row["p50"] <= row["max"]
+    assert len(prof.histograms["token_s"].samples) == 16
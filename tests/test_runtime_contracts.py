@@ -5,7 +5,7 @@ import torch
 
 import clarus
 from clarus.engine import CEEngine
-from clarus.runtime import BrainRuntime, BrainRuntimeConfig, RuntimeMode
+from clarus.runtime import BrainRuntime, BrainRuntimeConfig, BrainRuntimePool, RuntimeMode
 from tests.test_sleep import make_runtime_artifact
 
 
@@ -121,3 +121,81 @@ def test_brain_runtime_snapshot_restore_is_continuous():
     assert out_a.energy == pytest.approx(out_b.energy, rel=1e-6, abs=1e-6)
     assert torch.allclose(rt_a.activation, rt_b.activation, atol=1e-6, rtol=1e-6)
     assert torch.equal(rt_a.lifecycle, rt_b.lifecycle)
+
+
+def test_rust_state_buffers_are_persistent_views_without_aliasing_snapshots():
+    w = make_weight(seed=3)
+    runtime = BrainRuntime(
+        w,
+        config=BrainRuntimeConfig(dim=64, active_ratio=0.125, memory_capacity=8),
+        backend="torch",
+        device="cpu",
+    )
+    runtime.step(external_input=torch.randn(64))
+    snapshot = runtime.snapshot()
+    restored = BrainRuntime.from_snapshot(snapshot, backend="torch", device="cpu")
+    before = snapshot.activation.clone()
+
+    buffers = restored._rust_state_buffers()
+    buffers["activation"][:] = 0.25
+    assert torch.equal(snapshot.activation, before)
+    assert torch.all(restored.activation == 0.25)
+    assert restored._rust_state_buffers()["activation"] is buffers["activation"]
+
+    pack = restored._rust_weight_pack()
+    assert restored._rust_weight_pack() is pack
+    restored._rebuild_sparse()
+    assert restored._rust_weight_pack() is not pack
+
+
+@pytest.mark.skipif(not clarus.runtime._HAS_RUST_KERNEL, reason="Rust kernel not built")
+def test_cpu_rust_step_updates_held_state_in_place_but_not_snapshots():
+    w = make_weight(seed=5)
+    config = BrainRuntimeConfig(dim=64, active_ratio=0.125, memory_capacity=8)
+    runtime = BrainRuntime(w, config=config, backend="rust", device="cpu")
+    runtime.step(external_input=torch.randn(64))
+    snapshot = runtime.snapshot()
+    restored = BrainRuntime.from_snapshot(snapshot, backend="rust", device="cpu")
+    before = snapshot.activation.clone()
+
+    restored.step(external_input=torch.randn(64))
+    held = restored.activation
+    held_value = held.clone()
+    restored.step(external_input=torch.randn(64))
+
+    assert restored.activation is held
+    assert not torch.equal(held, held_value)
+    assert torch.equal(snapshot.activation, before)
+
+
+def test_brain_runtime_pool_reproduces_independent_runtimes():
+    w = make_weight(seed=4)
+    config = BrainRuntimeConfig(dim=64, active_ratio=0.125, memory_capacity=8)
+    gen = torch.Generator().manual_seed(0)
+    singles = []
+    for idx in range(3):
+        runtime = BrainRuntime(w, config=config, backend="torch", device="cpu")
+        runtime.set_goal(torch.randn(64, generator=gen))
+        for _ in range(idx + 1):
+            runtime.step(external_input=torch.randn(64, generator=gen))
+        singles.append(BrainRuntime.from_snapshot(runtime.snapshot(), backend="torch", device="cpu"))
+    pool = BrainRuntimePool.from_snapshots([rt.snapshot() for rt in singles], device="cpu")
+
+    for tick in range(6):
+        inputs = torch.randn(3, 64, generator=gen) * (0.0 if tick % 3 == 2 else 1.0)
+        modes = [None, RuntimeMode.NREM if tick >= 3 else None, None]
+        pooled = pool.step(external_input=inputs, force_mode=modes)
+        for idx, runtime in enumerate(singles):
+            single = runtime.step(external_input=inputs[idx], force_mode=modes[idx])
+            assert pooled[idx].mode is single.mode
+            assert pooled[idx].step == single.step
+            assert pooled[idx].active_modules == single.active_modules
+            assert pooled[idx].lifecycle_counts == single.lifecycle_counts
+            assert pooled[idx].energy == pytest.approx(single.energy, rel=1e-5, abs=1e-6)
+            assert torch.allclose(pool.activation[idx], runtime.activation, atol=1e-6)
+            assert torch.equal(pool.lifecycle[idx], runtime.lifecycle)
+
+    snap = pool.snapshot(1)
+    restored = BrainRuntime.from_snapshot(snap, backend="torch", device="cpu")
+    assert torch.equal(restored.activation, pool.activation[1])
+    assert restored.step_index == pool.step_index[1]
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 import argparse
+import threading
 import pytest
 import torch
 import torch.nn as nn
 
-from clarus.ce_ops import pack_sparse
-from clarus.engine import CEEngine
+from clarus.ce_ops import grid_stencil_laplacian, pack_sparse, pq_reconstruct_tokens
+from clarus.engine import CEEngine, PQTokenCache, RelaxWarmStartCache, TokenHistory
 from tests.bench_gpt2 import build_prompt_weights, select_topical_chunks, sleep_curriculum_stage
 from clarus.sleep import (
     PromptReplayBuffer,
@@ -24,6 +25,7 @@ from clarus.sleep import (
     row_topk_mask,
     run_guarded_microsleep_step,
     should_accept_guard_update,
+    smooth_weight_matrix,
 )
 
 PORTAL = 0.031203
@@ -267,6 +269,190 @@ def test_runtime_only_artifact_loads_without_clone_state(tmp_path):
     assert torch.isfinite(ctx.m0).all()
 
 
+def test_runtime_artifact_dir_layout_matches_pickle(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    out = tmp_path / "runtime.ce"
+    eng.save_runtime_artifact(str(out), layout="dir")
+    mapped = CEEngine(str(out), device="cpu", backend="torch")
+    assert torch.equal(mapped.emb, eng.emb)
+    ctx = eng.prompt_context("alpha beta")
+    mapped_ctx = mapped.prompt_context("alpha beta")
+    assert torch.allclose(mapped_ctx.m0, ctx.m0)
+    ce_hidden = torch.tensor([0.0, 1.0, 0.0, 0.0])
+    assert torch.allclose(
+        mapped.standalone_logits(ce_hidden, prev_id=2, temperature=1.0),
+        eng.standalone_logits(ce_hidden, prev_id=2, temperature=1.0),
+    )
+    mapped.save_runtime_artifact(str(out))
+    assert CEEngine(str(out), device="cpu", backend="torch").d == 4
+    with pytest.raises(ValueError):
+        eng.save_runtime_artifact(str(tmp_path / "x"), layout="zip")
+
+
+def test_finalized_artifact_skips_derived_recompute(tmp_path, monkeypatch):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    artifact = torch.load(path, weights_only=False)
+    artifact["target_w_density"] = 0.5
+    artifact["r_c"] = 2.0
+    torch.save(artifact, path)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    assert not eng.finalized
+    out = tmp_path / "finalized.pt"
+    eng.save_runtime_artifact(str(out))
+    # Saving finalizes a copy; the live engine keeps its own derived state.
+    assert not eng.finalized
+    assert "finalized" not in eng.data
+    assert eng._stored_eigvecs is None
+
+    def fail(*args, **kwargs):
+        raise AssertionError("derived data should come from the finalized artifact")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(CEEngine, "apply_relax_matrix", fail)
+        patch.setattr(CEEngine, "state_partition", fail)
+        loaded = CEEngine(str(out), device="cpu", backend="torch")
+    assert loaded.finalized
+    assert torch.equal(loaded.W, eng.W)
+    assert torch.equal(loaded.active_dim_mask, eng.active_dim_mask)
+    assert loaded.relax_operator.spectral_radius == pytest.approx(eng.relax_operator.spectral_radius)
+    overlap = (loaded._get_w_eigvecs(4) * eng._get_w_eigvecs(4)).sum(dim=1).abs()
+    assert torch.all(overlap > 1.0 - 1e-4)
+
+    tampered = torch.load(out, weights_only=False)
+    tampered["W"] = tampered["W"] * 2.0
+    torch.save(tampered, out)
+    assert not CEEngine(str(out), device="cpu", backend="torch").finalized
+
+
+def test_mips_index_matches_exact_scores_and_invalidates(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    queries = torch.randn(3, 4, generator=torch.Generator().manual_seed(0))
+
+    info = eng.build_mips_index(n_lists=2, nprobe=2)
+    assert info["source"] == "emb"
+    assert torch.allclose(eng.lexical_scores(queries, min_candidates=2), eng.lexical_scores(queries))
+    assert eng.mips_recall(queries, 2) == pytest.approx(1.0)
+
+    eng.apply_vocab_head(torch.eye(4), bias=torch.tensor([0.0, 0.0, 0.5, 0.0]))
+    assert eng.mips_index is not None and eng.mips_index["source"] == "emb"
+    eng.build_mips_index(source="vocab_head", n_lists=2, nprobe=1)
+    approx = eng.vocab_logits(queries, min_candidates=1)
+    exact = eng.vocab_logits(queries)
+    finite = torch.isfinite(approx)
+    assert finite.any(dim=1).all()
+    assert torch.allclose(approx[finite], exact[finite])
+    assert torch.equal(eng.vocab_logits(queries, min_candidates=10), exact)
+
+    eng.apply_vocab_head(2.0 * torch.eye(4))
+    assert eng.mips_index is None
+    assert "mips_lists" not in eng.data
+
+
+def test_pq_token_cache_evicts_lru_rows(monkeypatch):
+    gen = torch.Generator().manual_seed(0)
+    centroids = torch.randn(2, 4, 2, generator=gen)
+    codes = torch.randint(0, 4, (6, 2), generator=gen).to(torch.uint8)
+    cache = PQTokenCache(capacity=2)
+    ids = torch.tensor([0, 1])
+    assert torch.equal(cache.lookup(centroids, codes, ids), pq_reconstruct_tokens(centroids, codes, ids))
+    cache.lookup(centroids, codes, torch.tensor([1]))
+    cache.lookup(centroids, codes, torch.tensor([2]))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 3, 1)
+    cache.lookup(centroids, codes, torch.tensor([1, 2]))
+    assert cache.stats()["hits"] == 3
+
+    def no_host_read(*args, **kwargs):
+        raise AssertionError("hit path read a tensor back to the host")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(torch.Tensor, "item", no_host_read)
+        patch.setattr(torch.Tensor, "tolist", no_host_read)
+        out = cache.lookup(centroids, codes, torch.tensor([2, 1, 2]))
+    assert torch.equal(out, pq_reconstruct_tokens(centroids, codes, torch.tensor([2, 1, 2])))
+    assert cache.stats()["hits"] == 6
+
+
+def test_pq_token_cache_is_consistent_under_concurrent_lookups():
+    gen = torch.Generator().manual_seed(3)
+    centroids = torch.randn(2, 8, 2, generator=gen)
+    codes = torch.randint(0, 8, (64, 2), generator=gen).to(torch.uint8)
+    cache = PQTokenCache(capacity=8)
+    cache.pin(centroids, codes, torch.tensor([0, 1]))
+    expected = pq_reconstruct_tokens(centroids, codes)
+    n_threads, n_lookups, errors = 4, 200, []
+
+    def worker(seed: int):
+        local = torch.Generator().manual_seed(seed)
+        for _ in range(n_lookups):
+            ids = torch.randint(0, codes.shape[0], (5,), generator=local)
+            if not torch.equal(cache.lookup(centroids, codes, ids), expected.index_select(0, ids)):
+                errors.append(ids.tolist())
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert not errors
+    assert stats["hits"] + stats["misses"] == n_threads * n_lookups * 5
+    assert stats["entries"] <= 8 and stats["pinned"] == 2
+    slots = cache.slot_of[cache.token_of.clamp_min(0)]
+    assert torch.equal(slots[cache.token_of >= 0], torch.nonzero(cache.token_of >= 0).view(-1))
+
+
+def test_pq_only_token_embedding_uses_cache_and_invalidates(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch", pq_cache_size=8)
+    gen = torch.Generator().manual_seed(1)
+    centroids = torch.randn(2, 2, 2, generator=gen)
+    codes = torch.tensor([[0, 1], [1, 0], [1, 1], [0, 0]], dtype=torch.uint8)
+    eng.emb = None
+    eng.apply_pq(centroids, codes)
+
+    ids = torch.tensor([2, 3, 2, 1])
+    assert torch.equal(eng.token_embedding(ids), pq_reconstruct_tokens(centroids, codes, ids))
+    eng.token_embedding(ids)
+    assert eng.pq_cache.stats()["hits"] >= ids.numel()
+
+    eng.apply_pq(centroids * 2.0, codes)
+    assert eng.pq_cache.stats()["invalidations"] == 1
+    assert torch.equal(eng.token_embedding(ids), pq_reconstruct_tokens(centroids * 2.0, codes, ids))
+
+
+def test_mips_index_over_pq_rows_matches_exact_scores(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    gen = torch.Generator().manual_seed(2)
+    centroids = torch.randn(2, 2, 2, generator=gen)
+    codes = torch.tensor([[0, 1], [1, 0], [1, 1], [0, 0]], dtype=torch.uint8)
+    eng.emb = None
+    eng.apply_pq(centroids, codes)
+    queries = torch.randn(3, 4, generator=gen)
+
+    assert eng.memory_usage()["PQOffsets_MB"] == 0.0
+    eng.lexical_scores(queries)
+    assert eng._pq_offset_codes.dtype == torch.int32
+    assert eng.memory_usage()["PQOffsets_MB"] * 1024 * 1024 == pytest.approx(codes.numel() * 4)
+
+    info = eng.build_mips_index(n_lists=2, nprobe=2)
+    assert info["source"] == "pq"
+    assert torch.allclose(eng.lexical_scores(queries, min_candidates=2), eng.lexical_scores(queries), atol=1e-5)
+    assert eng.mips_recall(queries, 2) == pytest.approx(1.0)
+
+    eng.mips_nprobe = 1
+    approx = eng.vocab_logits(queries, min_candidates=1)
+    finite = torch.isfinite(approx)
+    assert finite.any(dim=1).all()
+    assert torch.allclose(approx[finite], eng.vocab_logits(queries)[finite], atol=1e-5)
+
+    eng.apply_pq(centroids * 2.0, codes)
+    assert eng.mips_index is None
+
+
 def test_standalone_logits_uses_decoder_query_and_token_head(tmp_path):
     path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
     eng = CEEngine(str(path), device="cpu", backend="torch")
@@ -299,6 +485,405 @@ def test_standalone_logits_reports_repeat_suppression(tmp_path):
     assert meta["suppressed_count"] >= 1
 
 
+def test_candidate_merge_and_ngram_index_match_python_reference(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    merged = eng._merge_candidate_ids(
+        torch.tensor([3, 1, 3, -1]),
+        None,
+        torch.tensor([7, 0, 1, 2]),
+    )
+    assert merged.tolist() == [3, 1, 0, 2]
+
+    g = torch.Generator().manual_seed(9)
+    stream = torch.randint(0, 4, (40,), generator=g).tolist()
+    history = TokenHistory(stream[:2], ngram=eng.repeat_ngram)
+    candidates = torch.arange(4)
+    for token_id in stream[2:]:
+        history.append(token_id)
+        n = max(int(eng.repeat_ngram), 2)
+        seen = {tuple(history[i : i + n]) for i in range(len(history) - n + 1)}
+        prefix = tuple(history[len(history) - (n - 1) :])
+        expected = [float((*prefix, c) in seen) for c in range(4)]
+        assert eng._ngram_repeat_scores(history, candidates).tolist() == expected
+        assert eng._ngram_repeat_scores(list(history), candidates).tolist() == expected
+
+
+def test_token_history_index_survives_every_mutator():
+    history = TokenHistory([1, 2, 3, 1, 2, 4], ngram=3)
+    mutations = [
+        lambda h: h.__setitem__(slice(1, 3), [5, 5, 5]),
+        lambda h: h.__setitem__(0, 2),
+        lambda h: h.__delitem__(slice(0, 2)),
+        lambda h: h.insert(1, 7),
+        lambda h: h.pop(),
+        lambda h: h.pop(0),
+        lambda h: h.remove(5),
+        lambda h: h.__iadd__([1, 2, 3]),
+        lambda h: h.__imul__(2),
+        lambda h: h.reverse(),
+        lambda h: h.sort(),
+        lambda h: h.clear(),
+    ]
+    for mutate in mutations:
+        mutate(history)
+        rebuilt = TokenHistory(list(history), ngram=3)
+        assert history.followers == rebuilt.followers
+        assert history.continuations() == rebuilt.continuations()
+
+
+class ByteTokenizer:
+    def __init__(self):
+        self.decoded_lengths = []
+
+    def decode(self, ids, skip_special_tokens=True):
+        self.decoded_lengths.append(len(ids))
+        return bytes(ids).decode("utf-8", errors="replace")
+
+
+def test_decode_delta_windows_and_holds_back_partial_utf8(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    eng.tok = ByteTokenizer()
+    text = "ab 한국어 c" * 20
+    ids: list[int] = []
+    offsets = (0, 0)
+    deltas = []
+    for byte in text.encode("utf-8"):
+        ids.append(byte)
+        delta, offsets = eng._decode_delta(ids, *offsets)
+        assert "\ufffd" not in delta
+        deltas.append(delta)
+    deltas.append(eng._decode_delta(ids, *offsets, final=True)[0])
+    assert "".join(deltas) == text
+    assert max(eng.tok.decoded_lengths) <= 6
+
+
+def test_stream_generate_matches_standalone_generate_and_cancels(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    eng.eos_token_id = None
+    ctx = eng.prompt_context("alpha beta")
+    gen_kwargs = dict(max_tok=6, temperature=1.0, top_k=0, repeat_penalty=2.0)
+
+    torch.manual_seed(3)
+    text, ids, meta = eng.standalone_generate(ctx.prompt_ids, ctx.m0, **gen_kwargs)
+    torch.manual_seed(3)
+    events = list(eng.stream_generate(ctx.prompt_ids, ctx.m0, **gen_kwargs))
+    steps, final = events[:-1], events[-1]
+    assert [ev["token_id"] for ev in steps] == ids
+    assert all(not ev["done"] and ev["elapsed_s"] >= 0.0 for ev in steps)
+    assert final["done"] and final["token_ids"] == ids and final["text"] == text
+    assert "".join(ev["text_delta"] for ev in events) == text
+    assert final["finish_reason"] == meta["finish_reason"] == "length"
+    assert final["meta"]["chosen_risk_mean"] == pytest.approx(meta["chosen_risk_mean"])
+
+    cancel = threading.Event()
+    stream = eng.stream_generate(ctx.prompt_ids, ctx.m0, cancel=cancel, **gen_kwargs)
+    first = next(stream)
+    cancel.set()
+    rest = list(stream)
+    assert not first["done"]
+    assert len(rest) == 1 and rest[0]["finish_reason"] == "cancelled"
+    assert len(rest[0]["token_ids"]) == 1
+
+
+def test_async_refresh_bounds_staleness(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    eng.eos_token_id = None
+    ctx = eng.prompt_context("alpha beta")
+    gen_kwargs = dict(
+        max_tok=6,
+        temperature=1.0,
+        top_k=0,
+        repeat_penalty=2.0,
+        refresh_interval=1,
+        refresh_args=relax_args(steps=4),
+        refresh_init_layer=ctx.best_layer,
+        refresh_phi=ctx.phi,
+    )
+    torch.manual_seed(11)
+    _, sync_ids, sync_meta = eng.standalone_generate(ctx.prompt_ids, ctx.m0, **gen_kwargs)
+    torch.manual_seed(11)
+    _, ids, meta = eng.standalone_generate(
+        ctx.prompt_ids, ctx.m0, async_refresh=True, max_staleness=0, **gen_kwargs
+    )
+    assert ids == sync_ids
+    assert meta["refresh_count"] == sync_meta["refresh_count"] == 5
+    assert meta["refresh_staleness_max"] == sync_meta["refresh_staleness_max"] == 0
+
+    _, ids, meta = eng.standalone_generate(
+        ctx.prompt_ids, ctx.m0, async_refresh=True, max_staleness=2, **gen_kwargs
+    )
+    assert len(ids) == 6 and meta["async_refresh"]
+    assert 1 <= meta["refresh_count"] <= 5
+    assert meta["refresh_staleness_max"] <= 2
+    assert meta["refresh_wait_s"] >= 0.0
+
+
+def test_async_refresh_worker_is_profiled_and_gradless(tmp_path, monkeypatch):
+    from clarus.profiling import PROFILER
+
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    ctx = eng.prompt_context("alpha beta")
+    grad_modes = []
+    relax_context = eng.relax_context
+
+    def recording_relax_context(ctx_, args):
+        grad_modes.append((threading.current_thread().name, torch.is_grad_enabled()))
+        return relax_context(ctx_, args)
+
+    monkeypatch.setattr(eng, "relax_context", recording_relax_context)
+    was_enabled = PROFILER.enabled
+    PROFILER.reset()
+    PROFILER.enable()
+    try:
+        with torch.enable_grad():
+            eng._refresh_pool().submit(eng._relax_in_background, ctx, relax_args(steps=4)).result()
+        assert PROFILER.summary()["histograms"]["generate.refresh"]["count"] == 1
+    finally:
+        PROFILER.enabled = was_enabled
+        PROFILER.reset()
+    assert len(grad_modes) == 1
+    assert grad_modes[0][0].startswith("ce-refresh") and grad_modes[0][1] is False
+
+
+def test_closing_decode_with_failed_async_refresh_does_not_mask_exit(tmp_path, monkeypatch):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    eng.eos_token_id = None
+    ctx = eng.prompt_context("alpha beta")
+
+    def failing_relax(ctx_, args):
+        raise RuntimeError("refresh failed")
+
+    monkeypatch.setattr(eng, "_relax_in_background", failing_relax)
+    steps = eng._standalone_steps(
+        ctx.prompt_ids,
+        ctx.m0,
+        max_tok=6,
+        temperature=1.0,
+        top_k=0,
+        repeat_penalty=2.0,
+        refresh_interval=1,
+        refresh_args=relax_args(steps=4),
+        refresh_init_layer=ctx.best_layer,
+        refresh_phi=ctx.phi,
+        async_refresh=True,
+        max_staleness=8,
+    )
+    next(steps)
+    steps.close()
+
+    executor = eng._refresh_pool()
+    eng.close()
+    eng.close()
+    assert executor._shutdown
+    assert eng._refresh_pool() is not executor
+    eng.close()
+
+
+def test_speculative_generate_accounts_drafts_and_rollbacks(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    eng.eos_token_id = None
+    ctx = eng.prompt_context("alpha beta")
+    gen_kwargs = dict(
+        max_tok=7,
+        temperature=1.0,
+        top_k=0,
+        repeat_penalty=2.0,
+        refresh_args=relax_args(steps=4),
+        refresh_init_layer=ctx.best_layer,
+        refresh_phi=ctx.phi,
+    )
+    torch.manual_seed(5)
+    text, ids, meta = eng.speculative_generate(ctx.prompt_ids, ctx.m0, draft_tokens=3, **gen_kwargs)
+    assert len(ids) == 7 and meta["finish_reason"] == "length"
+    assert all(0 <= token_id < 4 for token_id in ids)
+    assert text == eng.tok.decode(ids, skip_special_tokens=True)
+    assert meta["draft_accepted"] + meta["draft_corrections"] == len(ids)
+    assert meta["draft_accepted"] <= meta["draft_drafted"] <= 3 * meta["draft_rounds"]
+    assert meta["draft_drafted"] <= meta["refresh_count"] <= meta["draft_drafted"] + meta["draft_corrections"]
+    assert 0.0 <= meta["draft_acceptance_rate"] <= 1.0
+    assert meta["chosen_risk_mean"] is not None
+
+    with pytest.raises(ValueError):
+        eng.speculative_generate(ctx.prompt_ids, ctx.m0, **{**gen_kwargs, "refresh_args": None})
+
+
+def test_speculative_generate_verifies_each_draft_causally(tmp_path, monkeypatch):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    eng.eos_token_id = None
+    # Non-trivial suppression over the full candidate set, so history
+    # stand-ins that skew curvature risk would change the greedy choice.
+    eng.curvature_lambda = 4.0
+    eng.curvature_alpha = 0.5
+    ctx = eng.prompt_context("alpha beta")
+    gen_kwargs = dict(
+        max_tok=6,
+        temperature=1e-4,
+        top_k=0,
+        repeat_penalty=2.0,
+        refresh_args=relax_args(steps=4),
+        refresh_init_layer=ctx.best_layer,
+        refresh_phi=ctx.phi,
+    )
+    batches = []
+    relax_contexts = eng.relax_contexts
+
+    def recording_relax_contexts(ctxs, args):
+        batches.append([c.prompt_ids[0].tolist() for c in ctxs])
+        return relax_contexts(ctxs, args)
+
+    monkeypatch.setattr(eng, "relax_contexts", recording_relax_contexts)
+    torch.manual_seed(0)
+    _, ids, meta = eng.speculative_generate(ctx.prompt_ids, ctx.m0, draft_tokens=3, **gen_kwargs)
+    prompt = ctx.prompt_ids[0].tolist()
+    assert batches
+    for batch in batches:
+        # One context per draft prefix, each extending the previous by one token.
+        assert [len(ids_) for ids_ in batch] == list(range(len(batch[0]), len(batch[0]) + len(batch)))
+        assert all(batch[row + 1][:-1] == batch[row] for row in range(len(batch) - 1))
+        committed = batch[0][:-1]
+        assert committed[: len(prompt)] == prompt
+        assert committed[len(prompt) :] == ids[: len(committed) - len(prompt)]
+
+    # Rejecting every draft leaves only causal corrections, which must match
+    # greedy decoding with a refresh after every token.
+    _, baseline_ids, _ = eng.standalone_generate(
+        ctx.prompt_ids, ctx.m0, refresh_interval=1, **gen_kwargs
+    )
+    _, reject_ids, reject_meta = eng.speculative_generate(
+        ctx.prompt_ids, ctx.m0, draft_tokens=3, risk_margin=float("-inf"), **gen_kwargs
+    )
+    assert reject_meta["draft_accepted"] == 0
+    assert reject_meta["draft_corrections"] == len(reject_ids)
+    assert reject_ids == baseline_ids
+
+
+def test_standalone_logits_batch_matches_per_row(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    g = torch.Generator().manual_seed(13)
+    hidden = torch.randn(3, 4, generator=g)
+    prev_hidden = torch.randn(3, 4, generator=g)
+    prev_prev_hidden = torch.randn(3, 4, generator=g)
+    anchor = torch.randn(3, 4, generator=g)
+    prev_ids = [2, 3, 0]
+    histories = [[2, 3, 2], [3], [2, 2, 3, 3]]
+    repeats = [[2], [], [3, 2]]
+    gen_len = [0, 12, 5]
+
+    batch_logits, batch_meta = eng.standalone_logits_batch(
+        hidden,
+        prev_ids,
+        top_k=3,
+        repeat_ids=repeats,
+        history_ids=histories,
+        prev_hidden=prev_hidden,
+        prev_prev_hidden=prev_prev_hidden,
+        context_anchor=anchor,
+        generated_len=gen_len,
+        return_meta=True,
+    )
+    for row in range(3):
+        logits, meta = eng.standalone_logits(
+            hidden[row],
+            prev_ids[row],
+            top_k=3,
+            repeat_ids=repeats[row],
+            history_ids=histories[row],
+            prev_hidden=prev_hidden[row],
+            prev_prev_hidden=prev_prev_hidden[row],
+            context_anchor=anchor[row],
+            generated_len=gen_len[row],
+            return_meta=True,
+        )
+        assert torch.allclose(batch_logits[row], logits, atol=1e-5)
+        assert batch_meta["curvature_risk_score"][row].item() == pytest.approx(meta["curvature_risk_score"])
+        assert int(batch_meta["suppressed_count"][row]) == meta["suppressed_count"]
+
+
+def test_filled_curvature_history_matches_missing_history(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    eng.curvature_lambda = 4.0
+    eng.curvature_alpha = 0.25
+    g = torch.Generator().manual_seed(19)
+    hidden, prev_hidden = torch.randn(2, 4, generator=g)
+    anchor = torch.randn(4, generator=g)
+    for prev in (None, prev_hidden):
+        logits, meta = eng.standalone_logits(
+            hidden, 2, top_k=4, prev_hidden=prev, prev_prev_hidden=None,
+            context_anchor=anchor, generated_len=3, return_meta=True,
+        )
+        fill_prev, fill_prev_prev = eng._fill_curvature_history(hidden, prev, None)
+        batch_logits, batch_meta = eng.standalone_logits_batch(
+            hidden.unsqueeze(0), [2], top_k=4,
+            prev_hidden=fill_prev.unsqueeze(0), prev_prev_hidden=fill_prev_prev.unsqueeze(0),
+            context_anchor=anchor.unsqueeze(0), generated_len=[3], return_meta=True,
+        )
+        assert torch.allclose(batch_logits[0], logits, atol=1e-5)
+        assert int(batch_meta["suppressed_count"][0]) == meta["suppressed_count"]
+        assert batch_meta["curvature_risk_score"][0].item() == pytest.approx(meta["curvature_risk_score"])
+
+
+def test_standalone_logits_batch_eos_bonus_matches_when_eos_is_not_terminal(tmp_path, monkeypatch):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    assert eng.eos_token_id is not None
+    monkeypatch.setattr(eng, "_sentence_terminal_ids", lambda: torch.tensor([3]))
+    hidden = torch.randn(2, 4, generator=torch.Generator().manual_seed(17))
+    batch_logits = eng.standalone_logits_batch(hidden, [2, 3], top_k=4, generated_len=[12, 12])
+    for row in range(2):
+        logits = eng.standalone_logits(hidden[row], [2, 3][row], top_k=4, generated_len=12)
+        assert torch.allclose(batch_logits[row], logits, atol=1e-5)
+
+
+def test_standalone_generate_batch_and_guard_batches_match_sequential(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    eng.eos_token_id = None
+    ctxs = [eng.prompt_context(text) for text in ("alpha beta", "beta", "alpha alpha beta")]
+    m_star = torch.stack([ctx.m0 for ctx in ctxs], dim=0)
+    gen_kwargs = dict(max_tok=5, temperature=1.0, top_k=1, repeat_penalty=2.0)
+    batched = eng.standalone_generate_batch([ctx.prompt_ids for ctx in ctxs], m_star, **gen_kwargs)
+    for ctx, (text, ids, meta) in zip(ctxs, batched):
+        ref_text, ref_ids, ref_meta = eng.standalone_generate(ctx.prompt_ids, ctx.m0, **gen_kwargs)
+        assert ids == ref_ids and text == ref_text
+        assert meta["suppression_hits"] == ref_meta["suppression_hits"]
+        assert meta["curvature_risk_score"] == pytest.approx(ref_meta["curvature_risk_score"])
+
+    guard_kwargs = dict(
+        max_new_tokens=3,
+        refresh_interval=2,
+        refresh_steps=4,
+        refresh_cb_topk=4,
+        refresh_metric_rank=0,
+        refresh_noise_scale=0.0,
+        seed_tokens=1,
+    )
+    prompts = ["alpha beta alpha beta alpha", "beta alpha beta"]
+    sequential = evaluate_guard_set(eng, prompts, relax_args(steps=8), batch_size=1, **guard_kwargs)
+    batched_guard = evaluate_guard_set(eng, prompts, relax_args(steps=8), batch_size=8, **guard_kwargs)
+    assert sequential["samples"] == batched_guard["samples"] > 0
+    for key in ("top1_acc", "top10_acc", "top50_acc", "curvature_risk"):
+        assert batched_guard[key] == pytest.approx(sequential[key], abs=1e-5)
+
+    # With relax noise every window still draws from its own seeded stream,
+    # so the guard metric does not depend on batch_size.
+    noisy_kwargs = {**guard_kwargs, "refresh_noise_scale": 0.5}
+    noisy_args = relax_args(steps=8, noise_scale=0.5)
+    noisy_seq = evaluate_guard_set(eng, prompts, noisy_args, batch_size=1, **noisy_kwargs)
+    noisy_batch = evaluate_guard_set(eng, prompts, noisy_args, batch_size=8, **noisy_kwargs)
+    for key in ("top1_acc", "top10_acc", "top50_acc", "curvature_risk"):
+        assert noisy_batch[key] == pytest.approx(noisy_seq[key], abs=1e-5)
+
+
 def test_standalone_logits_biases_sentence_closure_later(tmp_path):
     path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
     eng = CEEngine(str(path), device="cpu", backend="torch")
@@ -396,6 +981,123 @@ def test_finetune_vocab_head_from_batch_uses_soft_topk_targets(tmp_path):
     assert soft_stats["top1_acc"] >= 0.75
 
 
+def relax_args(**updates):
+    payload = dict(
+        dt=0.01,
+        cb_weight=None,
+        cb_topk=4,
+        beta=1.0,
+        steps=48,
+        backend="torch",
+        metric_rank=0,
+        lambda0=1.0,
+        lambda_phi=0.5,
+        lambda_var=0.25,
+        noise_scale=0.0,
+        seed=0,
+    )
+    payload.update(updates)
+    return argparse.Namespace(**payload)
+
+
+def test_relax_warm_start_cache_backs_off_and_evicts():
+    cache = RelaxWarmStartCache(capacity=2, max_backoff=2)
+    cache.store(0, [1, 2], torch.ones(3))
+    assert torch.equal(cache.lookup(0, [1, 2, 3]), torch.ones(3))
+    assert cache.lookup(1, [1, 2]) is None
+    cache.store(0, [4], torch.zeros(3))
+    cache.store(0, [5], torch.zeros(3))
+    assert cache.lookup(0, [1, 2]) is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_prompt_state_accumulator_matches_full_recompute(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    g = torch.Generator().manual_seed(5)
+    eng.pos = torch.randn(8, eng.d, generator=g)
+    eng._pos_prefix = None
+    for name in ("first", "prev", "last", "mean", "decay", "phi"):
+        setattr(eng, f"context_{name}_proj", torch.randn(eng.d, eng.d, generator=g))
+    eng.context_len_proj = torch.randn(eng.d, generator=g)
+    eng.context_bias = torch.randn(eng.d, generator=g)
+
+    ids = torch.randint(0, 4, (1, 12), generator=g)
+    acc = eng.prompt_state_accumulator(ids[:, :1])
+    grown = eng.prompt_state_accumulator(ids[:, :1], window=5)
+    for n in range(2, ids.shape[1] + 1):
+        eng.advance_prompt_state(acc, int(ids[0, n - 1]))
+        eng.advance_prompt_state(grown, int(ids[0, n - 1]))
+        m_full, phi_full = eng.runtime_prompt_state(ids[:, :n])
+        m_inc, phi_inc = eng.runtime_prompt_state(acc)
+        assert torch.allclose(m_inc, m_full, atol=1e-4)
+        assert torch.allclose(phi_inc, phi_full, atol=1e-5)
+        m_win, phi_win = eng.runtime_prompt_state(ids[:, max(0, n - 5) : n])
+        m_slide, phi_slide = eng.runtime_prompt_state(grown)
+        assert grown.length == min(n, 5)
+        assert torch.allclose(m_slide, m_win, atol=1e-4)
+        assert torch.allclose(phi_slide, phi_win, atol=1e-5)
+
+    ctx = eng.context_from_ids(ids, prompt="", need_teacher=False, state=acc)
+    assert torch.allclose(ctx.m0, eng.runtime_prompt_state(ids)[0], atol=1e-4)
+
+
+def test_relax_context_warm_start_reuses_prefix_and_invalidates(tmp_path):
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    eng = CEEngine(str(path), device="cpu", backend="torch", warm_cache_size=4)
+    args = relax_args()
+    ctx = eng.prompt_context("alpha beta")
+    cold = eng.relax_context(ctx, args)
+    warm = eng.relax_context(ctx, args)
+    assert not cold["warm_start"]
+    assert warm["warm_start"]
+    assert warm["steps"] <= cold["steps"]
+    assert torch.isfinite(warm["m_star"]).all()
+    for changed in (relax_args(seed=1), relax_args(steps=7), relax_args(noise_scale=0.5)):
+        assert not eng.relax_context(ctx, changed)["warm_start"]
+    assert eng.relax_context(ctx, args)["warm_start"]
+
+    op_version = eng.relax_operator.version
+    eng.apply_relax_matrix(eng.W.cpu())
+    assert eng.relax_operator.version > op_version
+    assert eng.warm_cache.stats()["entries"] == 0
+    assert not eng.relax_context(ctx, args)["warm_start"]
+
+
+def test_relax_operator_built_once_and_tracks_w_version(tmp_path, monkeypatch):
+    import clarus.engine as engine_mod
+
+    path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
+    artifact = torch.load(path, weights_only=False)
+    artifact["target_w_density"] = 0.5
+    torch.save(artifact, path)
+    built = []
+    real_build = engine_mod.ce_build_relax_operator
+
+    def counting_build(*args, **kwargs):
+        op = real_build(*args, **kwargs)
+        if kwargs.get("spectral_radius") != 0.0:
+            built.append(op)
+        return op
+
+    monkeypatch.setattr(engine_mod, "ce_build_relax_operator", counting_build)
+    eng = CEEngine(str(path), device="cpu", backend="torch")
+    assert len(built) == 1
+    op = eng.relax_operator
+    assert op.version == eng.w_version
+
+    eng.bump_relax_version()
+    eng.relax_context(eng.prompt_context("alpha beta"), relax_args())
+    assert eng.relax_operator is op
+    assert len(built) == 1
+
+    eng.apply_relax_matrix(eng.W.cpu())
+    assert eng.relax_operator.version == eng.w_version == op.version + 1
+
+
 def test_evaluate_guard_set_runs_without_teacher_model(tmp_path):
     path = make_runtime_artifact(tmp_path, decoder_query_blend=1.0)
     eng = CEEngine(str(path), device="cpu", backend="torch")
@@ -563,6 +1265,34 @@ def test_engine_resparsify_relax_matrix_hits_target_density():
     assert density == 0.25
 
 
+@pytest.mark.parametrize("d", [8, 27, 30, 64])
+def test_grid_stencil_matches_dense_state_laplacian(d):
+    eng = CEEngine.__new__(CEEngine)
+    eng.d = d
+    eng.device = torch.device("cpu")
+    eng._state_coords = None
+    eng._state_graph_laplacian = None
+    eng._state_graph_stencil = None
+    coords = eng.state_coords()
+    dist = torch.cdist(coords, coords)
+    adj = ((dist > 0) & (dist <= 1.01)).float()
+    dense = torch.diag(adj.sum(dim=1)) - adj
+
+    stencil = eng.state_graph_stencil()
+    assert torch.equal(stencil.to_dense(), dense)
+    assert torch.equal(eng.state_graph_laplacian(), dense)
+
+    x = torch.randn(5, d)
+    assert torch.allclose(stencil.apply(x), x @ dense, atol=1e-5)
+    w = torch.randn(d, d)
+    assert torch.allclose(
+        smooth_weight_matrix(w, stencil, 0.1),
+        smooth_weight_matrix(w, dense, 0.1),
+        atol=1e-5,
+    )
+    assert grid_stencil_laplacian(d).side == stencil.side
+
+
 def test_run_guarded_microsleep_step_waits_for_trigger():
     buf = PromptReplayBuffer(capacity=2)
     event = run_guarded_microsleep_step(